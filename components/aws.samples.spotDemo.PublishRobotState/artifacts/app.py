@@ -1,8 +1,11 @@
+import argparse
 import json
 import logging
 import os
+import signal
 import sys
-from threading import Timer
+import threading
+import time
 
 import awsiot.greengrasscoreipc
 import bosdyn.client
@@ -11,79 +14,392 @@ from awsiot.greengrasscoreipc.model import (
     PublishToIoTCoreRequest,
     GetSecretValueRequest,
 )
+from bosdyn.api import robot_state_pb2
 from bosdyn.client.robot_state import RobotStateClient
 from google.protobuf.json_format import MessageToDict
 
+from delta import DeltaEncoder
+from latency import LatencyRecorder
+from payload_codecs import CODECS, codec_topic, get_codec
+from projection import Projection, parse_paths
+from scheduler import Scheduler
+
+ROBOT_HOSTNAME = "192.168.50.3"
 TIMEOUT = 10
 
+# Fields of the robot state that are published by default.
+STATE_FIELDS = "kinematic_state,power_state,battery_states,comms_states"
+
+# Smallest changes of the robot state sent in delta encoding by default: joint angles
+# and frame positions (rad, m) are kept precise, other numbers are sent once they
+# change by DELTA_DEFAULT_THRESHOLD.
+DELTA_THRESHOLDS = (
+    "kinematic_state.joint_states.position=0.001,kinematic_state.transforms_snapshot=0.001"
+)
+DELTA_DEFAULT_THRESHOLD = 0.01
+
 # Setup logging to stdout
 logger = logging.getLogger(__name__)
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
-ipc_client = awsiot.greengrasscoreipc.connect()
 
-get_secret_value = ipc_client.new_get_secret_value()
-get_secret_value.activate(request=GetSecretValueRequest(secret_id="spot_secrets"))
-secret_response = get_secret_value.get_response().result()
-json_secret_string = json.loads(secret_response.secret_value.secret_string)
-get_secret_value.close()
+def connect_to_robot(ipc_client, hostname):
+    """Authenticates with the robot using the credentials in the spot_secrets secret.
 
-# Create robot object with an image client.
-sdk = bosdyn.client.create_standard_sdk("RobotStateClient")
-robot = sdk.create_robot("192.168.50.3")
-robot.authenticate(json_secret_string["spot_user"], json_secret_string["spot_password"])
-robot_state_client = robot.ensure_client(RobotStateClient.default_service_name)
+    Returns:
+        The RobotStateClient of the robot.
+    """
 
+    get_secret_value = ipc_client.new_get_secret_value()
+    get_secret_value.activate(request=GetSecretValueRequest(secret_id="spot_secrets"))
+    secret_response = get_secret_value.get_response().result()
+    json_secret_string = json.loads(secret_response.secret_value.secret_string)
+    get_secret_value.close()
 
-def get_robot_state_loop():
-    try:
-
-        ## STATE
+    # Create robot object with an image client.
+    sdk = bosdyn.client.create_standard_sdk("RobotStateClient")
+    robot = sdk.create_robot(hostname)
+    robot.authenticate(
+        json_secret_string["spot_user"], json_secret_string["spot_password"]
+    )
+    return robot.ensure_client(RobotStateClient.default_service_name)
 
-        # Make a robot state request
-        request_fn = getattr(robot_state_client, "get_robot_state")
-        response = request_fn()
 
-        json_output = MessageToDict(response)
+def publish(ipc_client, topic, payload, latency=None):
+    """Publishes a payload to AWS IoT Core without waiting for it.
 
-        # include selected payload attributes
-        payload = {
-            "kinematicState": json_output["kinematicState"],
-            "powerState": json_output["powerState"],
-            "batteryStates": json_output["batteryStates"],
-            "commsStates": json_output["commsStates"],
-        }
+    The time until Greengrass accepts the message is recorded as the "publish" latency
+    when a LatencyRecorder is given.
+    """
 
-        ipc_client.new_publish_to_iot_core().activate(
-            request=PublishToIoTCoreRequest(
-                topic_name="robots/{}/state".format(os.environ["AWS_IOT_THING_NAME"]),
-                qos="0",
-                payload=json.dumps(payload).encode(),
-            )
+    operation = ipc_client.new_publish_to_iot_core()
+    start = time.monotonic()
+    operation.activate(
+        request=PublishToIoTCoreRequest(topic_name=topic, qos="0", payload=payload)
+    )
+    if latency is not None:
+        operation.get_response().add_done_callback(
+            lambda future: record_call(latency, "publish", start, future)
         )
 
-        ## METRICS
 
-        # Make a robot state request
-        request_fn = getattr(robot_state_client, "get_robot_metrics")
-        response = request_fn()
+def record_call(latency, name, start, future):
+    """Records the latency of a call started at start, or its failure."""
+
+    error = future.exception()
+    if error is None:
+        latency.record(name, time.monotonic() - start)
+    else:
+        latency.record_failure(name)
+        logger.error("{} failed: {}".format(name, repr(error)))
+    return error is None
+
+
+def encode(codec, message, projection=None, encoder=None):
+    """Encodes the fields of a message selected by a Projection, or all of them, with a
+    payload codec, after delta encoding them when a DeltaEncoder is given.
+
+    Returns:
+        The payload bytes, or None if nothing changed enough to be worth sending.
+    """
+
+    if codec.takes_message:
+        if projection is not None:
+            message = projection.to_message(message)
+        return codec.encode(message)
+
+    if projection is not None:
+        value = projection.to_dict(message)
+    else:
+        value = MessageToDict(message)
+    if encoder is not None:
+        value = encoder.encode(value, time.monotonic())
+        if value is None:
+            return None
+    return codec.encode(value)
+
+
+def publish_response(
+    ipc_client, topic, response, codec, projection=None, encoder=None, latency=None
+):
+    """Publishes the selected fields of a robot state or metrics response, or their
+    changes since the last keyframe when a DeltaEncoder is given."""
+
+    payload = encode(codec, response, projection, encoder)
+    if payload is not None:
+        publish(ipc_client, topic, payload, latency)
+
+
+class TelemetryStream:
+    """Requests a message from the robot on every tick and publishes it once it arrives.
+
+    Requests are sent with the async calls of the robot state client, so the scheduler
+    does not wait for them: the requests of several streams are in flight at once, and a
+    response is encoded and published on the thread that receives it while the next
+    requests are already being sent. A tick is skipped while the previous request of the
+    stream is still in flight, which keeps the responses of a stream in order.
+
+    Args:
+        name (str): Name of the call, e.g. get_robot_state.
+        request: Function sending the request and returning its future.
+        publish: Function publishing a response.
+        latency (LatencyRecorder): Records the latency of the call.
+    """
+
+    def __init__(self, name, request, publish, latency):
+        self.name = name
+        self.request = request
+        self.publish = publish
+        self.latency = latency
+        self.skipped = 0
+
+        self._in_flight = False
+        self._condition = threading.Condition()
+
+    def tick(self):
+        with self._condition:
+            if self._in_flight:
+                self.skipped += 1
+                return
+            self._in_flight = True
+
+        start = time.monotonic()
+        try:
+            future = self.request()
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda future: self._on_response(future, start))
+
+    def take_skipped(self):
+        """Returns the number of skipped ticks since the last call."""
 
-        json_output = MessageToDict(response)
+        with self._condition:
+            skipped, self.skipped = self.skipped, 0
+            return skipped
 
-        ipc_client.new_publish_to_iot_core().activate(
-            request=PublishToIoTCoreRequest(
-                topic_name="robots/{}/metrics".format(os.environ["AWS_IOT_THING_NAME"]),
-                qos="0",
-                payload=json.dumps(json_output).encode(),
+    def wait(self, timeout):
+        """Waits up to timeout seconds for the request in flight, if any."""
+
+        with self._condition:
+            self._condition.wait_for(lambda: not self._in_flight, timeout)
+
+    def _on_response(self, future, start):
+        try:
+            if record_call(self.latency, self.name, start, future):
+                self.publish(future.result())
+        except Exception as e:
+            logger.error("Failed to publish message: " + repr(e))
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._condition:
+            self._in_flight = False
+            self._condition.notify_all()
+
+
+def report_latency(ipc_client, topic, latency, streams):
+    """Logs and publishes the latency of the calls since the last report."""
+
+    calls = latency.summary()
+    if not calls:
+        return
+    summary = {
+        "calls": calls,
+        "skipped_ticks": {stream.name: stream.take_skipped() for stream in streams},
+    }
+    logger.info("Latency: " + json.dumps(summary))
+    publish(ipc_client, topic, json.dumps(summary).encode())
+
+
+def create_parser():
+    """Returns the command line parser of the component."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--state-rate",
+        help="Robot state messages published per second, 0 to disable, default: 0.2",
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "--metrics-rate",
+        help="Robot metrics messages published per second, 0 to disable, default: 0.2",
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "--state-fields",
+        help="Comma-separated dotted paths of the RobotState fields that are published, e.g. kinematic_state.joint_states.position,battery_states.charge_percentage, default: "
+        + STATE_FIELDS,
+        default=STATE_FIELDS,
+    )
+    parser.add_argument(
+        "--metrics-fields",
+        help="Comma-separated dotted paths of the RobotMetrics fields that are published, default: all",
+        default="",
+    )
+    parser.add_argument(
+        "--codec",
+        help="Payload encoding, added to the topics unless json, default: json",
+        choices=sorted(CODECS),
+        default="json",
+    )
+    parser.add_argument(
+        "--state-encoding",
+        help="Publish the full robot state every time (full), or keyframes and the fields that changed since (delta) to robots/<thing>/state/delta, default: full",
+        choices=["full", "delta"],
+        default="full",
+    )
+    parser.add_argument(
+        "--keyframe-interval",
+        help="Seconds between full keyframes in delta encoding, default: 5",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        "--delta-threshold",
+        help="Comma-separated PATH=VALUE. Smallest change of the numbers under a field path of the published state that is sent in delta encoding, with paths as in --state-fields, e.g. kinematic_state.joint_states.position=0.005. Can be repeated, default: "
+        + DELTA_THRESHOLDS,
+        action="append",
+    )
+    parser.add_argument(
+        "--delta-default-threshold",
+        help="Smallest change of the numbers no --delta-threshold applies to that is sent in delta encoding, default: {}".format(
+            DELTA_DEFAULT_THRESHOLD
+        ),
+        type=float,
+        default=DELTA_DEFAULT_THRESHOLD,
+    )
+    parser.add_argument(
+        "--latency-report-interval",
+        help="Seconds between latency reports, logged and published to robots/<thing>/latency, 0 to disable, default: 60",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "--jitter",
+        help="Up to this many seconds are added at random to every publish, default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "hostname",
+        nargs="?",
+        help="Hostname or address of the robot, default: " + ROBOT_HOSTNAME,
+        default=ROBOT_HOSTNAME,
+    )
+    return parser
+
+
+def main(argv):
+    """Publishes the robot state and metrics at fixed rates until SIGTERM or SIGINT."""
+
+    parser = create_parser()
+    options = parser.parse_args(argv)
+
+    try:
+        codec = get_codec(options.codec)
+    except ValueError as e:
+        parser.error(str(e))
+    if codec.takes_message and options.state_encoding == "delta":
+        parser.error("delta encoding cannot be published with the protobuf codec")
+
+    # The field paths are compiled once into accessors used on every tick.
+    try:
+        state_projection = Projection(
+            robot_state_pb2.RobotState.DESCRIPTOR, parse_paths(options.state_fields)
+        )
+        metrics_projection = None
+        if parse_paths(options.metrics_fields):
+            metrics_projection = Projection(
+                robot_state_pb2.RobotMetrics.DESCRIPTOR,
+                parse_paths(options.metrics_fields),
             )
+    except ValueError as e:
+        parser.error(str(e))
+
+    # The thresholds are matched against the to_dict keys the paths turn into.
+    thresholds = {}
+    if options.state_encoding == "delta":
+        entries = ",".join(options.delta_threshold or [DELTA_THRESHOLDS]).split(",")
+        for entry in filter(None, map(str.strip, entries)):
+            path, _, value = entry.partition("=")
+            try:
+                thresholds[state_projection.json_path(path.strip())] = float(value)
+            except ValueError as e:
+                if options.delta_threshold is None:
+                    # A default threshold of a field that is not published.
+                    continue
+                parser.error("invalid --delta-threshold {}: {}".format(entry, e))
+
+    ipc_client = awsiot.greengrasscoreipc.connect()
+    robot_state_client = connect_to_robot(ipc_client, options.hostname)
+    thing_name = os.environ["AWS_IOT_THING_NAME"]
+
+    state_topic = "robots/{}/state".format(thing_name)
+    encoder = None
+    if options.state_encoding == "delta":
+        state_topic += "/delta"
+        encoder = DeltaEncoder(
+            options.keyframe_interval, thresholds, options.delta_default_threshold
+        )
+
+    state_topic = codec_topic(state_topic, codec)
+    metrics_topic = codec_topic("robots/{}/metrics".format(thing_name), codec)
+
+    latency = LatencyRecorder()
+    state_stream = TelemetryStream(
+        "get_robot_state",
+        lambda: robot_state_client.get_robot_state_async(timeout=TIMEOUT),
+        lambda response: publish_response(
+            ipc_client,
+            state_topic,
+            response,
+            codec,
+            state_projection,
+            encoder,
+            latency,
+        ),
+        latency,
+    )
+    metrics_stream = TelemetryStream(
+        "get_robot_metrics",
+        lambda: robot_state_client.get_robot_metrics_async(timeout=TIMEOUT),
+        lambda response: publish_response(
+            ipc_client,
+            metrics_topic,
+            response,
+            codec,
+            metrics_projection,
+            latency=latency,
+        ),
+        latency,
+    )
+    streams = [state_stream, metrics_stream]
+
+    scheduler = Scheduler()
+    scheduler.add("state", options.state_rate, state_stream.tick, options.jitter)
+    scheduler.add("metrics", options.metrics_rate, metrics_stream.tick, options.jitter)
+    if options.latency_report_interval > 0:
+        scheduler.add(
+            "latency",
+            1.0 / options.latency_report_interval,
+            lambda: report_latency(
+                ipc_client, "robots/{}/latency".format(thing_name), latency, streams
+            ),
         )
 
-    except Exception as e:
-        logger.error("Failed to publish message: " + repr(e))
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: scheduler.stop())
 
-    # Asynchronously schedule this function to be run again in 5 seconds
-    Timer(5, get_robot_state_loop).start()
+    logger.info("Publishing robot state...")
+    scheduler.run()
+    for stream in streams:
+        stream.wait(TIMEOUT)
+    logger.info("Stopped")
 
 
-# Start executing the function above
-get_robot_state_loop()
+if __name__ == "__main__":
+    main(sys.argv[1:])
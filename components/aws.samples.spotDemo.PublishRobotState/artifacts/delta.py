@@ -0,0 +1,158 @@
+"""
+Delta encoding of telemetry snapshots.
+
+Instead of the full snapshot on every tick, the encoder sends a keyframe with the whole
+snapshot every keyframe_interval seconds, and in between only the fields that differ from
+the last keyframe by more than their threshold. A delta is relative to the keyframe and
+not to the previous delta, so a lost message (QoS 0) costs nothing more than itself.
+
+Messages are dicts of:
+
+    {"type": "keyframe", "seq": 12, "state": {...}}
+    {"type": "delta", "seq": 13, "keyframe": 12, "fields": {"a.b.0.c": 1.5, ...}}
+
+where the keys of "fields" are dotted paths into the keyframe state, with list indexes
+as path components. apply_delta rebuilds the state on the receiving side.
+
+Thresholds are given for dotted path prefixes in the same form, where a * component
+matches any single key or index, e.g. kinematicState.jointStates.*.position.
+"""
+
+import numbers
+
+
+class DeltaEncoder:
+    """Turns successive snapshots of a JSON-like dict into keyframes and deltas.
+
+    Args:
+        keyframe_interval (float): Seconds between keyframes.
+        thresholds (dict): Dotted path prefix to the smallest change of a number under
+            that prefix that is sent. A * component of a prefix matches any key or
+            index. The longest matching prefix applies.
+        default_threshold (float): Smallest change sent for numbers no prefix matches.
+    """
+
+    def __init__(self, keyframe_interval=5.0, thresholds=None, default_threshold=0.0):
+        self.keyframe_interval = keyframe_interval
+        self.default_threshold = default_threshold
+        # Longest prefixes first, so the first match is the most specific one.
+        self.thresholds = sorted(
+            (
+                (tuple(prefix.split(".")), value)
+                for prefix, value in (thresholds or {}).items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+        self._seq = 0
+        self._keyframe = None
+        self._keyframe_seq = 0
+        self._keyframe_time = 0.0
+        self._path_thresholds = {}
+
+    def encode(self, snapshot, timestamp):
+        """Encodes a snapshot taken at timestamp (seconds).
+
+        Returns:
+            A keyframe or delta message, or None if no field changed beyond its
+            threshold since the last keyframe.
+        """
+
+        fields = flatten(snapshot)
+        self._seq += 1
+
+        if (
+            self._keyframe is None
+            or timestamp - self._keyframe_time >= self.keyframe_interval
+            or fields.keys() != self._keyframe.keys()
+        ):
+            # The layout of the snapshot changed, e.g. a list grew, or the keyframe is
+            # due anyway.
+            self._keyframe = fields
+            self._keyframe_seq = self._seq
+            self._keyframe_time = timestamp
+            return {"type": "keyframe", "seq": self._seq, "state": snapshot}
+
+        changed = {
+            path: value
+            for path, value in fields.items()
+            if self._changed(path, self._keyframe[path], value)
+        }
+        if not changed:
+            return None
+        return {
+            "type": "delta",
+            "seq": self._seq,
+            "keyframe": self._keyframe_seq,
+            "fields": changed,
+        }
+
+    def _changed(self, path, old, new):
+        if (
+            isinstance(old, numbers.Number)
+            and isinstance(new, numbers.Number)
+            and not isinstance(old, bool)
+        ):
+            return abs(new - old) > self._threshold(path)
+        return old != new
+
+    def _threshold(self, path):
+        threshold = self._path_thresholds.get(path)
+        if threshold is None:
+            threshold = self.default_threshold
+            keys = path.split(".")
+            for prefix, value in self.thresholds:
+                if len(prefix) <= len(keys) and all(
+                    expected in ("*", key) for expected, key in zip(prefix, keys)
+                ):
+                    threshold = value
+                    break
+            self._path_thresholds[path] = threshold
+        return threshold
+
+
+def flatten(value, prefix="", fields=None):
+    """Returns a dict of dotted path to leaf value of nested dicts and lists."""
+
+    if fields is None:
+        fields = {}
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        fields[prefix] = value
+        return fields
+
+    if not value:
+        # Keeps empty containers, so that they are part of the layout.
+        fields[prefix] = value
+    for key, item in items:
+        flatten(item, "{}.{}".format(prefix, key) if prefix else str(key), fields)
+    return fields
+
+
+def apply_delta(keyframe_state, message):
+    """Returns the state described by a delta message, given the state of its keyframe.
+
+    The keyframe state is not modified.
+    """
+
+    state = _copy(keyframe_state)
+    for path, value in message["fields"].items():
+        keys = path.split(".")
+        container = state
+        for key in keys[:-1]:
+            container = container[int(key) if isinstance(container, list) else key]
+        last = keys[-1]
+        container[int(last) if isinstance(container, list) else last] = value
+    return state
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
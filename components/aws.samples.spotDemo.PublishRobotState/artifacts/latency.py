@@ -0,0 +1,67 @@
+"""
+Latency of the calls the component makes to the robot and to Greengrass.
+
+The latest latencies of every call are kept and summarized into percentiles, which show
+when the link to the robot or to the cloud is congested.
+"""
+
+import collections
+import threading
+
+
+class LatencyRecorder:
+    """Keeps the latest latencies of named calls.
+
+    Args:
+        window (int): Latencies kept per call.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.window)
+        )
+        self._counts = collections.Counter()
+        self._failures = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+            self._counts[name] += 1
+
+    def record_failure(self, name):
+        with self._lock:
+            self._failures[name] += 1
+
+    def summary(self):
+        """Returns the summary of the calls recorded since the last summary, and starts
+        over.
+
+        Returns:
+            Dict of call name to a dict of the number of calls and failures, and the
+            p50, p95 and maximum latency in milliseconds of the latest window calls.
+        """
+
+        with self._lock:
+            samples, self._samples = self._samples, collections.defaultdict(
+                lambda: collections.deque(maxlen=self.window)
+            )
+            counts, self._counts = self._counts, collections.Counter()
+            failures, self._failures = self._failures, collections.Counter()
+
+        summary = {}
+        for name in sorted(set(counts) | set(failures)):
+            latencies = sorted(samples.get(name, ()))
+            summary[name] = {"count": counts[name], "failures": failures[name]}
+            if latencies:
+                summary[name].update(
+                    p50_ms=round(_percentile(latencies, 50) * 1000, 1),
+                    p95_ms=round(_percentile(latencies, 95) * 1000, 1),
+                    max_ms=round(latencies[-1] * 1000, 1),
+                )
+        return summary
+
+
+def _percentile(latencies, percentile):
+    return latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)]
@@ -0,0 +1,175 @@
+"""
+Payload codecs of the published robot telemetry.
+
+    json        JSON text, as published originally.
+    protobuf    The serialized RobotState or RobotMetrics message, holding only the
+                published fields.
+    cbor        CBOR of the same fields as json (needs the cbor2 package).
+    msgpack     MessagePack of the same fields as json (needs the msgpack package).
+    json-zstd   zstd-compressed JSON (needs the zstandard package).
+
+Every codec but json adds its name to the topic, e.g. robots/<thing>/state/cbor, so that
+the receiver knows how to decode a payload. The cloud side can decode any payload with:
+
+    python3 payload_codecs.py robots/spot/state/cbor payload.bin
+"""
+
+import argparse
+import json
+import sys
+
+from bosdyn.api import robot_state_pb2
+from google.protobuf.json_format import MessageToDict
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Message type of the protobuf payloads of every stream.
+STREAM_MESSAGES = {
+    "state": robot_state_pb2.RobotState,
+    "metrics": robot_state_pb2.RobotMetrics,
+}
+
+
+class Codec:
+    """Encodes telemetry into payload bytes and back.
+
+    Args:
+        name (str): Codec ID, added to the topic.
+        encode: Function from the value to the payload bytes.
+        decode: Function from the payload bytes and the protobuf message class of the
+            stream to a JSON-like dict.
+        takes_message (bool): Whether encode takes the protobuf message instead of its
+            MessageToDict dict.
+        available (bool): Whether the package the codec needs is installed.
+    """
+
+    def __init__(self, name, encode, decode, takes_message=False, available=True):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.takes_message = takes_message
+        self.available = available
+
+
+def _encode_json(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _decode_json(payload, message_class):
+    return json.loads(payload)
+
+
+def _decode_protobuf(payload, message_class):
+    return MessageToDict(message_class.FromString(payload))
+
+
+CODECS = {
+    codec.name: codec
+    for codec in [
+        Codec("json", _encode_json, _decode_json),
+        Codec(
+            "protobuf",
+            lambda message: message.SerializeToString(),
+            _decode_protobuf,
+            takes_message=True,
+        ),
+        Codec(
+            "cbor",
+            lambda value: cbor2.dumps(value),
+            lambda payload, _: cbor2.loads(payload),
+            available=cbor2 is not None,
+        ),
+        Codec(
+            "msgpack",
+            lambda value: msgpack.packb(value),
+            lambda payload, _: msgpack.unpackb(payload),
+            available=msgpack is not None,
+        ),
+        Codec(
+            "json-zstd",
+            lambda value: zstandard.ZstdCompressor().compress(_encode_json(value)),
+            lambda payload, _: json.loads(
+                zstandard.ZstdDecompressor().decompress(payload)
+            ),
+            available=zstandard is not None,
+        ),
+    ]
+}
+
+
+def get_codec(name):
+    """Returns the Codec called name.
+
+    Raises:
+        ValueError: The codec does not exist or its package is not installed.
+    """
+
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError("Unknown codec: " + name)
+    if not codec.available:
+        raise ValueError(
+            "The {} codec needs a package that is not installed, see requirements.txt".format(
+                name
+            )
+        )
+    return codec
+
+
+def codec_topic(topic, codec):
+    """Returns the topic the payloads of a codec are published to."""
+
+    if codec.name == "json":
+        return topic
+    return topic + "/" + codec.name
+
+
+def decode_payload(topic, payload):
+    """Decodes a payload published by the component to a JSON-like dict.
+
+    Args:
+        topic (str): Topic the payload was published to, e.g.
+            robots/<thing>/state/delta/cbor.
+        payload (bytes): Payload of the message.
+    """
+
+    parts = topic.split("/")
+    codec = CODECS["json"]
+    if parts[-1] in CODECS:
+        codec = get_codec(parts[-1])
+    return codec.decode(payload, STREAM_MESSAGES.get(parts[2]))
+
+
+def main(argv):
+    """Prints the JSON of a payload published by the component."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("topic", help="Topic the payload was published to")
+    parser.add_argument("payload", help="File holding the payload, - for stdin")
+    options = parser.parse_args(argv)
+
+    if options.payload == "-":
+        payload = sys.stdin.buffer.read()
+    else:
+        with open(options.payload, "rb") as f:
+            payload = f.read()
+    print(json.dumps(decode_payload(options.topic, payload), indent=2))
+    return True
+
+
+if __name__ == "__main__":
+    if not main(sys.argv[1:]):
+        sys.exit(1)
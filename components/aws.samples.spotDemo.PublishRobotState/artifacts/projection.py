@@ -0,0 +1,298 @@
+"""
+Projection of protobuf messages onto a selected set of fields.
+
+The fields are given as dotted paths of protobuf field names, e.g.
+
+    kinematic_state.joint_states.position
+    kinematic_state.velocity_of_body_in_odom
+    battery_states.charge_percentage
+
+A path continues into every element of a repeated field and into every value of a map
+field. A path that ends on a message field selects the whole message. Paths cannot go
+below a well-known type, e.g. the DoubleValue of kinematic_state.joint_states.position
+or the Timestamp of kinematic_state.acquisition_timestamp, as MessageToDict renders
+those as a single value; select the field itself instead.
+
+The paths are compiled once into a chain of functions that read the selected fields
+straight from the message, so the rest of the message is never converted. to_dict gives
+the same JSON-like dict as MessageToDict of a message holding only the selected fields,
+and to_message gives that message itself.
+"""
+
+import base64
+import math
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.json_format import MessageToDict
+
+# Integer types that MessageToDict renders as strings, as JSON numbers cannot hold them.
+INT64_TYPES = (
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED64,
+    FieldDescriptor.TYPE_SFIXED64,
+)
+
+
+# Package of the well-known types, e.g. google.protobuf.Timestamp, which MessageToDict
+# renders as a single value instead of an object of their fields.
+WELL_KNOWN_PACKAGE = "google.protobuf."
+
+
+class Projection:
+    """Selected fields of a protobuf message type.
+
+    Args:
+        descriptor (Descriptor): Descriptor of the message type, e.g.
+            robot_state_pb2.RobotState.DESCRIPTOR.
+        paths (list): Dotted paths of the selected fields.
+
+    Raises:
+        ValueError: A path names a field that does not exist, or goes below a
+            well-known type.
+    """
+
+    def __init__(self, descriptor, paths):
+        self.descriptor = descriptor
+        self.paths = list(paths)
+
+        tree = {}
+        for path in self.paths:
+            _add_path(tree, descriptor, path)
+        self._to_dict = _compile_to_dict(tree)
+        self._copy = _compile_copy(tree)
+
+    def to_dict(self, message):
+        """Returns the selected fields of message, as MessageToDict of to_message."""
+
+        return self._to_dict(message)
+
+    def to_message(self, message):
+        """Returns a message of the same type holding only the selected fields."""
+
+        projected = type(message)()
+        self._copy(message, projected)
+        return projected
+
+    def json_path(self, path):
+        """Returns the dotted path of the to_dict keys of a selected field, with * in
+        place of the index or key of every repeated or map field the path goes through,
+        e.g. kinematicState.jointStates.*.position for
+        kinematic_state.joint_states.position.
+
+        Raises:
+            ValueError: The path names a field that does not exist or is not selected.
+        """
+
+        _add_path({}, self.descriptor, path)
+        if not any(
+            path == selected
+            or path.startswith(selected + ".")
+            or selected.startswith(path + ".")
+            for selected in self.paths
+        ):
+            raise ValueError("Cannot use {}: the field is not selected".format(path))
+
+        keys = []
+        descriptor = self.descriptor
+        names = path.split(".")
+        for i, name in enumerate(names):
+            field = descriptor.fields_by_name[name]
+            keys.append(field.json_name)
+            if i < len(names) - 1 and field.label == FieldDescriptor.LABEL_REPEATED:
+                keys.append("*")
+            descriptor = _value_type(field)
+        return ".".join(keys)
+
+
+def parse_paths(text):
+    """Returns the paths of a comma-separated list, as given in the component
+    configuration."""
+
+    return [path.strip() for path in text.split(",") if path.strip()]
+
+
+def _add_path(tree, descriptor, path):
+    node = tree
+    names = path.split(".")
+    for i, name in enumerate(names):
+        if descriptor is None:
+            raise ValueError("Cannot select {}: not a message field".format(path))
+        if descriptor.full_name.startswith(WELL_KNOWN_PACKAGE):
+            raise ValueError(
+                "Cannot select {}: {} fields can only be selected as a whole".format(
+                    path, descriptor.full_name
+                )
+            )
+        field = descriptor.fields_by_name.get(name)
+        if field is None:
+            raise ValueError(
+                "Cannot select {}: {} has no field {}".format(
+                    path, descriptor.full_name, name
+                )
+            )
+
+        last = i == len(names) - 1
+        if name in node and node[name][1] is None:
+            # The whole field is selected already.
+            return
+        if last:
+            node[name] = (field, None)
+            return
+        if name not in node:
+            node[name] = (field, {})
+        node = node[name][1]
+        descriptor = _value_type(field)
+
+
+def _is_map(field):
+    return (
+        field.message_type is not None
+        and field.message_type.GetOptions().map_entry
+    )
+
+
+def _value_type(field):
+    """Returns the message type a path continues into, or None for scalars."""
+
+    if _is_map(field):
+        return field.message_type.fields_by_name["value"].message_type
+    return field.message_type
+
+
+def _convert_leaf(field):
+    """Returns the function converting a value of a field as MessageToDict does."""
+
+    if field.message_type is not None:
+        return MessageToDict
+    if field.enum_type is not None:
+        values = field.enum_type.values_by_number
+        return lambda value: values[value].name if value in values else value
+    if field.type in INT64_TYPES:
+        return str
+    if field.type == FieldDescriptor.TYPE_BYTES:
+        return lambda value: base64.b64encode(value).decode()
+    if field.type in (FieldDescriptor.TYPE_FLOAT, FieldDescriptor.TYPE_DOUBLE):
+        return _convert_float
+    return lambda value: value
+
+
+def _convert_float(value):
+    """Returns a float as MessageToDict does, which gives NaN and infinities as strings."""
+
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    return value
+
+
+def _compile_to_dict(node):
+    steps = [_to_dict_step(field, child) for field, child in node.values()]
+
+    def to_dict(message):
+        value = {}
+        for step in steps:
+            step(message, value)
+        return value
+
+    return to_dict
+
+
+def _to_dict_step(field, child):
+    name = field.name
+    key = field.json_name
+
+    if _is_map(field):
+        value_field = field.message_type.fields_by_name["value"]
+        convert = _convert_leaf(value_field) if child is None else _compile_to_dict(child)
+
+        def step(message, value):
+            entries = getattr(message, name)
+            if len(entries):
+                value[key] = {str(k): convert(v) for k, v in entries.items()}
+
+        return step
+
+    convert = _convert_leaf(field) if child is None else _compile_to_dict(child)
+    if field.label == FieldDescriptor.LABEL_REPEATED:
+
+        def step(message, value):
+            items = getattr(message, name)
+            if len(items):
+                value[key] = [convert(item) for item in items]
+
+    elif field.message_type is not None:
+
+        def step(message, value):
+            if message.HasField(name):
+                value[key] = convert(getattr(message, name))
+
+    else:
+        default = field.default_value
+
+        def step(message, value):
+            item = getattr(message, name)
+            if item != default:
+                value[key] = convert(item)
+
+    return step
+
+
+def _compile_copy(node):
+    steps = [_copy_step(field, child) for field, child in node.values()]
+
+    def copy(source, target):
+        for step in steps:
+            step(source, target)
+
+    return copy
+
+
+def _copy_step(field, child):
+    name = field.name
+
+    if child is None:
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+
+            def step(source, target):
+                getattr(target, name).MergeFrom(getattr(source, name))
+
+        elif field.message_type is not None:
+
+            def step(source, target):
+                if source.HasField(name):
+                    getattr(target, name).CopyFrom(getattr(source, name))
+
+        else:
+
+            def step(source, target):
+                setattr(target, name, getattr(source, name))
+
+        return step
+
+    copy = _compile_copy(child)
+    if _is_map(field):
+
+        def step(source, target):
+            entries = getattr(target, name)
+            for key, value in getattr(source, name).items():
+                copy(value, entries[key])
+
+    elif field.label == FieldDescriptor.LABEL_REPEATED:
+
+        def step(source, target):
+            items = getattr(target, name)
+            for item in getattr(source, name):
+                copy(item, items.add())
+
+    else:
+
+        def step(source, target):
+            if source.HasField(name):
+                projected = getattr(target, name)
+                projected.SetInParent()
+                copy(getattr(source, name), projected)
+
+    return step
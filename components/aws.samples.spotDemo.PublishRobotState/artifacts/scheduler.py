@@ -0,0 +1,95 @@
+"""
+Fixed-rate scheduler for the telemetry streams of the component.
+
+All streams run on a single long-lived thread. The ticks of a stream are scheduled from
+the time the scheduler started, so the time a tick takes does not push back the ones
+after it. Ticks that are missed entirely, because an earlier tick ran too long, are
+skipped instead of being run late in a burst.
+"""
+
+import heapq
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Stream:
+    """A function run by the scheduler at a fixed rate.
+
+    Args:
+        name (str): Name of the stream, used in log messages.
+        period (float): Seconds between ticks.
+        function: Callable run on every tick, without arguments.
+        jitter (float): Up to this many seconds are added at random to every tick, so
+            that streams with the same rate do not all fire at once.
+    """
+
+    def __init__(self, name, period, function, jitter=0.0):
+        self.name = name
+        self.period = period
+        self.function = function
+        self.jitter = jitter
+        self.ticks = 0
+        self.skipped = 0
+
+
+class Scheduler:
+    """Runs streams at their own fixed rates on the calling thread, until stopped."""
+
+    def __init__(self):
+        self.streams = []
+        self._stopped = threading.Event()
+
+    def add(self, name, rate, function, jitter=0.0):
+        """Adds a stream running function rate times per second. Streams with a rate of
+        0 are not run."""
+
+        if rate > 0:
+            self.streams.append(Stream(name, 1.0 / rate, function, jitter))
+
+    def stop(self):
+        """Makes run return once the tick in progress, if any, is done. Safe to call
+        from a signal handler."""
+
+        self._stopped.set()
+
+    def run(self):
+        """Runs the streams until stop is called."""
+
+        start = time.monotonic()
+        schedule = [(start, i) for i in range(len(self.streams))]
+        heapq.heapify(schedule)
+
+        while schedule:
+            due, i = schedule[0]
+            if self._stopped.wait(max(0.0, due - time.monotonic())):
+                break
+            heapq.heappop(schedule)
+
+            stream = self.streams[i]
+            try:
+                stream.function()
+            except Exception as e:
+                logger.error("Stream {} failed: {}".format(stream.name, repr(e)))
+
+            # The next tick is taken from the schedule, not from when this one ended.
+            stream.ticks += 1
+            next_tick = start + stream.ticks * stream.period
+            now = time.monotonic()
+            if next_tick < now:
+                missed = int((now - next_tick) // stream.period) + 1
+                stream.ticks += missed
+                stream.skipped += missed
+                next_tick += missed * stream.period
+                logger.warning(
+                    "Stream {} skipped {} tick(s), {} in total".format(
+                        stream.name, missed, stream.skipped
+                    )
+                )
+
+            if stream.jitter > 0:
+                next_tick += random.uniform(0.0, stream.jitter)
+            heapq.heappush(schedule, (next_tick, i))
@@ -0,0 +1,167 @@
+"""
+Payload size and encode time of every telemetry codec of PublishRobotState.
+
+Encodes a synthetic RobotState, shaped like the one of a standing Spot, and a
+RobotMetrics message with every available codec, and compares them with the original
+MessageToDict + json.dumps of the full state.
+
+Example:
+    python3 benchmarks/codec_benchmark.py --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
+
+from bosdyn.api import robot_state_pb2
+from google.protobuf.json_format import MessageToDict
+
+from app import STATE_FIELDS, encode
+from payload_codecs import CODECS
+from projection import Projection, parse_paths
+
+JOINTS = [
+    leg + "." + joint
+    for leg in ("fl", "fr", "hl", "hr")
+    for joint in ("hx", "hy", "kn")
+]
+
+
+def make_robot_state():
+    state = robot_state_pb2.RobotState()
+
+    kinematic_state = state.kinematic_state
+    for i, name in enumerate(JOINTS):
+        joint = kinematic_state.joint_states.add()
+        joint.name = name
+        joint.position.value = 0.1 * i - 0.6
+        joint.velocity.value = 0.01 * i
+        joint.acceleration.value = 0.001 * i
+        joint.load.value = 1.5 + 0.1 * i
+    kinematic_state.acquisition_timestamp.seconds = 1634567890
+    kinematic_state.acquisition_timestamp.nanos = 123456789
+    for frame, parent in (
+        ("body", "odom"),
+        ("gravity_aligned_body", "body"),
+        ("vision", "body"),
+    ):
+        edge = kinematic_state.transforms_snapshot.child_to_parent_edge_map[frame]
+        edge.parent_frame_name = parent
+        edge.parent_tform_child.position.x = 1.25
+        edge.parent_tform_child.position.y = -0.5
+        edge.parent_tform_child.position.z = 0.52
+        edge.parent_tform_child.rotation.w = 0.99
+        edge.parent_tform_child.rotation.z = 0.05
+    kinematic_state.velocity_of_body_in_vision.linear.x = 0.31
+    kinematic_state.velocity_of_body_in_odom.linear.x = 0.31
+
+    state.power_state.motor_power_state = robot_state_pb2.PowerState.STATE_ON
+    state.power_state.shore_power_state = (
+        robot_state_pb2.PowerState.STATE_OFF_SHORE_POWER
+    )
+    state.power_state.locomotion_charge_percentage.value = 76.0
+    state.power_state.locomotion_estimated_runtime.seconds = 3600
+
+    battery = state.battery_states.add()
+    battery.identifier = "battery"
+    battery.charge_percentage.value = 76.0
+    battery.estimated_runtime.seconds = 3600
+    battery.current.value = -4.2
+    battery.voltage.value = 55.1
+    battery.temperatures.extend([31.5, 32.0, 31.8, 32.4, 31.9, 32.1])
+    battery.status = robot_state_pb2.BatteryState.STATUS_DISCHARGING
+
+    comms = state.comms_states.add()
+    comms.wifi_state.current_mode = robot_state_pb2.WiFiState.MODE_CLIENT
+    comms.wifi_state.essid = "spot-network"
+
+    for _ in range(4):
+        foot = state.foot_state.add()
+        foot.foot_position_rt_body.x = 0.3
+        foot.foot_position_rt_body.y = 0.17
+        foot.foot_position_rt_body.z = -0.5
+        foot.contact = robot_state_pb2.FootState.CONTACT_MADE
+    for i in range(3):
+        estop = state.estop_states.add()
+        estop.name = "estop{}".format(i)
+        estop.state = robot_state_pb2.EStopState.STATE_NOT_ESTOPPED
+    state.system_fault_state.SetInParent()
+    return state
+
+
+def make_robot_metrics():
+    metrics = robot_state_pb2.RobotMetrics()
+    metrics.timestamp.seconds = 1634567890
+    for i in range(40):
+        parameter = metrics.metrics.add()
+        parameter.label = "metric_{}".format(i)
+        parameter.float_value = 1000.0 + i
+        parameter.units = "s"
+    return metrics
+
+
+def legacy_state_payload(state):
+    """State payload as originally built by get_robot_state_loop."""
+
+    json_output = MessageToDict(state)
+    return json.dumps(
+        {
+            "kinematicState": json_output["kinematicState"],
+            "powerState": json_output["powerState"],
+            "batteryStates": json_output["batteryStates"],
+            "commsStates": json_output["commsStates"],
+        }
+    ).encode()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeat", help="Encodes timed per codec, default: 1000", type=int, default=1000
+    )
+    parser.add_argument(
+        "--state-fields",
+        help="Comma-separated paths of the published state fields, default: "
+        + STATE_FIELDS,
+        default=STATE_FIELDS,
+    )
+    options = parser.parse_args(argv)
+
+    state = make_robot_state()
+    metrics = make_robot_metrics()
+    projection = Projection(
+        robot_state_pb2.RobotState.DESCRIPTOR, parse_paths(options.state_fields)
+    )
+
+    def report(name, function):
+        size = len(function())
+        seconds = timeit.timeit(function, number=options.repeat) / options.repeat
+        print("  {:<12} {:7d} bytes {:9.1f} us".format(name, size, seconds * 1e6))
+
+    print("State ({}):".format(options.state_fields))
+    report("legacy", lambda: legacy_state_payload(state))
+    for codec in CODECS.values():
+        if codec.available:
+            report(codec.name, lambda codec=codec: encode(codec, state, projection))
+
+    print("Metrics:")
+    report("legacy", lambda: json.dumps(MessageToDict(metrics)).encode())
+    for codec in CODECS.values():
+        if codec.available:
+            report(codec.name, lambda codec=codec: encode(codec, metrics))
+
+    missing = [codec.name for codec in CODECS.values() if not codec.available]
+    if missing:
+        print("Not installed: " + ", ".join(missing))
+    return True
+
+
+if __name__ == "__main__":
+    if not main(sys.argv[1:]):
+        sys.exit(1)
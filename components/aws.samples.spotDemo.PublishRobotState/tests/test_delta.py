@@ -0,0 +1,128 @@
+from delta import DeltaEncoder, apply_delta, flatten
+
+STATE = {
+    "battery": {"charge": 80.0, "status": "RUNNING"},
+    "joints": [{"name": "fl.hx", "position": 0.1}, {"name": "fl.hy", "position": 0.2}],
+    "faults": [],
+}
+
+
+def changed(state, **updates):
+    """Returns a copy of state with dotted paths set to new values."""
+
+    return apply_delta(state, {"fields": updates})
+
+
+def test_flatten():
+    assert flatten(STATE) == {
+        "battery.charge": 80.0,
+        "battery.status": "RUNNING",
+        "joints.0.name": "fl.hx",
+        "joints.0.position": 0.1,
+        "joints.1.name": "fl.hy",
+        "joints.1.position": 0.2,
+        "faults": [],
+    }
+
+
+def test_first_snapshot_is_a_keyframe():
+    message = DeltaEncoder().encode(STATE, 0.0)
+
+    assert message == {"type": "keyframe", "seq": 1, "state": STATE}
+
+
+def test_changed_fields_are_sent_relative_to_the_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode(STATE, 0.0)
+
+    first = encoder.encode(changed(STATE, **{"battery.charge": 79.0}), 1.0)
+    second = encoder.encode(changed(STATE, **{"joints.1.position": 0.3}), 2.0)
+
+    assert first == {
+        "type": "delta",
+        "seq": 2,
+        "keyframe": 1,
+        "fields": {"battery.charge": 79.0},
+    }
+    # The charge is back to its keyframe value, so it is not sent again.
+    assert second["fields"] == {"joints.1.position": 0.3}
+    assert second["keyframe"] == 1
+
+
+def test_unchanged_snapshots_are_not_sent():
+    encoder = DeltaEncoder()
+    encoder.encode(STATE, 0.0)
+
+    assert encoder.encode(STATE, 1.0) is None
+    assert encoder.encode(STATE, 2.0) is None
+    assert encoder.encode(changed(STATE, **{"battery.status": "IDLE"}), 3.0)["seq"] == 4
+
+
+def test_keyframes_are_sent_at_the_interval():
+    encoder = DeltaEncoder(keyframe_interval=5.0)
+    encoder.encode(STATE, 0.0)
+
+    assert encoder.encode(STATE, 4.9) is None
+    assert encoder.encode(STATE, 5.0)["type"] == "keyframe"
+    assert encoder.encode(STATE, 9.9) is None
+
+
+def test_layout_changes_send_a_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode(STATE, 0.0)
+
+    grown = dict(STATE, faults=[{"name": "estop"}])
+
+    assert encoder.encode(grown, 1.0) == {"type": "keyframe", "seq": 2, "state": grown}
+
+
+def test_changes_below_the_default_threshold_are_not_sent():
+    encoder = DeltaEncoder(default_threshold=0.5)
+    encoder.encode(STATE, 0.0)
+
+    assert encoder.encode(changed(STATE, **{"battery.charge": 80.4}), 1.0) is None
+    assert encoder.encode(changed(STATE, **{"battery.charge": 80.6}), 2.0) is not None
+
+
+def test_the_longest_matching_threshold_prefix_applies():
+    encoder = DeltaEncoder(
+        thresholds={"joints": 1.0, "joints.*.position": 0.05, "joints.1": 0.5},
+        default_threshold=10.0,
+    )
+    encoder.encode(STATE, 0.0)
+
+    message = encoder.encode(
+        changed(
+            STATE,
+            **{"battery.charge": 85.0, "joints.0.position": 0.2, "joints.1.position": 0.3}
+        ),
+        1.0,
+    )
+
+    assert message["fields"] == {"joints.0.position": 0.2, "joints.1.position": 0.3}
+
+
+def test_threshold_prefixes_match_whole_keys():
+    encoder = DeltaEncoder(thresholds={"joint": 1.0})
+    encoder.encode(STATE, 0.0)
+
+    message = encoder.encode(changed(STATE, **{"joints.0.position": 0.2}), 1.0)
+
+    assert message["fields"] == {"joints.0.position": 0.2}
+
+
+def test_booleans_are_compared_exactly():
+    state = {"estop": False}
+    encoder = DeltaEncoder(default_threshold=1.0)
+    encoder.encode(state, 0.0)
+
+    assert encoder.encode({"estop": True}, 1.0)["fields"] == {"estop": True}
+
+
+def test_apply_delta_rebuilds_the_state():
+    encoder = DeltaEncoder()
+    keyframe = encoder.encode(STATE, 0.0)
+    state = changed(STATE, **{"battery.charge": 70.0, "joints.1.name": "fl.kn"})
+
+    assert apply_delta(keyframe["state"], encoder.encode(state, 1.0)) == state
+    assert keyframe["state"]["battery"]["charge"] == 80.0
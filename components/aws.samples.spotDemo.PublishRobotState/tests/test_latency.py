@@ -0,0 +1,72 @@
+import threading
+
+from latency import LatencyRecorder
+
+
+def test_summary_of_the_recorded_calls():
+    latency = LatencyRecorder()
+    for ms in range(1, 101):
+        latency.record("get_robot_state", ms / 1000)
+    latency.record("publish", 0.002)
+    latency.record_failure("publish")
+
+    assert latency.summary() == {
+        "get_robot_state": {
+            "count": 100,
+            "failures": 0,
+            "p50_ms": 51.0,
+            "p95_ms": 96.0,
+            "max_ms": 100.0,
+        },
+        "publish": {
+            "count": 1,
+            "failures": 1,
+            "p50_ms": 2.0,
+            "p95_ms": 2.0,
+            "max_ms": 2.0,
+        },
+    }
+
+
+def test_calls_that_only_failed_have_no_percentiles():
+    latency = LatencyRecorder()
+    latency.record_failure("get_robot_metrics")
+
+    assert latency.summary() == {"get_robot_metrics": {"count": 0, "failures": 1}}
+
+
+def test_percentiles_cover_the_latest_window_calls():
+    latency = LatencyRecorder(window=10)
+    for ms in range(1, 21):
+        latency.record("publish", ms / 1000)
+
+    summary = latency.summary()["publish"]
+
+    assert summary["count"] == 20
+    assert (summary["p50_ms"], summary["max_ms"]) == (16.0, 20.0)
+
+
+def test_summary_starts_over():
+    latency = LatencyRecorder()
+    latency.record("publish", 0.01)
+    latency.summary()
+
+    assert latency.summary() == {}
+    latency.record("publish", 0.02)
+    assert latency.summary()["publish"]["max_ms"] == 20.0
+
+
+def test_calls_are_recorded_from_many_threads():
+    latency = LatencyRecorder(window=10)
+
+    def record():
+        for _ in range(1000):
+            latency.record("publish", 0.001)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert latency.summary()["publish"]["count"] == 4000
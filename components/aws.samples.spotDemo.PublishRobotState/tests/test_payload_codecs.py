@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from bosdyn.api import robot_state_pb2
+from google.protobuf.json_format import MessageToDict
+
+import payload_codecs
+from payload_codecs import CODECS, codec_topic, decode_payload, get_codec
+
+
+def robot_state():
+    state = robot_state_pb2.RobotState()
+    battery = state.battery_states.add()
+    battery.identifier = "battery"
+    battery.charge_percentage.value = 80.0
+    joint = state.kinematic_state.joint_states.add()
+    joint.name = "fl.hx"
+    joint.position.value = 0.25
+    return state
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_payloads_are_decoded_from_their_topic(name):
+    codec = CODECS[name]
+    if not codec.available:
+        pytest.skip("{} is not installed".format(name))
+    state = robot_state()
+    value = state if codec.takes_message else MessageToDict(state)
+
+    topic = codec_topic("robots/spot/state", codec)
+
+    assert decode_payload(topic, codec.encode(value)) == MessageToDict(state)
+
+
+def test_json_is_published_to_the_plain_topic():
+    assert codec_topic("robots/spot/state", get_codec("json")) == "robots/spot/state"
+    assert (
+        codec_topic("robots/spot/metrics", get_codec("protobuf"))
+        == "robots/spot/metrics/protobuf"
+    )
+
+
+def test_delta_topics_are_decoded_with_their_codec():
+    codec = get_codec("json-zstd")
+    message = {"type": "delta", "seq": 2, "keyframe": 1, "fields": {"a.b": 1.5}}
+
+    topic = codec_topic("robots/spot/state/delta", codec)
+
+    assert decode_payload(topic, codec.encode(message)) == message
+
+
+def test_unknown_codecs_are_rejected():
+    with pytest.raises(ValueError, match="Unknown codec: xml"):
+        get_codec("xml")
+
+
+def test_codecs_without_their_package_are_rejected(monkeypatch):
+    monkeypatch.setattr(CODECS["cbor"], "available", False)
+
+    with pytest.raises(ValueError, match="cbor codec needs a package"):
+        get_codec("cbor")
+
+
+def test_main_prints_the_decoded_payload(tmp_path, capsys):
+    payload = tmp_path / "payload.bin"
+    payload.write_bytes(robot_state().SerializeToString())
+
+    assert payload_codecs.main(["robots/spot/state/protobuf", str(payload)])
+
+    assert json.loads(capsys.readouterr().out) == MessageToDict(robot_state())
@@ -0,0 +1,151 @@
+import pytest
+from bosdyn.api import robot_state_pb2
+from google.protobuf.json_format import MessageToDict
+
+from projection import Projection, parse_paths
+
+DESCRIPTOR = robot_state_pb2.RobotState.DESCRIPTOR
+
+
+def robot_state():
+    state = robot_state_pb2.RobotState()
+    for name, position in (("fl.hx", 0.1), ("fl.hy", 0.2)):
+        joint = state.kinematic_state.joint_states.add()
+        joint.name = name
+        joint.position.value = position
+        joint.velocity.value = 1.0
+    state.kinematic_state.acquisition_timestamp.seconds = 1700000000
+    velocity = state.kinematic_state.velocity_of_body_in_vision
+    velocity.linear.x = 0.5
+    velocity.angular.z = 0.1
+    edges = state.kinematic_state.transforms_snapshot.child_to_parent_edge_map
+    edges["body"].parent_frame_name = "odom"
+    edges["body"].parent_tform_child.position.x = 1.0
+    edges["body"].parent_tform_child.rotation.w = 1.0
+    edges["odom"].parent_frame_name = ""
+
+    battery = state.battery_states.add()
+    battery.identifier = "battery"
+    battery.charge_percentage.value = 80.0
+    battery.status = robot_state_pb2.BatteryState.STATUS_DISCHARGING
+    fault = state.system_fault_state.faults.add()
+    fault.name = "fan"
+    fault.uid = 2**40
+    state.system_fault_state.aggregated["fan"] = robot_state_pb2.SystemFault.SEVERITY_WARN
+    return state
+
+
+@pytest.mark.parametrize(
+    "paths",
+    [
+        ["kinematic_state.joint_states.position"],
+        ["kinematic_state.joint_states.name", "kinematic_state.joint_states.velocity"],
+        ["kinematic_state.acquisition_timestamp"],
+        ["kinematic_state.velocity_of_body_in_vision.linear"],
+        ["kinematic_state.transforms_snapshot"],
+        ["kinematic_state.transforms_snapshot.child_to_parent_edge_map.parent_frame_name"],
+        ["battery_states.charge_percentage", "battery_states.status"],
+        ["system_fault_state.faults.uid", "system_fault_state.aggregated"],
+        ["kinematic_state", "kinematic_state.joint_states.name"],
+        ["power_state"],
+    ],
+)
+def test_to_dict_matches_message_to_dict_of_the_projected_message(paths):
+    projection = Projection(DESCRIPTOR, paths)
+    state = robot_state()
+
+    projected = projection.to_message(state)
+
+    assert projection.to_dict(state) == MessageToDict(projected)
+
+
+def test_to_message_keeps_only_the_selected_fields():
+    projection = Projection(
+        DESCRIPTOR,
+        [
+            "kinematic_state.joint_states.position",
+            "kinematic_state.transforms_snapshot.child_to_parent_edge_map.parent_frame_name",
+        ],
+    )
+
+    projected = projection.to_message(robot_state())
+
+    expected = robot_state_pb2.RobotState()
+    for position in (0.1, 0.2):
+        expected.kinematic_state.joint_states.add().position.value = position
+    edges = expected.kinematic_state.transforms_snapshot.child_to_parent_edge_map
+    edges["body"].parent_frame_name = "odom"
+    edges["odom"].SetInParent()
+    assert projected == expected
+
+
+def test_to_dict_renders_special_floats_as_message_to_dict():
+    projection = Projection(
+        DESCRIPTOR, ["kinematic_state.velocity_of_body_in_vision.linear"]
+    )
+    state = robot_state()
+    linear = state.kinematic_state.velocity_of_body_in_vision.linear
+    linear.x, linear.y, linear.z = float("nan"), float("inf"), float("-inf")
+
+    assert projection.to_dict(state) == {
+        "kinematicState": {
+            "velocityOfBodyInVision": {
+                "linear": {"x": "NaN", "y": "Infinity", "z": "-Infinity"}
+            }
+        }
+    }
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError, match="has no field joints"):
+        Projection(DESCRIPTOR, ["kinematic_state.joints"])
+    with pytest.raises(ValueError, match="not a message field"):
+        Projection(DESCRIPTOR, ["battery_states.status.value"])
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "kinematic_state.joint_states.position.value",
+        "kinematic_state.acquisition_timestamp.seconds",
+    ],
+)
+def test_paths_below_well_known_types_are_rejected(path):
+    with pytest.raises(ValueError, match="can only be selected as a whole"):
+        Projection(DESCRIPTOR, [path])
+
+
+def test_json_path():
+    projection = Projection(
+        DESCRIPTOR,
+        ["kinematic_state.joint_states", "kinematic_state.transforms_snapshot"],
+    )
+
+    assert (
+        projection.json_path("kinematic_state.joint_states.position")
+        == "kinematicState.jointStates.*.position"
+    )
+    assert projection.json_path("kinematic_state") == "kinematicState"
+    assert (
+        projection.json_path(
+            "kinematic_state.transforms_snapshot.child_to_parent_edge_map"
+            ".parent_tform_child"
+        )
+        == "kinematicState.transformsSnapshot.childToParentEdgeMap.*.parentTformChild"
+    )
+
+
+def test_json_path_of_unselected_fields_is_rejected():
+    projection = Projection(DESCRIPTOR, ["kinematic_state.joint_states.position"])
+
+    with pytest.raises(ValueError, match="not selected"):
+        projection.json_path("kinematic_state.joint_states.velocity")
+    with pytest.raises(ValueError, match="has no field"):
+        projection.json_path("kinematicState.jointStates")
+
+
+def test_parse_paths():
+    assert parse_paths(" battery_states ,, kinematic_state.joint_states,") == [
+        "battery_states",
+        "kinematic_state.joint_states",
+    ]
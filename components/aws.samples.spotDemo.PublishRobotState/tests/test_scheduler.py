@@ -0,0 +1,95 @@
+import threading
+import time
+
+from scheduler import Scheduler
+
+
+def stop_after(scheduler, ticks, function=None):
+    """Returns a stream function that stops the scheduler on its given tick."""
+
+    calls = []
+
+    def tick():
+        calls.append(time.monotonic())
+        if len(calls) == ticks:
+            scheduler.stop()
+        if function is not None:
+            function(len(calls))
+
+    return tick, calls
+
+
+def test_streams_with_a_rate_of_zero_are_not_added():
+    scheduler = Scheduler()
+    scheduler.add("disabled", 0, lambda: None)
+
+    assert scheduler.streams == []
+
+
+def test_run_returns_without_streams():
+    Scheduler().run()
+
+
+def test_streams_run_at_their_rates():
+    scheduler = Scheduler()
+    fast, fast_calls = stop_after(scheduler, 20)
+    slow = []
+    scheduler.add("fast", 100, fast)
+    scheduler.add("slow", 25, lambda: slow.append(time.monotonic()))
+
+    scheduler.run()
+
+    # Both streams tick right away, then every period from the start time.
+    assert 4 <= len(slow) <= 7
+    assert 0.17 <= fast_calls[-1] - fast_calls[0] < 0.4
+
+
+def test_ticks_do_not_drift():
+    scheduler = Scheduler()
+    tick, calls = stop_after(scheduler, 10, lambda n: time.sleep(0.005))
+    scheduler.add("busy", 100, tick)
+
+    scheduler.run()
+
+    # Ticks taking half the period do not push back the ones after them.
+    assert calls[-1] - calls[0] < 0.09 + 0.045
+
+
+def test_missed_ticks_are_skipped():
+    scheduler = Scheduler()
+    tick, calls = stop_after(
+        scheduler, 3, lambda n: time.sleep(0.035) if n == 1 else None
+    )
+    scheduler.add("slow", 100, tick)
+
+    scheduler.run()
+
+    stream = scheduler.streams[0]
+    assert stream.skipped >= 3
+    assert stream.ticks == len(calls) + stream.skipped
+
+
+def test_failing_streams_keep_running():
+    scheduler = Scheduler()
+
+    def fail(n):
+        raise RuntimeError("tick {}".format(n))
+
+    tick, calls = stop_after(scheduler, 3, fail)
+    scheduler.add("failing", 200, tick)
+
+    scheduler.run()
+
+    assert len(calls) == 3
+
+
+def test_stop_interrupts_the_wait_for_the_next_tick():
+    scheduler = Scheduler()
+    scheduler.add("rare", 0.01, lambda: None)
+    threading.Timer(0.05, scheduler.stop).start()
+
+    start = time.monotonic()
+    scheduler.run()
+
+    assert time.monotonic() - start < 1.0
+    assert scheduler.streams[0].ticks == 1
@@ -0,0 +1,238 @@
+"""
+Camera pull mode of the compute bridge.
+
+Instead of waiting for the robot to push images, the bridge captures frames from
+selected image sources itself at a fixed rate and keeps the latest detections of every
+source. NetworkCompute requests that name one of these sources in
+input_data.image_source_and_service are answered from the latest results right away.
+
+Frames are requested asynchronously on a fixed schedule, so the next frame of a source
+is already being captured while the current one is in inference. A source has at most
+FRAMES_IN_FLIGHT frames being captured or in inference; ticks that find it busy are
+skipped for that source.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from bosdyn.api import header_pb2
+from bosdyn.api import network_compute_bridge_pb2
+from google.protobuf import wrappers_pb2
+
+from postprocessing import error_response
+
+logger = logging.getLogger(__name__)
+
+# One frame in inference and the next one being captured.
+FRAMES_IN_FLIGHT = 2
+
+
+class LatestResults:
+    """Latest response computed for every pulled image source.
+
+    Args:
+        sources (list): Names of the image sources.
+        model_name (str): Model the frames are run through.
+        min_confidence (float): Confidence threshold the frames are run with.
+        max_age (float): Seconds a result is used for. Requests wait up to this long
+            for a fresh result when the latest one is older.
+    """
+
+    def __init__(self, sources, model_name, min_confidence, max_age=1.0):
+        self.sources = list(sources)
+        self.model_name = model_name
+        self.min_confidence = min_confidence
+        self.max_age = max_age
+
+        self._results = {}
+        self._condition = threading.Condition()
+
+    def __contains__(self, source):
+        return source in self.sources
+
+    def put(self, source, out_proto, sequence=0):
+        """Stores the response for a frame, unless a later frame of the same source
+        (with a higher sequence number) was stored already."""
+
+        with self._condition:
+            latest = self._results.get(source)
+            if latest is not None and latest[2] > sequence:
+                return
+            self._results[source] = (out_proto, time.monotonic(), sequence)
+            self._condition.notify_all()
+
+    def get(self, source):
+        """Returns the latest response of a source once it is at most max_age seconds
+        old, waiting up to max_age seconds for a fresh one, or None."""
+
+        deadline = time.monotonic() + self.max_age
+        with self._condition:
+            while True:
+                result = self._results.get(source)
+                now = time.monotonic()
+                if result is not None and now - result[1] <= self.max_age:
+                    return result[0]
+                if now >= deadline:
+                    return None
+                self._condition.wait(deadline - now)
+
+    def answer(self, request):
+        """Builds the response to a request for a pulled source.
+
+        Detections below the confidence threshold of the request are left out.
+        """
+
+        source = request.input_data.image_source_and_service.image_source
+        if request.input_data.model_name != self.model_name:
+            return error_response(
+                header_pb2.CommonError.CODE_INVALID_REQUEST,
+                'Image source "{}" is only pulled for model "{}".'.format(
+                    source, self.model_name
+                ),
+            )
+
+        latest = self.get(source)
+        if latest is None:
+            return error_response(
+                header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR,
+                'No recent result for image source "{}".'.format(source),
+            )
+
+        out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+        out_proto.CopyFrom(latest)
+        if request.input_data.min_confidence > self.min_confidence:
+            kept = [
+                obj
+                for obj in out_proto.object_in_image
+                if confidence(obj) >= request.input_data.min_confidence
+            ]
+            del out_proto.object_in_image[:]
+            out_proto.object_in_image.extend(kept)
+        return out_proto
+
+
+class CameraPuller:
+    """Captures frames from image sources at a fixed rate and runs them through the
+    compute bridge.
+
+    Args:
+        image_client (ImageClient): Client of the robot's image service.
+        latest_results (LatestResults): Buffer the responses are stored in. Its sources,
+            model name and confidence threshold are used for the requests.
+        submit: Function taking a NetworkComputeRequest and returning a
+            concurrent.futures.Future of (response, timings), e.g. the _submit method
+            of the servicer.
+        rate (float): Frames per second captured from every source.
+    """
+
+    def __init__(self, image_client, latest_results, submit, rate):
+        self.image_client = image_client
+        self.latest_results = latest_results
+        self.submit = submit
+        self.period = 1.0 / rate
+
+        self._in_flight = collections.Counter()
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="camera-puller", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stopped.wait(max(0.0, next_tick - time.monotonic())):
+            # Ticks are scheduled from the start time, so they do not drift.
+            next_tick += self.period
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.period
+
+            with self._lock:
+                sources = [
+                    source
+                    for source in self.latest_results.sources
+                    if self._in_flight[source] < FRAMES_IN_FLIGHT
+                ]
+                self._in_flight.update(sources)
+            if not sources:
+                continue
+
+            self._sequence += 1
+            sequence = self._sequence
+            try:
+                future = self.image_client.get_image_from_sources_async(sources)
+            except Exception as e:
+                logger.error("Failed to request images: " + repr(e))
+                self._done(sources)
+                continue
+            future.add_done_callback(
+                lambda future, sources=sources, sequence=sequence: self._on_images(
+                    future, sources, sequence
+                )
+            )
+
+    def _on_images(self, future, sources, sequence):
+        try:
+            image_responses = future.result()
+        except Exception as e:
+            logger.error("Failed to capture images: " + repr(e))
+            self._done(sources)
+            return
+
+        received = set()
+        for image_response in image_responses:
+            source = image_response.source.name
+            received.add(source)
+
+            request = network_compute_bridge_pb2.NetworkComputeRequest()
+            request.input_data.model_name = self.latest_results.model_name
+            request.input_data.min_confidence = self.latest_results.min_confidence
+            request.input_data.image.CopyFrom(image_response.shot.image)
+
+            try:
+                self.submit(request).add_done_callback(
+                    lambda result, source=source: self._on_result(
+                        result, source, sequence
+                    )
+                )
+            except Exception as e:
+                logger.error("Failed to submit image: " + repr(e))
+                self._done([source])
+
+        self._done(set(sources) - received)
+
+    def _on_result(self, future, source, sequence):
+        try:
+            out_proto, _ = future.result()
+            if out_proto.header.error.code in (
+                header_pb2.CommonError.CODE_UNSPECIFIED,
+                header_pb2.CommonError.CODE_OK,
+            ):
+                self.latest_results.put(source, out_proto, sequence)
+            else:
+                logger.error(
+                    "Inference failed for {}: {}".format(
+                        source, out_proto.header.error.message
+                    )
+                )
+        finally:
+            self._done([source])
+
+    def _done(self, sources):
+        with self._lock:
+            self._in_flight.subtract(sources)
+
+
+def confidence(obj):
+    value = wrappers_pb2.FloatValue()
+    if obj.additional_properties.Unpack(value):
+        return value.value
+    return 0.0
@@ -14,10 +14,12 @@ services registered with Spot.
 """
 
 import argparse
-import io
+import asyncio
+import collections
+import functools
 import multiprocessing
-from multiprocessing import Process, Queue
 import os
+import signal
 import sys
 import time
 import logging
@@ -26,10 +28,7 @@ import json
 
 import cv2
 import numpy as np
-from PIL import Image
-from scipy import ndimage
 
-from bosdyn.api.image_pb2 import ImageSource
 from bosdyn.api import network_compute_bridge_service_pb2_grpc
 from bosdyn.api import network_compute_bridge_service_pb2
 from bosdyn.api import network_compute_bridge_pb2
@@ -56,14 +55,76 @@ from google.protobuf import any_pb2
 from google.protobuf import wrappers_pb2
 import socket
 
-from edge_manager_client import EdgeManagerClient
+from camera_pull import CameraPuller, LatestResults
+from edge_manager_client import AGENT_SOCKET, EdgeManagerClient
+from debug_writer import DebugImageWriter
+from frame_transport import SharedFrameRing
+from image_decoding import ImageDecodeError, decode_image
+from inference_pool import InferencePool, PoolFull
+from metrics import BridgeMetrics, MetricsPublisher, MetricsServer
+from model_manager import ModelManager, discover_models
+from model_registry import ModelRegistry
+from request_options import (
+    DEFAULT_OPTIONS,
+    PRIORITIES,
+    InvalidRequestOptions,
+    parse_request_options,
+)
+from result_cache import CACHE_MODES, ResultCache
+import postprocessing
+from postprocessing import error_response
+import preprocessing
+import tiling
+from tracking import StreamTracker
 import awsiot.greengrasscoreipc
-from awsiot.greengrasscoreipc.model import GetSecretValueRequest
+from awsiot.greengrasscoreipc.model import (
+    GetSecretValueRequest,
+    PublishToIoTCoreRequest,
+)
 
-IMAGE_WIDTH = 1920  # 640
-IMAGE_HEIGHT = 1080  # 480
 MODEL_INPUT_SIZE = 512
 MODEL_NAME = "gluoncv-model"
+BATCH_REPORT_INTERVAL = 100
+DEBUG_IMAGE_BASENAME = "sagemaker_server_output"
+
+# A request queued for the workers. When the frame descriptor is set, the image data
+# is in the shared frame ring. submitted_at is the time.monotonic() of queueing and
+# deadline the time.monotonic() after which the caller no longer waits, or None.
+WorkItem = collections.namedtuple(
+    "WorkItem", ["request", "model", "options", "descriptor", "submitted_at", "deadline"]
+)
+
+# A decoded request waiting for its predictions. box_transform maps the model outputs
+# for the whole image back to pixels of the source image. tile_layout holds the corners
+# of the tiles sent along with the image in tiling mode, and is None otherwise.
+PendingItem = collections.namedtuple(
+    "PendingItem",
+    [
+        "request_id",
+        "request",
+        "options",
+        "out_proto",
+        "image",
+        "box_transform",
+        "tile_layout",
+        "timings",
+    ],
+)
+
+# Settings of the StreamTrackers created for streaming requests.
+StreamOptions = collections.namedtuple(
+    "StreamOptions", ["detect_every", "iou_threshold", "max_age", "idle_timeout"]
+)
+DEFAULT_STREAM_OPTIONS = StreamOptions(
+    detect_every=3, iou_threshold=0.3, max_age=2.0, idle_timeout=60.0
+)
+
+# A batch whose Predict calls were sent to the agent but not answered yet: the batch
+# items, the responses that are already known and a (model_info, items,
+# wait_for_predictions, batch_timings) tuple per Predict call.
+PendingBatch = collections.namedtuple("PendingBatch", ["batch", "responses", "calls"])
+
+IDENTITY_TRANSFORM = preprocessing.scaling(1.0, 1.0)
 MODEL_CLASSES = [
     "aeroplane",
     "bicycle",
@@ -89,251 +150,879 @@ MODEL_CLASSES = [
 
 logger = logging.getLogger(__name__)
 
-# This is a multiprocessing.Queue for communication between the main process and the
-# Tensorflow processes.
-REQUEST_QUEUE = Queue()
 
-# This is a multiprocessing.Queue for communication between the Tensorflow processes and
-# the display process.
-RESPONSE_QUEUE = Queue()
+def process_images(
+    worker_id, request_queue, response_queue, options, model_extension, frame_ring
+):
+    """Starts Edge Manager client and detects objects in the incoming images.
 
+    Requests are validated against the model registry before they are queued, so the
+    workers only run inference.
+    """
 
-def start_processes(options, model_extension):
-    """Starts Tensorflow processes in parallel.
+    edge_manager_client = EdgeManagerClient(
+        options.agent_socket,
+        num_channels=options.agent_channels,
+        timeout=options.agent_timeout or None,
+        retries=options.agent_retries,
+        keep_aspect_ratio=options.keep_aspect_ratio,
+    )
 
-    It does not keep track of the processes once they are started because they run indefinitely
-    and are never joined back to the main process.
-    """
+    debug_writer = None
+    if not options.no_debug:
+        basename = DEBUG_IMAGE_BASENAME
+        if options.num_workers > 1:
+            basename += "_worker{}".format(worker_id)
+        debug_writer = DebugImageWriter(
+            basename,
+            every_n=options.debug_every_n,
+            queue_size=options.debug_queue_size,
+            ring_size=options.debug_ring_size,
+        )
+
+    max_batch_wait = options.max_batch_wait_ms / 1000.0
+    batch_sizes = collections.Counter()
+    in_flight = collections.deque()
+    stopping = False
+
+    # Up to agent_in_flight batches are sent to the agent before the oldest one is
+    # waited for, so the next batch is decoded and preprocessed during inference.
+    while not stopping or in_flight:
+        if not stopping and len(in_flight) < options.agent_in_flight:
+            # Only block for new requests when there is nothing left to answer. While
+            # the agent is busy, only the requests already queued are batched.
+            batch, stopping = collect_batch(
+                request_queue,
+                options.max_batch_size,
+                max_batch_wait if not in_flight else 0,
+                block=not in_flight,
+            )
+            if batch:
+                try:
+                    in_flight.append(
+                        start_batch(batch, edge_manager_client, frame_ring)
+                    )
+                except Exception as e:
+                    fail_batch(batch, e, response_queue)
+                    continue
+                batch_sizes[len(batch)] += 1
+                if sum(batch_sizes.values()) % BATCH_REPORT_INTERVAL == 0:
+                    logger.info(
+                        "Worker {} batch sizes: {}".format(
+                            worker_id, dict(sorted(batch_sizes.items()))
+                        )
+                    )
+                continue
 
-    process = Process(target=process_images, args=([options, model_extension]))
-    process.start()
+        if in_flight:
+            pending_batch = in_flight.popleft()
+            try:
+                responses = finish_batch(pending_batch, debug_writer, frame_ring)
+            except Exception as e:
+                fail_batch(pending_batch.batch, e, response_queue)
+                continue
+            for request_id, out_proto, timings in responses:
+                response_queue.put((request_id, (out_proto, timings)))
+
+    edge_manager_client.close()
+    if debug_writer is not None:
+        debug_writer.close()
 
 
-def process_images(options, model_extension):
-    """Starts Edge Manager client and detects objects in the incoming images."""
+def collect_batch(request_queue, max_batch_size, max_wait, block=True):
+    """Collects up to max_batch_size requests from the queue.
 
-    edge_manager_client = EdgeManagerClient()
+    Blocks until the first request arrives, or returns an empty batch right away if
+    there is none and block is False, and then waits at most max_wait seconds for the
+    rest of the batch.
+
+    Returns:
+        Tuple of the list of (request_id, request) items and whether the pool asked the
+        worker to stop.
+    """
 
     try:
-        edge_manager_client.unload_model(MODEL_NAME)
-    except Exception as e:
-        logger.error(f"Error unloading the model: {e}")
+        item = request_queue.get(block=block)
+    except queue.Empty:
+        return [], False
+    if item is None:
+        return [], True
+
+    batch = [item]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                item = request_queue.get(timeout=remaining)
+            else:
+                item = request_queue.get_nowait()
+        except queue.Empty:
+            break
+
+        if item is None:
+            return batch, True
+        batch.append(item)
+
+    return batch, False
+
+
+def handle_batch(batch, edge_manager_client, debug_writer=None, frame_ring=None):
+    """Runs a batch of requests through the models.
+
+    The images of all requests for the same model are stacked into a single Predict
+    call and the outputs are split back per request.
+
+    Args:
+        batch: List of (request_id, WorkItem) items. When the frame descriptor of an
+            item is set, the image data is read from frame_ring and the slot is released
+            once the batch is answered.
+
+    Returns:
+        List of (request_id, response, timings) tuples, one for every request in the
+        batch. timings maps stage names to seconds; batched stages report the time of
+        the whole batch.
+    """
+
+    return finish_batch(
+        start_batch(batch, edge_manager_client, frame_ring), debug_writer, frame_ring
+    )
+
+
+def start_batch(batch, edge_manager_client, frame_ring=None):
+    """First half of handle_batch: decodes the images and sends the Predict calls
+    without waiting for them.
+
+    Returns:
+        PendingBatch to pass to finish_batch, which releases the frame slots.
+    """
 
     try:
-        edge_manager_client.load_model(MODEL_NAME, options.model_dir)
-    except Exception as e:
-        logger.error(f"Error loading the model: {e}")
-
-    while True:
-        request = REQUEST_QUEUE.get()
-
-        if isinstance(request, network_compute_bridge_pb2.ListAvailableModelsRequest):
-            out_proto = network_compute_bridge_pb2.ListAvailableModelsResponse()
-            response = edge_manager_client.list_models()
-            for f in response.models:
-                out_proto.available_models.append(f.name)
-            RESPONSE_QUEUE.put(out_proto)
-            continue
-        else:
+        responses = []
+        models = {}
+        pending = collections.defaultdict(list)
+
+        for request_id, item in batch:
+            now = time.monotonic()
+            timings = {"queue_wait": now - item.submitted_at}
+            if item.deadline is not None and now > item.deadline:
+                # The caller gave up waiting, so the frame is not worth decoding.
+                out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+                out_proto.header.error.code = (
+                    header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR
+                )
+                out_proto.header.error.message = (
+                    "Error: deadline exceeded before inference."
+                )
+                responses.append((request_id, out_proto, timings))
+                continue
+
+            start = timer()
+            data = None
+            if item.descriptor is not None:
+                data = frame_ring.view(item.descriptor)
             out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+            image = prepare_request(
+                item.request, out_proto, item.model, data, item.options
+            )
+            timings["decode"] = timer() - start
+            if image is None:
+                responses.append((request_id, out_proto, timings))
+                continue
 
-        response = edge_manager_client.list_models()
+            source_height, source_width = source_size(item.request, image)
+            box_transform = edge_manager_client.preprocessor(
+                item.model.input_size
+            ).box_transform(image.shape[0], image.shape[1], source_height, source_width)
+
+            layout = None
+            if item.options.tiling:
+                layout = tiling.tile_layout(
+                    image.shape[0],
+                    image.shape[1],
+                    item.model.input_size,
+                    item.options.tile_overlap,
+                )
 
-        models = []
-        for m in response.models:
-            models.append(m.name)
+            pending[item.model.name].append(
+                PendingItem(
+                    request_id,
+                    item.request,
+                    item.options,
+                    out_proto,
+                    image,
+                    box_transform,
+                    layout,
+                    timings,
+                )
+            )
+            models[item.model.name] = item.model
 
-        # Find the model
-        if request.input_data.model_name not in models:
-            err_str = (
-                'Cannot find model "'
-                + request.input_data.model_name
-                + '" in loaded models.'
+        calls = []
+        for model_name, items in pending.items():
+            model = models[model_name]
+            logger.info(
+                "Running batch of {} image(s) on model {}".format(len(items), model.name)
             )
-            print(err_str)
-
-            # Set the error in the header.
-            out_proto.header.error.code = header_pb2.CommonError.CODE_INVALID_REQUEST
-            out_proto.header.error.message = err_str
-            RESPONSE_QUEUE.put(out_proto)
-            continue
-
-        if request.input_data.image.format == image_pb2.Image.FORMAT_RAW:
-            logger.info("RAW!!!!!!")
-            pil_image = Image.open(io.BytesIO(request.input_data.image.data))
-            pil_image = ndimage.rotate(pil_image, 0)
-            if (
-                request.input_data.image.pixel_format
-                == image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8
-            ):
-                image = cv2.cvtColor(
-                    pil_image, cv2.COLOR_GRAY2RGB
-                )  # Converted to RGB for Tensorflow
-            elif (
-                request.input_data.image.pixel_format
-                == image_pb2.Image.PIXEL_FORMAT_RGB_U8
-            ):
-                # Already in the correct format
-                # image = pil_image
-                image = cv2.cvtColor(pil_image, cv2.COLOR_RGB2RGB)
-            else:
-                err_str = (
-                    "Error: image input in unsupported pixel format: ",
-                    request.input_data.image.pixel_format,
+            batch_timings = {}
+            try:
+                wait_for_predictions = edge_manager_client.get_predictions_async(
+                    model.name,
+                    [
+                        image
+                        for pending_item in items
+                        for image in model_inputs(pending_item, model.input_size)
+                    ],
+                    model.input_size,
+                    batch_timings,
                 )
-                print(err_str)
+            except Exception as e:
+                fail_items(items, e, responses)
+                continue
+            calls.append((model, items, wait_for_predictions, batch_timings))
+    except Exception:
+        release_frames(batch, frame_ring)
+        raise
 
-                # Set the error in the header.
-                out_proto.header.error.code = (
-                    header_pb2.CommonError.CODE_INVALID_REQUEST
-                )
-                out_proto.header.error.message = err_str
-                RESPONSE_QUEUE.put(out_proto)
+    return PendingBatch(batch, responses, calls)
+
+
+def finish_batch(pending_batch, debug_writer=None, frame_ring=None):
+    """Second half of handle_batch: waits for the Predict calls of a batch and builds
+    the responses."""
+
+    batch, responses, calls = pending_batch
+    try:
+        for model, items, wait_for_predictions, batch_timings in calls:
+            try:
+                predictions = wait_for_predictions()
+            except Exception as e:
+                fail_items(items, e, responses)
                 continue
-        elif request.input_data.image.format == image_pb2.Image.FORMAT_JPEG:
-            logger.info("JPEG!!!!!!")
-            dtype = np.uint8
-            jpg = np.frombuffer(request.input_data.image.data, dtype=dtype)
-            image = cv2.imdecode(jpg, -1)
 
-            if len(image.shape) < 3:
-                logger.info("less than 3 channels!!")
-                # Single channel image, convert to RGB.
-                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+            predictions = iter(predictions)
+            for pending_item in items:
+                timings = pending_item.timings
+                timings.update(batch_timings)
+                start = timer()
+                options = pending_item.options
+                box_transform = pending_item.box_transform
+                prediction = next(predictions)
+                if pending_item.tile_layout is not None:
+                    tile_predictions = [
+                        next(predictions) for _ in range(len(pending_item.tile_layout))
+                    ]
+                    prediction = tiling.merge_predictions(
+                        [prediction] + tile_predictions,
+                        pending_item.tile_layout,
+                        box_transform,
+                        frame_to_source(pending_item.request, pending_item.image),
+                    )
+                    # The merged boxes are already in source pixels.
+                    box_transform = IDENTITY_TRANSFORM
+                    if options.nms_iou_threshold <= 0:
+                        options = options._replace(
+                            nms_iou_threshold=tiling.MERGE_IOU_THRESHOLD
+                        )
+                build_response(
+                    pending_item.request,
+                    pending_item.image,
+                    prediction,
+                    box_transform,
+                    pending_item.out_proto,
+                    model,
+                    options,
+                    debug_writer,
+                )
+                timings["build_response"] = timer() - start
+                responses.append((pending_item.request_id, pending_item.out_proto, timings))
+    finally:
+        release_frames(batch, frame_ring)
+
+    return responses
+
 
-        logger.info("SHAPE: {}".format(image.shape))
+def model_inputs(pending_item, input_size):
+    """Returns the images run through the model for a request: the whole frame,
+    followed by its tiles in tiling mode."""
 
-        boxes, scores, classes = edge_manager_client.get_prediction(
-            request.input_data.model_name, image
+    if pending_item.tile_layout is None:
+        return [pending_item.image]
+    return [pending_item.image] + tiling.tile_views(
+        pending_item.image, pending_item.tile_layout, input_size
+    )
+
+
+def source_size(request, image):
+    """Returns the (height, width) of the request image before decoding, which can be
+    larger than the decoded image. Falls back to the decoded size if it is not set."""
+
+    source = request.input_data.image
+    return source.rows or image.shape[0], source.cols or image.shape[1]
+
+
+def frame_to_source(request, image):
+    """Returns the BoxTransform from pixels of the decoded image to source pixels."""
+
+    source_height, source_width = source_size(request, image)
+    return preprocessing.scaling(
+        source_width / image.shape[1], source_height / image.shape[0]
+    )
+
+
+def fail_items(items, error, responses):
+    """Answers the requests of a failed Predict call with an internal error."""
+
+    err_str = "Inference failed: " + repr(error)
+    logger.error(err_str)
+    for pending_item in items:
+        out_proto = pending_item.out_proto
+        out_proto.header.error.code = header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR
+        out_proto.header.error.message = err_str
+        responses.append((pending_item.request_id, out_proto, pending_item.timings))
+
+
+def fail_batch(batch, error, response_queue):
+    """Answers every request of a batch that failed unexpectedly with an internal error,
+    so that the worker keeps serving and no caller waits forever."""
+
+    logger.exception("Batch of {} request(s) failed".format(len(batch)))
+    for request_id, _ in batch:
+        out_proto = error_response(
+            header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR,
+            "Error: batch failed: " + repr(error),
         )
+        response_queue.put((request_id, (out_proto, {})))
 
-        logger.info("BOXES")
-        logger.info(boxes)
 
-        logger.info("SCORES")
-        logger.info(scores)
+def detach_image(item, frame_ring):
+    """Moves the image data of a WorkItem into the shared frame ring.
 
-        logger.info("CLASSES")
-        logger.info(classes)
+    Called by the inference pool's feeder right before the item is handed to a worker,
+    so requests that are still waiting in the pool do not hold a slot.
 
-        num_objects = 0
+    Returns:
+        The WorkItem with the FrameDescriptor of the data, or the item as it is if the
+        data does not fit a slot or all slots are taken and it is sent inline.
+    """
 
-        for i in range(len(boxes)):
+    image = item.request.input_data.image
+    descriptor = frame_ring.put(image.data)
+    if descriptor is None:
+        return item
+    image.ClearField("data")
+    return item._replace(descriptor=descriptor)
 
-            label = MODEL_CLASSES[int(classes[i])]
-            box = boxes[i]
-            score = scores[i]
 
-            if score < request.input_data.min_confidence:
-                # scores are sorted so we can break
-                break
+def release_frames(batch, frame_ring):
+    for _, item in batch:
+        if item.descriptor is not None:
+            frame_ring.release(item.descriptor)
 
-            logger.info("min_confidence: {}".format(request.input_data.min_confidence))
-            logger.info("box: {}".format(box))
-            logger.info("score: {}".format(score))
-            logger.info("width: {}".format(IMAGE_WIDTH))
-            logger.info("height: {}".format(IMAGE_HEIGHT))
-            logger.info("input size: {}".format(MODEL_INPUT_SIZE))
 
-            try:
+def prepare_request(request, out_proto, model, data=None, options=DEFAULT_OPTIONS):
+    """Decodes the image of the request, or the image data passed separately.
 
-                x1 = int(box[0] * IMAGE_WIDTH / MODEL_INPUT_SIZE)
-                y1 = int(box[1] * IMAGE_HEIGHT / MODEL_INPUT_SIZE)
-                x2 = int(box[2] * IMAGE_WIDTH / MODEL_INPUT_SIZE)
-                y2 = int(box[3] * IMAGE_HEIGHT / MODEL_INPUT_SIZE)
+    Images are decoded at full resolution in tiling mode, and otherwise possibly at a
+    reduced size that still covers the model input.
 
-                box = [x1, y1, x2, y2]
+    Returns:
+        The decoded image, or None if it cannot be decoded. In that case the error is
+        set in the header of out_proto.
+    """
 
-                # draw_box(draw, b, color=color)
-                print(
-                    'Found object with label: "' + label + '" and score: ' + str(score)
-                )
+    if options.tiling:
+        min_width = request.input_data.image.cols
+        min_height = request.input_data.image.rows
+    else:
+        min_width, min_height = model.input_size, model.input_size
 
-                num_objects += 1
-
-                point1 = np.array([box[0], box[1]])
-                point2 = np.array([box[2], box[1]])
-                point3 = np.array([box[2], box[3]])
-                point4 = np.array([box[0], box[3]])
-
-                # Add data to the output proto.
-                out_obj = out_proto.object_in_image.add()
-                out_obj.name = "obj" + str(num_objects) + "_label_" + label
-
-                vertex1 = out_obj.image_properties.coordinates.vertexes.add()
-                vertex1.x = point1[0]
-                vertex1.y = point1[1]
-
-                vertex2 = out_obj.image_properties.coordinates.vertexes.add()
-                vertex2.x = point2[0]
-                vertex2.y = point2[1]
-
-                vertex3 = out_obj.image_properties.coordinates.vertexes.add()
-                vertex3.x = point3[0]
-                vertex3.y = point3[1]
-
-                vertex4 = out_obj.image_properties.coordinates.vertexes.add()
-                vertex4.x = point4[0]
-                vertex4.y = point4[1]
-
-                # Pack the confidence value.
-                confidence = wrappers_pb2.FloatValue(value=score)
-                out_obj.additional_properties.Pack(confidence)
-
-                if not options.no_debug:
-
-                    polygon = np.array([point1, point2, point3, point4], np.int32)
-                    polygon = polygon.reshape((-1, 1, 2))
-                    cv2.polylines(image, [polygon], True, (0, 255, 0), 2)
-
-                    caption = "{}: {:.3f}".format(label, score)
-                    left_x = min(point1[0], min(point2[0], min(point3[0], point4[0])))
-                    top_y = min(point1[1], min(point2[1], min(point3[1], point4[1])))
-                    cv2.putText(
-                        image,
-                        caption,
-                        (int(left_x), int(top_y)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.5,
-                        (0, 255, 0),
-                        2,
-                    )
+    try:
+        image = decode_image(request.input_data.image, min_width, min_height, data)
+    except ImageDecodeError as e:
+        err_str = str(e)
+        print(err_str)
+
+        # Set the error in the header.
+        out_proto.header.error.code = header_pb2.CommonError.CODE_INVALID_REQUEST
+        out_proto.header.error.message = err_str
+        return None
+
+    logger.info("SHAPE: {}".format(image.shape))
+    return image
+
+
+def build_response(
+    request,
+    image,
+    prediction,
+    box_transform,
+    out_proto,
+    model,
+    options=DEFAULT_OPTIONS,
+    debug_writer=None,
+):
+    """Adds the detected objects to out_proto and queues the debug image.
+
+    Args:
+        box_transform (BoxTransform): Maps the predicted boxes to pixels of the source
+            image.
+        options (RequestOptions): Suppression and limits applied to the detections.
+    """
 
-            except:
-                logger.info("could not process object")
+    detections = postprocessing.decode_detections(
+        prediction,
+        request.input_data.min_confidence,
+        box_transform,
+        model.labels,
+        nms_iou_threshold=options.nms_iou_threshold,
+        per_class_top_k=options.per_class_top_k,
+        max_detections=options.max_detections,
+    )
+    postprocessing.add_world_objects(out_proto, detections)
+
+    logger.info("BOXES")
+    logger.info(detections.boxes)
+
+    logger.info("SCORES")
+    logger.info(detections.scores)
 
-        print("Found " + str(num_objects) + " object(s)")
+    logger.info("LABELS")
+    logger.info(detections.labels)
 
-        if not options.no_debug:
-            debug_image_filename = "sagemaker_server_output.jpg"
-            cv2.imwrite(debug_image_filename, image)
-            print('Wrote debug image output to: "' + debug_image_filename + '"')
+    print("Found " + str(len(detections.scores)) + " object(s)")
 
-        RESPONSE_QUEUE.put(out_proto)
+    if debug_writer is not None:
+        source_height, source_width = source_size(request, image)
+        if (source_height, source_width) != image.shape[:2]:
+            # The image was decoded at a reduced size.
+            to_image = np.array(
+                [image.shape[1] / source_width, image.shape[0] / source_height] * 2
+            )
+            detections = detections._replace(
+                boxes=(detections.boxes * to_image).astype(np.int32)
+            )
+        debug_writer.submit(image, detections)
 
 
 class NetworkComputeBridgeWorkerServicer(
     network_compute_bridge_service_pb2_grpc.NetworkComputeBridgeWorkerServicer
 ):
-    def __init__(self, thread_input_queue, thread_output_queue):
+    def __init__(
+        self,
+        inference_pool,
+        model_manager,
+        observer=None,
+        result_cache=None,
+        default_options=DEFAULT_OPTIONS,
+        latest_results=None,
+        stream_options=DEFAULT_STREAM_OPTIONS,
+    ):
         super(NetworkComputeBridgeWorkerServicer, self).__init__()
 
-        self.thread_input_queue = thread_input_queue
-        self.thread_output_queue = thread_output_queue
+        self.inference_pool = inference_pool
+        self.model_manager = model_manager
+        self.observer = observer
+        self.result_cache = result_cache
+        self.default_options = default_options
+        self.latest_results = latest_results
+        self.stream_options = stream_options
+
+        self._streams = {}
+        self._streams_lock = threading.Lock()
 
     def NetworkCompute(self, request, context):
-        self.thread_input_queue.put(request)
-        out_proto = self.thread_output_queue.get()
+        start = timer()
+        deadline = request_deadline(context)
+        try:
+            future = self._submit(request, deadline)
+        except PoolFull as e:
+            if context is not None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, rejection_message(e))
+            return error_response(
+                header_pb2.CommonError.CODE_INVALID_REQUEST, rejection_message(e)
+            )
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        try:
+            out_proto, timings = future.result(timeout)
+        except futures.TimeoutError:
+            # The request is left to finish in the pool, which frees its slot.
+            err_str = "Error: deadline exceeded."
+            if context is not None:
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, err_str)
+            return error_response(
+                header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR, err_str
+            )
+        self._observe(request, out_proto, start, timings)
         return out_proto
 
+    def _submit(self, request, deadline=None):
+        """Validates the request and queues it on the workers.
+
+        Args:
+            deadline (float): time.monotonic() after which the request is dropped
+                instead of being run through the model, or None.
+
+        Returns:
+            concurrent.futures.Future resolved with a tuple of the response and the
+            per-stage timings reported by the worker.
+
+        Raises:
+            PoolFull: Too many requests are waiting for inference already.
+        """
+
+        if self.latest_results is not None and (
+            request.input_data.WhichOneof("input") == "image_source_and_service"
+            and request.input_data.image_source_and_service.image_source
+            in self.latest_results
+        ):
+            # The source is pulled by the bridge itself, see camera_pull.
+            return completed_future(self.latest_results.answer(request))
+
+        model_name = request.input_data.model_name
+        if model_name not in self.model_manager:
+            return completed_future(
+                error_response(
+                    header_pb2.CommonError.CODE_INVALID_REQUEST,
+                    'Cannot find model "' + model_name + '" in available models.',
+                )
+            )
+
+        try:
+            options = parse_request_options(request.input_data, self.default_options)
+        except InvalidRequestOptions as e:
+            return completed_future(
+                error_response(header_pb2.CommonError.CODE_INVALID_REQUEST, str(e))
+            )
+
+        if options.stream:
+            return self._submit_stream(request, options, deadline)
+        return self._submit_frame(request, options, deadline)
+
+    def _submit_frame(self, request, options, deadline=None):
+        """Queues a validated request on the workers, unless its response is cached."""
+
+        model_name = request.input_data.model_name
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.key(request)
+            if cache_key is not None:
+                out_proto = self.result_cache.get(cache_key)
+                if out_proto is not None:
+                    return completed_future(out_proto)
+
+        try:
+            model = self.model_manager.acquire(model_name)
+        except Exception as e:
+            return completed_future(
+                error_response(
+                    header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR,
+                    'Failed to load model "' + model_name + '": ' + repr(e),
+                )
+            )
+
+        try:
+            future = self.inference_pool.submit(
+                WorkItem(request, model, options, None, time.monotonic(), deadline),
+                PRIORITIES.index(options.priority),
+            )
+        except Exception:
+            self.model_manager.release(model_name)
+            raise
+        future.add_done_callback(lambda _: self.model_manager.release(model_name))
+        if cache_key is not None:
+
+            def cache_response(future):
+                if future.exception() is None:
+                    self.result_cache.put(cache_key, future.result()[0])
+
+            future.add_done_callback(cache_response)
+        return future
+
+    def _submit_stream(self, request, options, deadline=None):
+        """Runs detection on every Kth frame of a stream and answers the other frames
+        with the tracked objects."""
+
+        now = time.monotonic()
+        stream = self._stream(options.stream, now)
+        if not stream.next_frame(now):
+            out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+            tracked = stream.predict(now)
+            postprocessing.add_world_objects(out_proto, tracked, tracked.track_ids)
+            return completed_future(out_proto)
+
+        def track(result):
+            detected, timings = result
+            if detected.header.error.code not in (
+                header_pb2.CommonError.CODE_UNSPECIFIED,
+                header_pb2.CommonError.CODE_OK,
+            ):
+                return result
+
+            tracked = stream.update(
+                postprocessing.detections_from_response(detected), now
+            )
+            # The detected response may be shared with the result cache.
+            out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+            out_proto.CopyFrom(detected)
+            del out_proto.object_in_image[:]
+            postprocessing.add_world_objects(out_proto, tracked, tracked.track_ids)
+            return out_proto, timings
+
+        return chained_future(self._submit_frame(request, options, deadline), track)
+
+    def _stream(self, name, now):
+        """Returns the StreamTracker of a stream, creating it on its first frame."""
+
+        with self._streams_lock:
+            stream = self._streams.get(name)
+            if stream is None:
+                for idle in [
+                    key
+                    for key, value in self._streams.items()
+                    if now - value.last_used > self.stream_options.idle_timeout
+                ]:
+                    del self._streams[idle]
+
+                stream = StreamTracker(
+                    self.stream_options.detect_every,
+                    iou_threshold=self.stream_options.iou_threshold,
+                    max_age=self.stream_options.max_age,
+                )
+                self._streams[name] = stream
+            return stream
+
+    def _observe(self, request, out_proto, start, timings):
+        if self.observer is not None:
+            self.observer.observe_request(
+                request.input_data.model_name, out_proto, timer() - start, timings
+            )
+
     def ListAvailableModels(self, request, context):
-        self.thread_input_queue.put(request)
-        out_proto = self.thread_output_queue.get()
+        out_proto = network_compute_bridge_pb2.ListAvailableModelsResponse()
+        out_proto.available_models.extend(self.model_manager.names())
         return out_proto
 
 
-def register_with_robot(options):
-    """Registers this worker with the robot's Directory."""
+class AsyncNetworkComputeBridgeWorkerServicer(NetworkComputeBridgeWorkerServicer):
+    """Servicer for a grpc.aio server.
+
+    Waiting requests are coroutines awaiting the futures resolved by the inference
+    pool, instead of each holding a server thread.
+    """
+
+    async def NetworkCompute(self, request, context):
+        start = timer()
+        # Acquiring a model can block while it is loaded, so it runs off the event loop.
+        try:
+            future = await asyncio.get_running_loop().run_in_executor(
+                None, self._submit, request, request_deadline(context)
+            )
+        except PoolFull as e:
+            if context is not None:
+                await context.abort(
+                    grpc.StatusCode.RESOURCE_EXHAUSTED, rejection_message(e)
+                )
+            return error_response(
+                header_pb2.CommonError.CODE_INVALID_REQUEST, rejection_message(e)
+            )
+        # Shielded, so that a cancelled call does not cancel the request in the pool.
+        out_proto, timings = await asyncio.shield(asyncio.wrap_future(future))
+        self._observe(request, out_proto, start, timings)
+        return out_proto
+
+    async def ListAvailableModels(self, request, context):
+        return super(AsyncNetworkComputeBridgeWorkerServicer, self).ListAvailableModels(
+            request, context
+        )
+
+
+def request_deadline(context):
+    """Returns the time.monotonic() at which the deadline of a gRPC call expires, or
+    None if the call has no deadline or there is no call context."""
+
+    if context is None:
+        return None
+    remaining = context.time_remaining()
+    if remaining is None:
+        return None
+    return time.monotonic() + remaining
+
+
+def rejection_message(error):
+    return "Error: server overloaded, retry later (" + str(error) + ")."
+
+
+def chained_future(future, function):
+    """Returns a future resolved with function(result) once future is resolved."""
+
+    chained = futures.Future()
+
+    def resolve(future):
+        try:
+            chained.set_result(function(future.result()))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(resolve)
+    return chained
+
+
+def completed_future(out_proto, timings=None):
+    """Returns a future already resolved with a response, for requests that are
+    answered without the workers."""
+
+    future = futures.Future()
+    future.set_result((out_proto, timings or {}))
+    return future
+
+
+def start_servicer(options, models, model_extension, observer=None, robot=None):
+    """Starts the inference workers and creates the servicer that feeds them.
+
+    Args:
+        options: Parsed command line options.
+        models: Model name to ModelInfo, as returned by discover_models.
+        model_extension: Extension of the model files.
+        observer: Optional object whose observe_request(model_name, out_proto, latency,
+            timings) method is called for every NetworkCompute request, e.g.
+            BridgeMetrics.
+        robot: Authenticated bosdyn Robot the image sources in options.camera_source
+            are pulled from, if any.
+
+    Returns:
+        Tuple of the servicer, an AsyncNetworkComputeBridgeWorkerServicer when
+        options.async_server is set, and a function that stops the workers and frees
+        their resources.
+    """
+
+    # The workers are only handed the requests they can work on right away, plus one
+    # batch each to collect, so interactive requests overtake waiting batch requests.
+    window = options.num_workers * options.max_batch_size * (options.agent_in_flight + 1)
+
+    # A frame only takes a slot once it is handed to a worker, so a ring as large as the
+    # window never runs out of slots.
+    frame_ring = None
+    if options.shm_slots is None:
+        options.shm_slots = window
+    if options.shm_slots > 0:
+        frame_ring = SharedFrameRing(
+            options.shm_slots, int(options.shm_slot_mb * 1024 * 1024)
+        )
+
+    # Start compute server processes
+    inference_pool = InferencePool(
+        process_images,
+        args=(options, model_extension, frame_ring),
+        num_workers=options.num_workers,
+        max_pending=options.max_pending,
+        window=window,
+        prepare=(
+            functools.partial(detach_image, frame_ring=frame_ring)
+            if frame_ring is not None
+            else None
+        ),
+    )
+    inference_pool.start()
+
+    # The agent client is only created after the workers are forked.
+    model_registry = ModelRegistry(
+        EdgeManagerClient(options.agent_socket), refresh_interval=options.model_refresh_interval
+    )
+    model_registry.start()
+    model_manager = ModelManager(
+        model_registry,
+        models,
+        memory_budget=options.model_memory_budget_mb * 1024 * 1024,
+        retry_interval=options.model_retry_interval,
+    )
+    model_manager.preload()
+
+    servicer_class = (
+        AsyncNetworkComputeBridgeWorkerServicer
+        if options.async_server
+        else NetworkComputeBridgeWorkerServicer
+    )
+    result_cache = None
+    if options.cache_size > 0:
+        result_cache = ResultCache(
+            options.cache_size,
+            options.cache_ttl,
+            mode=options.cache_mode,
+            max_distance=options.cache_max_distance,
+        )
+
+    default_options = DEFAULT_OPTIONS._replace(
+        nms_iou_threshold=options.nms_iou_threshold,
+        per_class_top_k=options.per_class_top_k,
+        max_detections=options.max_detections,
+        tiling=options.tiling,
+        tile_overlap=options.tile_overlap,
+    )
+
+    latest_results = None
+    if options.camera_source:
+        latest_results = LatestResults(
+            options.camera_source,
+            options.camera_model or next(iter(models)),
+            options.camera_min_confidence,
+            options.camera_max_age,
+        )
+
+    servicer = servicer_class(
+        inference_pool,
+        model_manager,
+        observer,
+        result_cache,
+        default_options,
+        latest_results,
+        StreamOptions(
+            detect_every=options.stream_detect_every,
+            iou_threshold=options.stream_iou_threshold,
+            max_age=options.stream_max_age,
+            idle_timeout=options.stream_idle_timeout,
+        ),
+    )
+
+    camera_puller = None
+    if latest_results is not None:
+        camera_puller = CameraPuller(
+            robot.ensure_client(ImageClient.default_service_name),
+            latest_results,
+            servicer._submit,
+            options.camera_rate,
+        )
+        camera_puller.start()
+
+    def shutdown():
+        if camera_puller is not None:
+            camera_puller.stop()
+        model_registry.stop()
+        inference_pool.stop()
+        if frame_ring is not None:
+            frame_ring.close(unlink=True)
+
+    return servicer, shutdown
+
+
+def iot_core_publisher(topic):
+    """Returns a function publishing payloads to an AWS IoT Core topic through Greengrass IPC."""
+
+    ipc_client = awsiot.greengrasscoreipc.connect()
+
+    def publish(payload):
+        ipc_client.new_publish_to_iot_core().activate(
+            request=PublishToIoTCoreRequest(topic_name=topic, qos="0", payload=payload)
+        )
+
+    return publish
+
+
+def connect_to_robot(hostname):
+    """Returns a bosdyn Robot authenticated with the credentials stored in the
+    spot_secrets secret."""
 
     ipc_client = awsiot.greengrasscoreipc.connect()
 
@@ -343,17 +1032,22 @@ def register_with_robot(options):
     secrets = json.loads(secret_response.secret_value.secret_string)
     get_secret_value.close()
 
-    ip = bosdyn.client.common.get_self_ip(options.hostname)
-    print("Detected IP address as: " + ip)
-    kServiceName = "sagemaker-server"
-    kServiceAuthority = "auth.spot.robot"
-
     sdk = bosdyn.client.create_standard_sdk("sagemaker_server")
 
-    robot = sdk.create_robot(options.hostname)
+    robot = sdk.create_robot(hostname)
 
     # Authenticate robot before being able to use it
     robot.authenticate(secrets["spot_user"], secrets["spot_password"])
+    return robot
+
+
+def register_with_robot(options, robot):
+    """Registers this worker with the robot's Directory."""
+
+    ip = bosdyn.client.common.get_self_ip(options.hostname)
+    print("Detected IP address as: " + ip)
+    kServiceName = "sagemaker-server"
+    kServiceAuthority = "auth.spot.robot"
 
     directory_client = robot.ensure_client(
         bosdyn.client.directory.DirectoryClient.default_service_name
@@ -393,21 +1087,28 @@ def register_with_robot(options):
     )
 
 
-def main(argv):
-    """Command line interface.
+def positive_int(value):
+    """argparse type of the options that must be at least 1."""
 
-    Args:
-        argv: List of command-line arguments passed to the program.
-    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: " + value)
+    return number
+
+
+def create_parser():
+    """Returns the command line parser of the compute server."""
 
     default_port = "50099"
-    model_extension = ".params"
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-d",
         "--model-dir",
-        help="Directory of pre-trained models and (optionally) associated label files.\nExample directory contents: my_model.pb, my_classes.csv, my_model2.pb, my_classes2.csv.  CSV label format is: object,1<new line>thing,2",
+        help="[NAME=]DIR. Directory of a packaged model, or of one subdirectory per packaged model, with (optionally) associated label files. Can be repeated.\nA model found directly in DIR is named NAME, the name in its model.json or \""
+        + MODEL_NAME
+        + "\"; models in subdirectories are named after their model.json or the subdirectory.\nExample subdirectory contents: my_model.params, my_classes.csv.  CSV label format is: object,1<new line>thing,2",
+        action="append",
         required=True,
     )
     parser.add_argument(
@@ -419,6 +1120,245 @@ def main(argv):
     parser.add_argument(
         "-n", "--no-debug", help="Disable writing debug images.", action="store_true"
     )
+    parser.add_argument(
+        "--debug-every-n",
+        help="Only write the debug image of every Nth frame, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--debug-queue-size",
+        help="Debug images waiting to be written before the oldest is dropped, default: 2",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--debug-ring-size",
+        help="Number of debug image files written in turn, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-w",
+        "--num-workers",
+        help="Number of inference worker processes, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        help="Maximum number of images stacked into one Predict call, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--max-batch-wait-ms",
+        help="How long a worker waits to fill a batch after the first request arrives, default: 5",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        "--shm-slots",
+        help="Shared-memory slots for passing images to the workers, 0 to send them through the request queue. Images are sent through the request queue as well while all slots are taken, default: workers x max batch size x (agent in flight + 1)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--shm-slot-mb",
+        help="Size of a shared-memory image slot in MB, larger images go through the request queue, default: 8",
+        type=float,
+        default=8.0,
+    )
+    parser.add_argument(
+        "--agent-socket",
+        help="gRPC address of the SageMaker Edge Manager agent, default: " + AGENT_SOCKET,
+        default=AGENT_SOCKET,
+    )
+    parser.add_argument(
+        "--max-pending",
+        help="Requests waiting for inference at most; further requests are rejected as retryable, 0 for no limit, default: 32",
+        type=int,
+        default=32,
+    )
+    parser.add_argument(
+        "--nms-iou-threshold",
+        help="Drop boxes overlapping a better box of the same class by more than this IoU, 0 to disable, default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--per-class-top-k",
+        help="Detections returned at most per class, 0 for no limit, default: 0",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--max-detections",
+        help="Detections returned at most per image, 0 for no limit, default: 0",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--keep-aspect-ratio",
+        help="Letterbox frames at their own aspect ratio, e.g. 16:9, instead of resizing them to 4:3",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--tiling",
+        help="Also run overlapping full-resolution tiles of every frame through the model, to find small objects",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        help="Minimum overlap of neighbouring tiles in pixels, default: 64",
+        type=int,
+        default=64,
+    )
+    parser.add_argument(
+        "--stream-detect-every",
+        help="Run detection on one frame out of this many of every stream and track the objects in between, default: 3",
+        type=int,
+        default=DEFAULT_STREAM_OPTIONS.detect_every,
+    )
+    parser.add_argument(
+        "--stream-iou-threshold",
+        help="Minimum IoU to associate a detection with a track, default: 0.3",
+        type=float,
+        default=DEFAULT_STREAM_OPTIONS.iou_threshold,
+    )
+    parser.add_argument(
+        "--stream-max-age",
+        help="Seconds a track survives without being detected, default: 2",
+        type=float,
+        default=DEFAULT_STREAM_OPTIONS.max_age,
+    )
+    parser.add_argument(
+        "--stream-idle-timeout",
+        help="Seconds after which the tracks of an idle stream are forgotten, default: 60",
+        type=float,
+        default=DEFAULT_STREAM_OPTIONS.idle_timeout,
+    )
+    parser.add_argument(
+        "--camera-source",
+        help="Image source the bridge pulls frames from itself, e.g. frontleft_fisheye_image. Can be given several times.",
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--camera-rate",
+        help="Frames per second pulled from every camera source, default: 2",
+        type=float,
+        default=2.0,
+    )
+    parser.add_argument(
+        "--camera-model",
+        help="Model the pulled frames are run through, default: the first model",
+    )
+    parser.add_argument(
+        "--camera-min-confidence",
+        help="Confidence threshold of the pulled frames, default: 0.5",
+        type=float,
+        default=0.5,
+    )
+    parser.add_argument(
+        "--camera-max-age",
+        help="Seconds the result of a pulled frame is used for, default: 1",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="Responses cached for repeated frames, 0 to disable the cache, default: 0",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        help="Seconds a cached response stays valid, default: 5",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        "--cache-mode",
+        help="Match identical image bytes (exact) or similar frames (perceptual), default: exact",
+        choices=CACHE_MODES,
+        default="exact",
+    )
+    parser.add_argument(
+        "--cache-max-distance",
+        help="Bits of the 64-bit perceptual hash that may differ for a cache hit, default: 4",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--agent-channels",
+        help="Connections each worker spreads its Predict calls over, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--agent-in-flight",
+        help="Batches each worker keeps in flight to the agent, at least 1, default: 2",
+        type=positive_int,
+        default=2,
+    )
+    parser.add_argument(
+        "--agent-timeout",
+        help="Seconds a Predict call may take, including waiting for a restarting agent, 0 for no limit, default: 30",
+        type=float,
+        default=30.0,
+    )
+    parser.add_argument(
+        "--agent-retries",
+        help="Times a Predict call is resent when the agent goes away during the call, default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--model-refresh-interval",
+        help="Seconds between refreshes of the cached list of loaded models, 0 to disable, default: 60",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "--model-memory-budget-mb",
+        help="Size of model files that may be loaded at once before least recently used models are unloaded, 0 for no limit, default: 0",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--model-retry-interval",
+        help="Seconds before a model that failed to load is tried again, requests for it fail until then, default: 30",
+        type=float,
+        default=30.0,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help="Local port serving Prometheus metrics on /metrics, 0 to disable, default: 0",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--metrics-topic",
+        help="AWS IoT Core topic to publish metrics snapshots to, default: none",
+    )
+    parser.add_argument(
+        "--metrics-publish-interval",
+        help="Seconds between metrics snapshots published to AWS IoT Core, default: 60",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "--async-server",
+        help="Serve requests from an asyncio (grpc.aio) server instead of a thread pool",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--shutdown-grace",
+        help="Seconds in-flight requests get to finish on SIGTERM, default: 5",
+        type=float,
+        default=5.0,
+    )
     parser.add_argument(
         "-r",
         "--no-registration",
@@ -436,7 +1376,19 @@ def main(argv):
         help="Hostname or address of robot," ' e.g. "beta25-p" or "192.168.80.3"',
     )
 
-    options = parser.parse_args(argv)
+    return parser
+
+
+def main(argv):
+    """Command line interface.
+
+    Args:
+        argv: List of command-line arguments passed to the program.
+    """
+
+    model_extension = ".params"
+
+    options = create_parser().parse_args(argv)
 
     # Either we need a hostname to talk to the robot or the --no-registration argument.
     if not options.no_registration and (
@@ -447,61 +1399,128 @@ def main(argv):
         )
         sys.exit(1)
 
-    if options.no_registration and (
-        options.hostname is not None and len(options.hostname) > 0
+    if (
+        options.no_registration
+        and not options.camera_source
+        and (options.hostname is not None and len(options.hostname) > 0)
     ):
         print(
             "Error: cannot provide both a robot hostname and the --no-registration argument."
         )
         sys.exit(1)
 
-    if not os.path.isdir(options.model_dir):
-        print(
-            "Error: model directory ("
-            + options.model_dir
-            + ") not found or is not a directory."
-        )
+    # Pulling images from cameras needs the robot, even without registration.
+    if options.camera_source and (options.hostname is None or len(options.hostname) < 1):
+        print("Error: must provide a robot hostname to pull images from cameras.")
         sys.exit(1)
 
-    # Make sure there is at least one file ending in .pb in the directory.
-    found_model = False
-    for f in os.listdir(options.model_dir):
-        path = os.path.join(options.model_dir, f)
-        if os.path.isfile(path) and path.endswith(model_extension):
-            found_model = True
-            break
-
-    if not found_model:
+    for model_dir in options.model_dir:
+        path = model_dir.split("=", 1)[-1]
+        if not os.path.isdir(path):
+            print("Error: model directory (" + path + ") not found or is not a directory.")
+            sys.exit(1)
+
+    models = discover_models(
+        options.model_dir,
+        model_extension,
+        MODEL_NAME,
+        MODEL_CLASSES,
+        MODEL_INPUT_SIZE,
+    )
+    if not models:
         print(
-            "Error: model directory must contain at least one model file with extension "
+            "Error: model directories must contain at least one model with a file with extension "
             + model_extension
-            + ".  Found:"
+            + "."
         )
-        for f in os.listdir(options.model_dir):
-            print("    " + f)
         sys.exit(1)
 
+    if options.camera_model and options.camera_model not in models:
+        print('Error: camera model "' + options.camera_model + '" not found.')
+        sys.exit(1)
+
+    robot = None
+    if options.hostname:
+        robot = connect_to_robot(options.hostname)
     if not options.no_registration:
-        register_with_robot(options)
+        register_with_robot(options, robot)
 
-    # Start compute server processes
-    start_processes(options, model_extension)
+    metrics = BridgeMetrics()
+    servicer, shutdown = start_servicer(
+        options, models, model_extension, metrics, robot
+    )
+    metrics.gauge("ncb_queue_depth", servicer.inference_pool.pending_count)
+    metrics.counter(
+        "ncb_rejected_requests_total", lambda: servicer.inference_pool.rejected
+    )
+    if servicer.result_cache is not None:
+        cache = servicer.result_cache
+        metrics.counter("ncb_cache_hits_total", lambda: cache.hits)
+        metrics.counter("ncb_cache_misses_total", lambda: cache.misses)
+        metrics.gauge("ncb_cache_entries", lambda: len(cache))
+
+    if options.metrics_port > 0:
+        MetricsServer(metrics, options.metrics_port).start()
+    if options.metrics_topic:
+        MetricsPublisher(
+            metrics,
+            iot_core_publisher(options.metrics_topic),
+            options.metrics_publish_interval,
+        ).start()
+
+    try:
+        if options.async_server:
+            asyncio.run(serve_async(servicer, options.port, options.shutdown_grace))
+        else:
+            serve(servicer, options.port, options.shutdown_grace)
+    finally:
+        shutdown()
+
+    return True
+
+
+def serve(servicer, port, grace):
+    """Serves requests from a thread pool until SIGTERM or SIGINT is received."""
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
     network_compute_bridge_service_pb2_grpc.add_NetworkComputeBridgeWorkerServicer_to_server(
-        NetworkComputeBridgeWorkerServicer(REQUEST_QUEUE, RESPONSE_QUEUE), server
+        servicer, server
     )
-    server.add_insecure_port("[::]:" + options.port)
+    server.add_insecure_port("[::]:" + port)
     server.start()
 
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
     print("Running...")
-    while True:
-        print(".", end="")
-        sys.stdout.flush()
-        time.sleep(2)
+    stopping.wait()
+    print("Shutting down...")
+    server.stop(grace).wait()
 
-    return True
 
+async def serve_async(servicer, port, grace):
+    """Serves requests from a grpc.aio server until SIGTERM or SIGINT is received.
+
+    In-flight requests get up to grace seconds to finish before they are cancelled.
+    """
+
+    server = grpc.aio.server()
+    network_compute_bridge_service_pb2_grpc.add_NetworkComputeBridgeWorkerServicer_to_server(
+        servicer, server
+    )
+    server.add_insecure_port("[::]:" + port)
+    await server.start()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    print("Running (asyncio)...")
+    await stopping.wait()
+    print("Shutting down...")
+    await server.stop(grace)
 
 if __name__ == "__main__":
     logging.basicConfig()
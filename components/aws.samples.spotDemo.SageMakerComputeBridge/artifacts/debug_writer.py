@@ -0,0 +1,102 @@
+"""
+Background writer for the annotated debug images of the compute bridge.
+
+Drawing and JPEG encoding happen on a separate thread so they do not add latency to
+NetworkCompute responses. Frames are queued in a small bounded queue that drops the
+oldest frame when it is full, optionally only every Nth frame is kept, and images
+are written to a rotating ring of files.
+"""
+
+import collections
+import logging
+import os
+import threading
+
+import cv2
+
+import postprocessing
+
+logger = logging.getLogger(__name__)
+
+
+class DebugImageWriter:
+    """Draws detections on frames and writes them to disk in the background.
+
+    Args:
+        basename (str): Path of the output files without the ".jpg" extension.
+        every_n (int): Only keep every Nth submitted frame.
+        queue_size (int): Frames waiting to be written before the oldest is dropped.
+        ring_size (int): Number of output files written in turn. With a ring size of 1
+            every image is written to basename + ".jpg".
+    """
+
+    def __init__(self, basename, every_n=1, queue_size=2, ring_size=1):
+        self.basename = basename
+        self.every_n = max(1, every_n)
+        self.ring_size = max(1, ring_size)
+
+        self.dropped = 0
+        self._submitted = 0
+        self._next_file = 0
+        self._frames = collections.deque(maxlen=max(1, queue_size))
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="debug-image-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, image, detections):
+        """Queues a frame and its detections, unless it is skipped by the sampling.
+
+        The frame is copied, so the caller can reuse its buffer right away.
+        """
+
+        self._submitted += 1
+        if (self._submitted - 1) % self.every_n != 0:
+            return
+
+        frame = image.copy()
+        with self._condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append((frame, detections))
+            self._condition.notify()
+
+    def close(self):
+        """Writes the queued frames and stops the writer thread."""
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_filename(self):
+        if self.ring_size == 1:
+            return self.basename + ".jpg"
+
+        filename = "{}_{}.jpg".format(self.basename, self._next_file)
+        self._next_file = (self._next_file + 1) % self.ring_size
+        return filename
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._frames and not self._stopped:
+                    self._condition.wait()
+                if not self._frames:
+                    return
+                image, detections = self._frames.popleft()
+
+            try:
+                postprocessing.draw_detections(image, detections)
+
+                filename = self._next_filename()
+                # Write to a temporary file first so readers never see partial images.
+                tmp_filename = filename[: -len(".jpg")] + ".tmp.jpg"
+                cv2.imwrite(tmp_filename, image)
+                os.replace(tmp_filename, filename)
+                logger.info('Wrote debug image output to: "' + filename + '"')
+            except Exception as e:
+                logger.error("Failed to write debug image: " + repr(e))
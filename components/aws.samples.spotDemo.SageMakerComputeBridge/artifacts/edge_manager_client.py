@@ -1,6 +1,10 @@
+import functools
+import itertools
 import logging
 import random
 import sys
+import threading
+from timeit import default_timer as timer
 
 import agent_pb2
 import agent_pb2_grpc
@@ -9,6 +13,8 @@ import grpc
 import numpy as np
 from PIL import Image
 
+from preprocessing import Preprocessor
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
@@ -18,20 +24,77 @@ SIZE = 512
 TENSOR_SHAPE = [1, 3, 512, 512]
 TENSOR_NAME = "data"
 DATA_TYPE = 5
+AGENT_SOCKET = "unix:///tmp/aws.greengrass.SageMakerEdgeManager.sock"
+
+# Batched input tensors of 1080p frames are well above gRPC's default 4 MB limit.
+MAX_MESSAGE_LENGTH = -1
+
+# Pings only while calls are active, so a Predict to an agent that died is failed
+# within seconds instead of hanging. Reconnects are retried quickly, since the agent
+# socket is local and comes back as soon as a redeployed agent starts.
+CHANNEL_OPTIONS = (
+    ("grpc.enable_http_proxy", 0),
+    ("grpc.max_send_message_length", MAX_MESSAGE_LENGTH),
+    ("grpc.max_receive_message_length", MAX_MESSAGE_LENGTH),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 0),
+    ("grpc.initial_reconnect_backoff_ms", 100),
+    ("grpc.max_reconnect_backoff_ms", 2000),
+    # Gives every channel of the pool its own connection to the agent.
+    ("grpc.use_local_subchannel_pool", 1),
+)
 
 
 class EdgeManagerClient:
-    def __init__(self):
-        self.agent_socket = "unix:///tmp/aws.greengrass.SageMakerEdgeManager.sock"
-        self.agent_channel = grpc.insecure_channel(
-            self.agent_socket, options=(("grpc.enable_http_proxy", 0),)
-        )
-        self.agent_client = agent_pb2_grpc.AgentStub(self.agent_channel)
+    """Client of the SageMaker Edge Manager agent.
+
+    Args:
+        agent_socket (str): gRPC address of the agent.
+        num_channels (int): Channels, each with its own connection, that Predict calls
+            are spread over round-robin.
+        timeout (float): Seconds a Predict call may take, including the time spent
+            waiting for the agent to come back, or None for no limit.
+        retries (int): Times a Predict call is resent when the agent went away while
+            it was running.
+        keep_aspect_ratio (bool): Whether frames keep their aspect ratio in the model
+            input instead of being resized to 4:3, see Preprocessor.
+    """
+
+    def __init__(
+        self,
+        agent_socket=AGENT_SOCKET,
+        num_channels=1,
+        timeout=None,
+        retries=1,
+        keep_aspect_ratio=False,
+    ):
+        self.agent_socket = agent_socket
+        self.timeout = timeout
+        self.retries = retries
+        self.keep_aspect_ratio = keep_aspect_ratio
+
+        self.agent_channels = [
+            grpc.insecure_channel(self.agent_socket, options=CHANNEL_OPTIONS)
+            for _ in range(max(1, num_channels))
+        ]
+        self.agent_stubs = [
+            agent_pb2_grpc.AgentStub(channel) for channel in self.agent_channels
+        ]
+        self.agent_client = self.agent_stubs[0]
+        self.preprocessors = {}
+
+        self._next_stub = itertools.cycle(self.agent_stubs)
+        self._next_stub_lock = threading.Lock()
+
+    def close(self):
+        for channel in self.agent_channels:
+            channel.close()
 
     def list_models(self):
         return self.agent_client.ListModels(agent_pb2.ListModelsRequest())
 
-    def list_model_tensors(self, models):
+    def list_model_tensors(self, models=None):
         return {
             model.name: {
                 "inputs": model.input_tensor_metadatas,
@@ -53,81 +116,126 @@ class EdgeManagerClient:
 
     def predict_image(self, model_name, img):
         logger.info("predict_image()")
+        return self.predict_batch(model_name, img.reshape(TENSOR_SHAPE))
+
+    def predict_batch(self, model_name, batch):
+        """Runs one Predict call on a stacked [N, 3, SIZE, SIZE] input tensor."""
+        predict_response = self.predict_batch_async(model_name, batch)()
+        logger.info(predict_response)
+        return predict_response
+
+    def predict_batch_async(self, model_name, batch):
+        """Sends a Predict call without waiting for the response.
+
+        The input tensor is serialized before returning, so the batch buffer can be
+        reused right away.
+
+        Returns:
+            Function that blocks until the PredictResponse arrives and returns it.
+        """
+        logger.info("predict_batch_async() with shape {}".format(batch.shape))
         image_tensor = agent_pb2.Tensor()
-        image_tensor.byte_data = img.tobytes()
+        image_tensor.byte_data = batch.tobytes()
         image_tensor.tensor_metadata.name = TENSOR_NAME
         image_tensor.tensor_metadata.data_type = DATA_TYPE
-        image_tensor.tensor_metadata.shape.extend(TENSOR_SHAPE)
+        image_tensor.tensor_metadata.shape.extend(batch.shape)
         predict_request = agent_pb2.PredictRequest()
         predict_request.name = model_name
         predict_request.tensors.append(image_tensor)
-        predict_response = self.agent_client.Predict(predict_request)
-        logger.info(predict_response)
-        return predict_response
+
+        call = self._send_predict(predict_request)
+        return functools.partial(self._wait_for_predict, predict_request, call)
+
+    def _send_predict(self, predict_request):
+        with self._next_stub_lock:
+            stub = next(self._next_stub)
+        # Waits for the agent to (re)connect instead of failing immediately, e.g.
+        # while it is restarted by a Greengrass deployment.
+        return stub.Predict.future(
+            predict_request, timeout=self.timeout, wait_for_ready=True
+        )
+
+    def _wait_for_predict(self, predict_request, call):
+        for attempt in range(self.retries + 1):
+            try:
+                return call.result()
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.UNAVAILABLE or attempt == self.retries:
+                    raise
+                logger.warning("Edge Manager agent unavailable, resending Predict")
+                call = self._send_predict(predict_request)
+
+    def preprocessor(self, size=SIZE):
+        """Returns the Preprocessor of size x size model inputs."""
+        if size not in self.preprocessors:
+            self.preprocessors[size] = Preprocessor(
+                size, keep_aspect_ratio=self.keep_aspect_ratio
+            )
+        return self.preprocessors[size]
 
     def get_prediction(self, model_name, img):
         logger.info("get_prediction()")
-        # Mean and Std deviation of the RGB colors (collected from Imagenet dataset)
 
         try:
-            mean = [123.68, 116.779, 103.939]
-            std = [58.393, 57.12, 57.375]
-
-            frame = self.resize_short_within(img, short=SIZE, max_size=SIZE * 2)
-            nn_input_size = SIZE
-            nn_input = cv2.resize(frame, (nn_input_size, int(nn_input_size / 4 * 3)))
-            nn_input = cv2.copyMakeBorder(
-                nn_input,
-                int(nn_input_size / 8),
-                int(nn_input_size / 8),
-                0,
-                0,
-                cv2.BORDER_CONSTANT,
-                value=(0, 0, 0),
-            )
-            copy_frame = nn_input[:]
-            nn_input = nn_input.astype("float32")
-            nn_input = nn_input.reshape((nn_input_size * nn_input_size, 3))
-            scaled_frame = np.transpose(nn_input)
-            scaled_frame[0, :] = scaled_frame[0, :] - mean[0]
-            scaled_frame[0, :] = scaled_frame[0, :] / std[0]
-            scaled_frame[1, :] = scaled_frame[1, :] - mean[1]
-            scaled_frame[1, :] = scaled_frame[1, :] / std[1]
-            scaled_frame[2, :] = scaled_frame[2, :] - mean[2]
-            scaled_frame[2, :] = scaled_frame[2, :] / std[2]
-
-            predict_response = self.predict_image(model_name, scaled_frame)
-
-            i = 0
-            detections = []
-
-            for t in predict_response.tensors:
-                # print("Flattened RAW Output Tensor : " + str(i + 1))
-                i += 1
-                deserialized_bytes = np.frombuffer(t.byte_data, dtype=np.float32)
-                detections.append(np.asarray(deserialized_bytes))
-
-            # convert the bounding boxes
-            new_list = []
-            for index, item in enumerate(detections[2]):
-                if index % 4 == 0:
-                    new_list.append(detections[2][index - 4 : index])
-            detections[2] = new_list[1:]
-
-            # get classes, scores, bboxes
-            classes = detections[0]
-            scores = detections[1]
-            bounding_boxes = new_list[1:]
-
-            # logger.info(bounding_boxes)
-            # logger.info(scores)
-            # logger.info(classes)
-
-            return bounding_boxes, scores, classes
+            return self.get_predictions(model_name, [img])[0]
 
         except Exception as e:
             logger.error(e)
 
+    def get_predictions(self, model_name, imgs, size=SIZE, timings=None):
+        """Runs a batch of images through the model with a single Predict call.
+
+        The images are letterboxed into size x size model inputs. When a timings dict
+        is given, the seconds spent in the preprocess, predict and decode_outputs stages
+        are stored in it.
+
+        Returns:
+            List with one (bounding_boxes, scores, classes) tuple per input image. The
+            arrays have shapes (K, 4), (K,) and (K,) and are views of the response.
+        """
+        return self.get_predictions_async(model_name, imgs, size, timings)()
+
+    def get_predictions_async(self, model_name, imgs, size=SIZE, timings=None):
+        """Like get_predictions, but returns as soon as the Predict call is sent.
+
+        Returns:
+            Function that blocks until the response arrives and returns the
+            predictions. The predict stage time includes the time until it is called.
+        """
+        logger.info("get_predictions() for {} image(s)".format(len(imgs)))
+
+        if timings is None:
+            timings = {}
+
+        start = timer()
+        batch = self.preprocessor(size).preprocess_batch(imgs)
+        timings["preprocess"] = timer() - start
+
+        predict_start = timer()
+        wait_for_predict = self.predict_batch_async(model_name, batch)
+
+        def result():
+            predict_response = wait_for_predict()
+            timings["predict"] = timer() - predict_start
+
+            start = timer()
+            # Views of the flattened outputs, one row per image: classes, scores, boxes.
+            detections = [
+                np.frombuffer(t.byte_data, dtype=np.float32).reshape((len(imgs), -1))
+                for t in predict_response.tensors
+            ]
+            classes, scores, bounding_boxes = detections[:3]
+
+            predictions = [
+                (bounding_boxes[n].reshape((-1, 4)), scores[n], classes[n])
+                for n in range(len(imgs))
+            ]
+            timings["decode_outputs"] = timer() - start
+
+            return predictions
+
+        return result
+
     def _get_interp_method(self, interp, sizes=()):
         """Get the interpolation method for resize functions.
         The major purpose of this function is to wrap a random interp method selection
@@ -0,0 +1,88 @@
+"""
+Shared-memory transport for the image payloads sent to the inference workers.
+
+When the inference pool hands a request to the workers, the image bytes of the request
+are copied into a free slot of a ring of fixed-size shared-memory slots and only a small
+FrameDescriptor goes on the request queue. The worker reads the image straight from the
+slot and hands it back once the request is answered. This avoids pickling multi-megabyte
+frames through a pipe. Frames larger than a slot, or sent while every slot is taken, fall
+back to being pickled with the request.
+"""
+
+import logging
+from collections import namedtuple
+from multiprocessing import Array, shared_memory
+
+logger = logging.getLogger(__name__)
+
+FrameDescriptor = namedtuple("FrameDescriptor", ["slot", "nbytes"])
+
+
+class SharedFrameRing:
+    """Ring of fixed-size shared-memory slots shared by the main and worker processes.
+
+    Args:
+        num_slots (int): Number of frames that can be in flight at once.
+        slot_size (int): Size of a slot in bytes. Larger frames cannot use the ring.
+    """
+
+    def __init__(self, num_slots, slot_size):
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+
+        self._shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_size)
+        # Set for the slots in use. Unlike a multiprocessing.Queue of free slots, whose
+        # puts are flushed by a background thread, a released slot is free right away.
+        self._in_use = Array("b", num_slots)
+        self._next_slot = 0
+
+    def put(self, data):
+        """Copies data into a free slot without blocking.
+
+        Returns:
+            FrameDescriptor of the slot, or None if the data does not fit a slot or all
+            slots are in use. The caller then has to send the data inline.
+        """
+
+        if len(data) > self.slot_size:
+            return None
+
+        slot = self._claim_slot()
+        if slot is None:
+            return None
+
+        offset = slot * self.slot_size
+        self._shm.buf[offset : offset + len(data)] = data
+        return FrameDescriptor(slot, len(data))
+
+    def view(self, descriptor):
+        """Returns a memoryview of the frame data, valid until the slot is released."""
+
+        offset = descriptor.slot * self.slot_size
+        return self._shm.buf[offset : offset + descriptor.nbytes]
+
+    def release(self, descriptor):
+        """Hands the slot of a frame back to the ring."""
+
+        with self._in_use.get_lock():
+            self._in_use[descriptor.slot] = 0
+
+    def _claim_slot(self):
+        with self._in_use.get_lock():
+            for i in range(self.num_slots):
+                slot = (self._next_slot + i) % self.num_slots
+                if not self._in_use[slot]:
+                    self._in_use[slot] = 1
+                    self._next_slot = (slot + 1) % self.num_slots
+                    return slot
+        return None
+
+    def close(self, unlink=False):
+        """Detaches from the shared memory, and frees it when unlink is set."""
+
+        try:
+            self._shm.close()
+        except BufferError:
+            logger.warning("Shared frame memory still in use while closing")
+        if unlink:
+            self._shm.unlink()
@@ -0,0 +1,96 @@
+"""
+Decoding of the bosdyn.api.Image payloads sent to the compute bridge.
+
+RAW images are viewed in place with np.frombuffer, without copying the pixel data.
+JPEG images are decoded at a reduced size by libjpeg when the source is much larger
+than the model input, which skips most of the decoding and the later downscaling.
+"""
+
+import cv2
+import numpy as np
+
+from bosdyn.api import image_pb2
+
+RAW_CHANNELS = {
+    image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8: 1,
+    image_pb2.Image.PIXEL_FORMAT_RGB_U8: 3,
+    image_pb2.Image.PIXEL_FORMAT_RGBA_U8: 4,
+}
+
+# Reduction factors supported by libjpeg, largest first.
+JPEG_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+class ImageDecodeError(Exception):
+    """The image cannot be decoded."""
+
+
+def decode_image(image, min_width=0, min_height=0, data=None):
+    """Decodes an image proto into an HWC uint8 array with 3 channels.
+
+    Args:
+        image (bosdyn.api.Image): Image to decode.
+        min_width (int): JPEG images are only decoded at a reduced size when the result
+            stays at least this wide...
+        min_height (int): ...and this high.
+        data: Buffer holding the image data when it was sent separately from the
+            proto, e.g. through shared memory. Defaults to image.data.
+
+    Returns:
+        The decoded image. RAW RGB images are read-only views of the image data.
+    """
+
+    if data is None:
+        data = image.data
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    if image.format == image_pb2.Image.FORMAT_RAW:
+        channels = RAW_CHANNELS.get(image.pixel_format)
+        if channels is None:
+            raise ImageDecodeError(
+                "Error: image input in unsupported pixel format: "
+                + str(image.pixel_format)
+            )
+        if image.rows <= 0 or image.cols <= 0:
+            raise ImageDecodeError(
+                "Error: RAW image has no pixels: {}x{}".format(image.rows, image.cols)
+            )
+        if buffer.size != image.rows * image.cols * channels:
+            raise ImageDecodeError(
+                "Error: RAW image has {} bytes, expected {}x{}x{}".format(
+                    buffer.size, image.rows, image.cols, channels
+                )
+            )
+
+        frame = buffer.reshape((image.rows, image.cols, channels))
+        if channels == 1:
+            # Converted to RGB for the model
+            return cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+        if channels == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
+        return frame
+
+    if image.format == image_pb2.Image.FORMAT_JPEG:
+        flags = cv2.IMREAD_COLOR
+        for factor, reduced_flags in JPEG_REDUCED_FLAGS:
+            if (
+                image.cols // factor >= min_width
+                and image.rows // factor >= min_height
+                and image.cols > 0
+                and image.rows > 0
+            ):
+                flags = reduced_flags
+                break
+
+        frame = cv2.imdecode(buffer, flags)
+        if frame is None:
+            raise ImageDecodeError("Error: could not decode JPEG image")
+        return frame
+
+    raise ImageDecodeError(
+        "Error: image input in unsupported format: " + str(image.format)
+    )
@@ -0,0 +1,183 @@
+"""
+Pool of inference worker processes for the network compute bridge.
+
+Requests are tagged with a correlation ID before they are put on the shared request
+queue. Workers reply with ``(request_id, response)`` tuples and a dispatcher thread in
+the main process resolves the future that belongs to that ID, so concurrent gRPC
+callers always get their own response back, whichever worker served them.
+
+Submitted requests wait in a priority queue in the main process. A feeder thread only
+hands the workers as many requests as they can work on at once, so that requests of a
+higher priority overtake the ones already waiting, and the pool rejects new requests
+once max_pending of them are unanswered. Resources that are only needed while a worker
+works on a request, like a shared-memory frame slot, are taken by the prepare function
+the feeder calls right before it hands the request over.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future, InvalidStateError
+from multiprocessing import Process, Queue
+
+logger = logging.getLogger(__name__)
+
+
+class PoolFull(Exception):
+    """The pool already has max_pending unanswered requests."""
+
+
+class InferencePool:
+    """Starts ``num_workers`` processes running ``target`` and routes their results.
+
+    ``target`` is called as ``target(worker_id, request_queue, response_queue, *args)``.
+    It must read ``(request_id, request)`` tuples from ``request_queue`` until it gets
+    ``None`` and put one ``(request_id, response)`` tuple on ``response_queue`` for
+    every request it reads.
+
+    Args:
+        max_pending (int): Unanswered requests at most, 0 for no limit.
+        window (int): Requests handed to the workers at once, 0 for no limit. The
+            others wait in the pool, ordered by priority.
+        prepare: Optional function called by the feeder with a request right before it
+            is handed to the workers, returning the request that is sent instead.
+    """
+
+    def __init__(
+        self, target, args=(), num_workers=1, max_pending=0, window=0, prepare=None
+    ):
+        self.num_workers = num_workers
+        self.max_pending = max_pending
+        self.window = window
+        self.request_queue = Queue()
+        self.response_queue = Queue()
+        self.rejected = 0
+
+        self._target = target
+        self._prepare = prepare
+        self._args = tuple(args)
+        self._processes = []
+        self._dispatcher = None
+        self._feeder = None
+        self._pending = {}
+        self._pending_lock = threading.Condition()
+        self._request_ids = itertools.count()
+        self._waiting = []
+        self._in_workers = 0
+        self._stopping = False
+
+    def start(self):
+        """Starts the worker processes and the feeder and dispatcher threads."""
+
+        for worker_id in range(self.num_workers):
+            process = Process(
+                target=self._target,
+                args=(worker_id, self.request_queue, self.response_queue) + self._args,
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_responses, name="inference-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+        self._feeder = threading.Thread(
+            target=self._feed_workers, name="inference-feeder", daemon=True
+        )
+        self._feeder.start()
+        logger.info("Started {} inference worker(s)".format(self.num_workers))
+
+    def submit(self, request, priority=0):
+        """Queues a request for the workers.
+
+        Args:
+            priority (int): Requests with a lower value are handed to the workers first;
+                requests of the same priority are served in order.
+
+        Returns:
+            concurrent.futures.Future resolved with the worker's response.
+
+        Raises:
+            PoolFull: max_pending requests are already waiting for an answer.
+        """
+
+        future = Future()
+        with self._pending_lock:
+            if self.max_pending and len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise PoolFull(
+                    "{} requests are already waiting for inference".format(
+                        len(self._pending)
+                    )
+                )
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            heapq.heappush(self._waiting, (priority, request_id, request))
+            self._pending_lock.notify_all()
+        return future
+
+    def pending_count(self):
+        """Number of submitted requests that have not been answered yet."""
+
+        with self._pending_lock:
+            return len(self._pending)
+
+    def stop(self, timeout=5):
+        """Asks the workers to exit and waits for them."""
+
+        with self._pending_lock:
+            self._stopping = True
+            self._pending_lock.notify_all()
+        if self._feeder is not None:
+            self._feeder.join(timeout)
+        for _ in self._processes:
+            self.request_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.response_queue.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+
+    def _feed_workers(self):
+        while True:
+            with self._pending_lock:
+                while not self._stopping and (
+                    not self._waiting
+                    or (self.window and self._in_workers >= self.window)
+                ):
+                    self._pending_lock.wait()
+                if self._stopping:
+                    return
+                _, request_id, request = heapq.heappop(self._waiting)
+                self._in_workers += 1
+            if self._prepare is not None:
+                try:
+                    request = self._prepare(request)
+                except Exception as e:
+                    # The request is still sent as it is, so that it gets an answer.
+                    logger.error("Failed to prepare request: " + repr(e))
+            self.request_queue.put((request_id, request))
+
+    def _dispatch_responses(self):
+        while True:
+            item = self.response_queue.get()
+            if item is None:
+                break
+
+            request_id, response = item
+            with self._pending_lock:
+                future = self._pending.pop(request_id, None)
+                self._in_workers -= 1
+                self._pending_lock.notify_all()
+            if future is None:
+                logger.warning("Dropping response for unknown request {}".format(request_id))
+                continue
+            try:
+                future.set_result(response)
+            except InvalidStateError:
+                # The caller cancelled the future, e.g. when its call timed out.
+                logger.warning("Dropping response for cancelled request {}".format(request_id))
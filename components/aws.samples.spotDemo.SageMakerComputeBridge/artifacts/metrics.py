@@ -0,0 +1,251 @@
+"""
+Counters, histograms and gauges for the compute bridge.
+
+The metrics are kept in memory and can be scraped in the Prometheus text format from
+a local HTTP endpoint, or published periodically as a JSON snapshot, e.g. to an AWS
+IoT Core topic.
+"""
+
+import bisect
+import collections
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bosdyn.api import header_pb2
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, suitable for per-frame stage times.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class Histogram:
+    """Counts observations in cumulative buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe collection of labelled counters, histograms and gauges.
+
+    Labels are passed as tuples of (name, value) pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+        self._counter_functions = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name, function):
+        """Registers a gauge whose value is read from function when collected."""
+
+        self._gauges[name] = function
+
+    def counter(self, name, function):
+        """Registers a counter whose value is read from function when collected, for
+        totals that are kept elsewhere and only ever increase."""
+
+        self._counter_functions[name] = function
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+
+        lines = []
+        with self._lock:
+            for name, series in _group(self._counters).items():
+                lines.append("# TYPE {} counter".format(name))
+                for labels, value in series:
+                    lines.append("{}{} {}".format(name, _labels(labels), value))
+
+            for name, series in _group(self._histograms).items():
+                lines.append("# TYPE {} histogram".format(name))
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets + ("+Inf",), histogram.counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            "{}_bucket{} {}".format(
+                                name, _labels(labels + (("le", str(bound)),)), cumulative
+                            )
+                        )
+                    lines.append("{}_sum{} {}".format(name, _labels(labels), histogram.sum))
+                    lines.append(
+                        "{}_count{} {}".format(name, _labels(labels), histogram.count)
+                    )
+
+        for name, function in self._counter_functions.items():
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, function()))
+        for name, function in self._gauges.items():
+            lines.append("# TYPE {} gauge".format(name))
+            lines.append("{} {}".format(name, function()))
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Returns the current values as a JSON-serializable dict."""
+
+        snapshot = {"counters": {}, "histograms": {}, "gauges": {}}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                snapshot["counters"][name + _labels(labels)] = value
+            for (name, labels), histogram in self._histograms.items():
+                snapshot["histograms"][name + _labels(labels)] = {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                }
+        for name, function in self._counter_functions.items():
+            snapshot["counters"][name] = function()
+        for name, function in self._gauges.items():
+            snapshot["gauges"][name] = function()
+        return snapshot
+
+
+def _group(series):
+    grouped = collections.OrderedDict()
+    for (name, labels), value in sorted(series.items(), key=lambda item: item[0]):
+        grouped.setdefault(name, []).append((labels, value))
+    return grouped
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, value) for key, value in labels) + "}"
+
+
+class BridgeMetrics(MetricsRegistry):
+    """Metrics of the NetworkCompute requests served by the compute bridge."""
+
+    def observe_request(self, model_name, out_proto, latency, timings):
+        """Records one answered request.
+
+        Args:
+            model_name (str): Model requested.
+            out_proto (NetworkComputeResponse): Response sent back.
+            latency (float): Seconds spent in the servicer.
+            timings (dict): Seconds spent per stage, as reported by the workers.
+        """
+
+        model = (("model", model_name),)
+        self.inc("ncb_requests_total", model)
+        self.observe("ncb_request_seconds", latency, model)
+
+        code = out_proto.header.error.code
+        if code not in (
+            header_pb2.CommonError.CODE_UNSPECIFIED,
+            header_pb2.CommonError.CODE_OK,
+        ):
+            self.inc(
+                "ncb_errors_total",
+                (("code", header_pb2.CommonError.Code.Name(code)),) + model,
+            )
+
+        for stage, seconds in timings.items():
+            self.observe("ncb_stage_seconds", seconds, (("stage", stage),))
+
+
+class MetricsServer:
+    """Serves the metrics of a registry on http://<host>:<port>/metrics."""
+
+    def __init__(self, registry, port, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        logger.info("Serving metrics on port {}".format(self._server.server_port))
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsPublisher:
+    """Periodically publishes a JSON snapshot of a registry.
+
+    Args:
+        registry (MetricsRegistry): Metrics to publish.
+        publish: Callable taking the payload bytes, e.g. a PublishToIoTCore wrapper.
+        interval (float): Seconds between snapshots.
+    """
+
+    def __init__(self, registry, publish, interval=60):
+        self.registry = registry
+        self.publish = publish
+        self.interval = interval
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-publisher", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.publish(json.dumps(self.registry.snapshot()).encode())
+            except Exception as e:
+                logger.error("Failed to publish metrics: " + repr(e))
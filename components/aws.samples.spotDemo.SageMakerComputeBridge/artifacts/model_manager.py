@@ -0,0 +1,322 @@
+"""
+Discovery and on-demand loading of the models served by the compute bridge.
+
+Every packaged model found in the model directories can be requested by name. Models
+are loaded into the Edge Manager agent the first time they are needed, and the least
+recently used ones are unloaded when the configured memory budget would be exceeded.
+"""
+
+import collections
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Optional per-model metadata, e.g. {"name": "valves", "classes": [...], "input_size": 512}
+METADATA_FILE = "model.json"
+
+# Seconds a model that failed to load is not retried for.
+DEFAULT_RETRY_INTERVAL = 30
+
+ModelInfo = namedtuple(
+    "ModelInfo", ["name", "path", "labels", "input_size", "size_bytes"]
+)
+
+
+def discover_models(
+    model_dirs, model_extension, default_name, default_classes, default_input_size
+):
+    """Finds the packaged models in the given directories.
+
+    Each entry of model_dirs is either a directory or NAME=DIRECTORY. A directory that
+    holds a model file is a single model, named NAME, the name in its metadata, or
+    default_name. Otherwise every subdirectory holding a model file is a model, named
+    after its metadata or the subdirectory.
+
+    Returns:
+        OrderedDict of model name to ModelInfo, in discovery order.
+    """
+
+    models = collections.OrderedDict()
+    for spec in model_dirs:
+        name, path = spec.split("=", 1) if "=" in spec else (None, spec)
+
+        if _has_model_file(path, model_extension):
+            candidates = [(path, name, default_name)]
+        else:
+            candidates = [
+                (os.path.join(path, d), None, d)
+                for d in sorted(os.listdir(path))
+                if _has_model_file(os.path.join(path, d), model_extension)
+            ]
+
+        for model_path, explicit_name, fallback_name in candidates:
+            info = _read_model_info(
+                model_path,
+                explicit_name,
+                fallback_name,
+                default_classes,
+                default_input_size,
+            )
+            if info.name in models:
+                raise ValueError(
+                    'Model "{}" found in both {} and {}'.format(
+                        info.name, models[info.name].path, info.path
+                    )
+                )
+            models[info.name] = info
+
+    return models
+
+
+def _has_model_file(path, model_extension):
+    return os.path.isdir(path) and any(
+        f.endswith(model_extension) and os.path.isfile(os.path.join(path, f))
+        for f in os.listdir(path)
+    )
+
+
+def _read_model_info(path, name, fallback_name, default_classes, default_input_size):
+    metadata = {}
+    metadata_path = os.path.join(path, METADATA_FILE)
+    if os.path.isfile(metadata_path):
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+
+    classes = metadata.get("classes") or _read_label_csv(path) or default_classes
+    size_bytes = sum(
+        os.path.getsize(os.path.join(path, f))
+        for f in os.listdir(path)
+        if os.path.isfile(os.path.join(path, f))
+    )
+
+    return ModelInfo(
+        name=name or metadata.get("name") or fallback_name,
+        path=path,
+        labels=np.array(classes),
+        input_size=int(metadata.get("input_size", default_input_size)),
+        size_bytes=size_bytes,
+    )
+
+
+def _read_label_csv(path):
+    """Reads class names from a label file with one "label,index" entry per line."""
+
+    for f in sorted(os.listdir(path)):
+        if not f.endswith(".csv"):
+            continue
+
+        entries = []
+        with open(os.path.join(path, f)) as csv_file:
+            for line in csv_file:
+                if line.strip():
+                    label, index = line.strip().rsplit(",", 1)
+                    entries.append((int(index), label))
+        return [label for _, label in sorted(entries)]
+
+    return None
+
+
+class ModelLoadError(Exception):
+    """A model failed to load recently and is not retried yet."""
+
+
+class ModelManager:
+    """Loads discovered models on demand and evicts the least recently used ones.
+
+    Models are loaded and unloaded outside of the lock guarding the bookkeeping, so
+    requests for models that are loaded already, and the release() of finished requests,
+    never wait for a slow LoadModel call. Concurrent requests for a model that is being
+    loaded wait for that load instead of starting another one.
+
+    Args:
+        model_registry (ModelRegistry): Registry used to load and unload models.
+        models (OrderedDict): Model name to ModelInfo, as returned by discover_models.
+        memory_budget (int): Bytes of model files that may be loaded at once, 0 for no
+            limit. Models that are serving requests are never evicted.
+        retry_interval (float): Seconds a model that failed to load is not retried for.
+            Requests for it fail right away in the meantime.
+    """
+
+    def __init__(
+        self,
+        model_registry,
+        models,
+        memory_budget=0,
+        retry_interval=DEFAULT_RETRY_INTERVAL,
+    ):
+        self.model_registry = model_registry
+        self.memory_budget = memory_budget
+        self.retry_interval = retry_interval
+
+        self._models = collections.OrderedDict(models)
+        self._loaded = collections.OrderedDict()
+        self._in_use = collections.Counter()
+        # Models being loaded or unloaded, to the Event set once that is done.
+        self._loading = {}
+        self._unloading = {}
+        # Models that failed to load, to the time.monotonic() of the next attempt and
+        # the error.
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Names of all the models that can be requested."""
+
+        return list(self._models)
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def preload(self):
+        """Reloads the discovered models, in order, for as long as they fit the budget.
+
+        Copies of the models left in the agent by a previous run are unloaded first.
+        Called once before the bridge serves requests.
+        """
+
+        with self._lock:
+            for name in self._models:
+                if name in self.model_registry:
+                    try:
+                        self.model_registry.unload_model(name)
+                    except Exception as e:
+                        logger.error(f"Error unloading the model: {e}")
+
+            for name, info in self._models.items():
+                if self._fits(info.size_bytes):
+                    try:
+                        self._models[name] = self._load(name)
+                        self._loaded[name] = None
+                    except Exception as e:
+                        logger.error(f"Error loading the model: {e}")
+
+    def acquire(self, name):
+        """Makes sure a model is loaded and marks it as in use.
+
+        Every call must be paired with a call to release().
+
+        Returns:
+            ModelInfo of the model.
+
+        Raises:
+            ModelLoadError: The model failed to load less than retry_interval ago.
+        """
+
+        while True:
+            with self._lock:
+                failure = self._failures.get(name)
+                if failure is not None and time.monotonic() < failure[0]:
+                    raise ModelLoadError(
+                        "Model {} failed to load, retrying in {:.0f} s: {}".format(
+                            name, failure[0] - time.monotonic(), repr(failure[1])
+                        )
+                    )
+
+                if name in self._loaded and name in self.model_registry:
+                    self._loaded.move_to_end(name)
+                    self._in_use[name] += 1
+                    return self._models[name]
+
+                busy = self._loading.get(name) or self._unloading.get(name)
+                if busy is None:
+                    # Also reloads models the agent lost, e.g. when it was restarted.
+                    self._loaded.pop(name, None)
+                    done = threading.Event()
+                    victims = self._make_room(self._models[name].size_bytes)
+                    for victim in victims:
+                        self._unloading[victim] = done
+                    self._loading[name] = done
+                    self._in_use[name] += 1
+                    break
+            busy.wait()
+
+        try:
+            for victim in victims:
+                logger.info("Evicting least recently used model " + victim)
+                try:
+                    self.model_registry.unload_model(victim)
+                except Exception as e:
+                    logger.error(f"Error unloading the model: {e}")
+            info = self._load(name)
+        except Exception as e:
+            with self._lock:
+                self._failures[name] = (time.monotonic() + self.retry_interval, e)
+                self._finish_loading(name, victims)
+                self._release(name)
+            done.set()
+            raise
+
+        with self._lock:
+            self._failures.pop(name, None)
+            self._models[name] = info
+            self._loaded[name] = None
+            self._finish_loading(name, victims)
+        done.set()
+        return info
+
+    def release(self, name):
+        with self._lock:
+            self._release(name)
+
+    def _release(self, name):
+        self._in_use[name] -= 1
+        if self._in_use[name] <= 0:
+            del self._in_use[name]
+
+    def _finish_loading(self, name, victims):
+        del self._loading[name]
+        for victim in victims:
+            del self._unloading[victim]
+
+    def _fits(self, size_bytes):
+        used = sum(
+            self._models[name].size_bytes
+            for name in itertools.chain(self._loaded, self._loading)
+        )
+        return self.memory_budget <= 0 or used + size_bytes <= self.memory_budget
+
+    def _make_room(self, size_bytes):
+        """Picks the idle models to unload so that size_bytes more fit the budget, and
+        removes them from the loaded models.
+
+        Returns:
+            Names of the models to unload.
+        """
+
+        victims = []
+        while not self._fits(size_bytes):
+            idle = [name for name in self._loaded if name not in self._in_use]
+            if not idle:
+                logger.warning("Model memory budget exceeded, all models are in use")
+                break
+
+            victims.append(idle[0])
+            del self._loaded[idle[0]]
+        return victims
+
+    def _load(self, name):
+        """Loads a model into the agent.
+
+        Returns:
+            ModelInfo of the model, with the input size reported by the agent.
+        """
+
+        info = self._models[name]
+        logger.info("Loading model {} from {}".format(name, info.path))
+        self.model_registry.load_model(name, info.path)
+
+        # Prefer the input shape reported by the agent, e.g. [1, 3, 512, 512].
+        tensors = self.model_registry.tensors(name)
+        if tensors and len(tensors["inputs"]) > 0:
+            shape = list(tensors["inputs"][0].shape)
+            if len(shape) == 4 and shape[2] > 0:
+                info = info._replace(input_size=int(shape[2]))
+        return info
@@ -0,0 +1,87 @@
+"""
+In-process cache of the models loaded in the SageMaker Edge Manager agent.
+
+The registry keeps the names and tensor metadata returned by ListModels in memory, so
+the request path does not need a round trip to the agent to validate a model name or
+to answer ListAvailableModels. It is refreshed whenever a model is loaded or unloaded
+through it, and on a low-frequency timer to pick up changes made by other clients.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 60
+
+
+class ModelRegistry:
+    """Caches the models loaded in the Edge Manager agent.
+
+    Args:
+        edge_manager_client (EdgeManagerClient): Client used to talk to the agent.
+        refresh_interval (float): Seconds between background refreshes. 0 disables them.
+    """
+
+    def __init__(self, edge_manager_client, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.edge_manager_client = edge_manager_client
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._models = {}
+        self._refresh_thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Loads the current model list and starts the background refresh timer."""
+
+        self.refresh()
+        if self.refresh_interval > 0:
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_periodically, name="model-registry", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def refresh(self):
+        """Replaces the cached model list with the one reported by the agent."""
+
+        models = self.edge_manager_client.list_model_tensors()
+        with self._lock:
+            self._models = models
+        logger.info("Loaded models: {}".format(sorted(models)))
+
+    def load_model(self, name, path):
+        response = self.edge_manager_client.load_model(name, path)
+        self.refresh()
+        return response
+
+    def unload_model(self, name):
+        response = self.edge_manager_client.unload_model(name)
+        self.refresh()
+        return response
+
+    def names(self):
+        """Names of the loaded models."""
+
+        with self._lock:
+            return list(self._models)
+
+    def tensors(self, name):
+        """Input and output tensor metadata of a loaded model, or None."""
+
+        with self._lock:
+            return self._models.get(name)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._models
+
+    def _refresh_periodically(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Failed to refresh the model list: " + repr(e))
@@ -0,0 +1,220 @@
+"""
+Decoding of SSD detector outputs into NetworkCompute world objects and responses.
+
+All filtering and rescaling is done on NumPy arrays for the whole frame at once, and
+only the surviving detections are turned into protos.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from bosdyn.api import network_compute_bridge_pb2
+from google.protobuf import wrappers_pb2
+
+Detections = namedtuple("Detections", ["boxes", "scores", "labels"])
+
+
+def decode_detections(
+    prediction,
+    min_confidence,
+    box_transform,
+    labels,
+    nms_iou_threshold=0.0,
+    per_class_top_k=0,
+    max_detections=0,
+):
+    """Filters and rescales the raw outputs of a single image.
+
+    Args:
+        prediction: (boxes, scores, classes) arrays of shape (K, 4), (K,) and (K,).
+        min_confidence: Detections scoring below this are dropped.
+        box_transform (BoxTransform): Maps model input coordinates to image pixels.
+        labels: NumPy array of class names indexed by class ID.
+        nms_iou_threshold: Boxes overlapping a better box of the same class by more
+            than this IoU are dropped. 0 disables the suppression.
+        per_class_top_k: Detections kept at most per class, 0 for no limit.
+        max_detections: Detections kept at most in total, 0 for no limit.
+
+    Returns:
+        Detections with (M, 4) integer pixel boxes, (M,) scores and (M,) labels.
+    """
+
+    boxes, scores, classes = prediction
+    # Padded SSD outputs use -1 for the class of empty slots.
+    keep = (scores >= min_confidence) & (classes >= 0) & (classes < len(labels))
+
+    boxes = box_transform.apply(boxes[keep])
+    scores = scores[keep]
+    classes = classes[keep].astype(np.intp)
+
+    keep = select_detections(
+        boxes, scores, classes, nms_iou_threshold, per_class_top_k, max_detections
+    )
+    if keep is not None:
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+    return Detections(
+        boxes=boxes.astype(np.int32),
+        scores=scores,
+        labels=labels[classes],
+    )
+
+
+def select_detections(
+    boxes, scores, classes, nms_iou_threshold=0.0, per_class_top_k=0, max_detections=0
+):
+    """Applies class-aware NMS, the per-class limit and the global limit, in that order.
+
+    Returns:
+        Indices of the kept detections by descending score, or None if nothing is to
+        be done.
+    """
+
+    if not (nms_iou_threshold > 0 or per_class_top_k > 0 or max_detections > 0):
+        return None
+
+    if nms_iou_threshold > 0:
+        keep = batched_nms(boxes, scores, classes, nms_iou_threshold)
+    else:
+        keep = np.argsort(-scores, kind="stable")
+
+    if per_class_top_k > 0 and len(keep) > per_class_top_k:
+        # Rank of every detection within its class, counted by descending score.
+        by_class = keep[np.argsort(classes[keep], kind="stable")]
+        sorted_classes = classes[by_class]
+        ranks = np.arange(len(by_class)) - np.searchsorted(sorted_classes, sorted_classes)
+        kept = by_class[ranks < per_class_top_k]
+        keep = kept[np.argsort(-scores[kept], kind="stable")]
+
+    if max_detections > 0:
+        keep = keep[:max_detections]
+
+    return keep
+
+
+def batched_nms(boxes, scores, classes, iou_threshold):
+    """Greedy non-maximum suppression applied separately to every class.
+
+    The boxes of different classes are moved apart so that they never overlap, which
+    suppresses all the classes in a single pass.
+
+    Args:
+        boxes: (K, 4) array of x1, y1, x2, y2 corners.
+        scores: (K,) array of scores.
+        classes: (K,) array of integer class IDs.
+        iou_threshold: Boxes overlapping a kept box by more than this IoU are dropped.
+
+    Returns:
+        Indices of the kept boxes by descending score.
+    """
+
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    # Shifts the boxes of every class past the extent of all boxes, which can have
+    # negative coordinates, so boxes of different classes never overlap.
+    offsets = classes * (float(boxes.max()) - float(boxes.min()) + 1.0)
+    x1, y1, x2, y2 = (boxes + offsets[:, None]).T
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size > 0:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+
+        width = np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest])
+        height = np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest])
+        intersection = np.maximum(width, 0) * np.maximum(height, 0)
+        union = areas[best] + areas[rest] - intersection
+        iou = intersection / np.maximum(union, np.finfo(np.float32).eps)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.intp)
+
+
+def add_world_objects(out_proto, detections, track_ids=None):
+    """Adds one object_in_image entry per detection to out_proto.
+
+    Objects are named "obj<n>_label_<label>", numbered per frame, or
+    "track<id>_label_<label>" when the track IDs of the detections are given.
+    """
+
+    for i, ((x1, y1, x2, y2), score, label) in enumerate(
+        zip(
+            detections.boxes.tolist(),
+            detections.scores.tolist(),
+            detections.labels.tolist(),
+        )
+    ):
+        out_obj = out_proto.object_in_image.add()
+        if track_ids is None:
+            out_obj.name = "obj" + str(i + 1) + "_label_" + label
+        else:
+            out_obj.name = "track" + str(track_ids[i]) + "_label_" + label
+
+        for x, y in ((x1, y1), (x2, y1), (x2, y2), (x1, y2)):
+            vertex = out_obj.image_properties.coordinates.vertexes.add()
+            vertex.x = x
+            vertex.y = y
+
+        # Pack the confidence value.
+        confidence = wrappers_pb2.FloatValue(value=score)
+        out_obj.additional_properties.Pack(confidence)
+
+
+def detections_from_response(out_proto):
+    """Reads the Detections back from the object_in_image entries of a response built
+    by add_world_objects."""
+
+    boxes, scores, labels = [], [], []
+    for out_obj in out_proto.object_in_image:
+        vertexes = out_obj.image_properties.coordinates.vertexes
+        boxes.append((vertexes[0].x, vertexes[0].y, vertexes[2].x, vertexes[2].y))
+
+        confidence = wrappers_pb2.FloatValue()
+        out_obj.additional_properties.Unpack(confidence)
+        scores.append(confidence.value)
+        labels.append(out_obj.name.split("_label_", 1)[-1])
+
+    return Detections(
+        boxes=np.array(boxes, dtype=np.int32).reshape((-1, 4)),
+        scores=np.array(scores, dtype=np.float32),
+        labels=np.array(labels, dtype=object),
+    )
+
+
+def draw_detections(image, detections):
+    """Draws the boxes and captions of the detections on image in place."""
+
+    for (x1, y1, x2, y2), score, label in zip(
+        detections.boxes.tolist(),
+        detections.scores.tolist(),
+        detections.labels.tolist(),
+    ):
+        polygon = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], np.int32)
+        polygon = polygon.reshape((-1, 1, 2))
+        cv2.polylines(image, [polygon], True, (0, 255, 0), 2)
+
+        caption = "{}: {:.3f}".format(label, score)
+        cv2.putText(
+            image,
+            caption,
+            (min(x1, x2), min(y1, y2)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (0, 255, 0),
+            2,
+        )
+
+
+def error_response(code, err_str):
+    """Builds a NetworkComputeResponse with the error set in the header."""
+
+    print(err_str)
+
+    out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+    out_proto.header.error.code = code
+    out_proto.header.error.message = err_str
+    return out_proto
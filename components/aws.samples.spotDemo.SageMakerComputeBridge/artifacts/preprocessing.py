@@ -0,0 +1,178 @@
+"""
+Image preprocessing for the GluonCV SSD models served through the Edge Manager agent.
+
+The Preprocessor letterboxes a frame into a square model input and normalizes it into
+a CHW float32 tensor. By default every frame is resized into a 4:3 region with size/8
+rows of padding above and below, as the models were originally fed. With
+keep_aspect_ratio, frames of other aspect ratios, e.g. 16:9, keep theirs instead. The
+letterbox geometry, and the transform mapping boxes back from the model input to the
+source image, are computed once per source resolution. All intermediate and output
+buffers are allocated once and reused for every frame.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Mean and Std deviation of the RGB colors (collected from Imagenet dataset)
+MEAN = np.array([123.68, 116.779, 103.939], dtype=np.float32)
+STD = np.array([58.393, 57.12, 57.375], dtype=np.float32)
+
+LetterboxGeometry = namedtuple(
+    "LetterboxGeometry", ["resized_width", "resized_height", "pad_top", "pad_left"]
+)
+
+
+class BoxTransform(namedtuple("BoxTransform", ["scale", "offset"])):
+    """Affine map of (x1, y1, x2, y2) boxes: box * scale + offset.
+
+    scale and offset are float32 arrays of 4 values, so that the transform is applied to
+    a (K, 4) array of boxes in a single vectorized operation.
+    """
+
+    def apply(self, boxes):
+        return boxes * self.scale + self.offset
+
+
+def scaling(x_scale, y_scale):
+    """Returns the BoxTransform scaling the x and y axes."""
+
+    return BoxTransform(
+        np.array([x_scale, y_scale] * 2, dtype=np.float32), np.zeros(4, dtype=np.float32)
+    )
+
+
+class Preprocessor:
+    """Turns frames into normalized [N, 3, size, size] float32 model inputs.
+
+    The returned arrays are views into buffers owned by the Preprocessor, so they are
+    only valid until the next call.
+
+    Args:
+        size (int): Width and height of the model input.
+        interpolation: OpenCV interpolation of the resize.
+        keep_aspect_ratio (bool): Whether frames keep their aspect ratio in the
+            letterbox instead of being resized to 4:3.
+    """
+
+    def __init__(self, size=512, interpolation=cv2.INTER_LINEAR, keep_aspect_ratio=False):
+        self.size = size
+        self.interpolation = interpolation
+        self.keep_aspect_ratio = keep_aspect_ratio
+
+        self._geometries = {}
+        self._box_transforms = {}
+        # Letterboxed HWC frame. The padding stays black as long as the geometry does not
+        # change, so the canvas is only cleared when it does.
+        self._canvas = np.zeros((size, size, 3), dtype=np.uint8)
+        self._canvas_geometry = None
+        self._batch = np.empty((0, 3, size, size), dtype=np.float32)
+        self._mean = MEAN.reshape((3, 1, 1))
+        self._inv_std = (1.0 / STD).reshape((3, 1, 1))
+
+    def geometry(self, height, width):
+        """Returns the cached letterbox geometry for a source resolution."""
+
+        key = (height, width)
+        geometry = self._geometries.get(key)
+        if geometry is None:
+            if (height, width) == (self.size, self.size):
+                # Tiles cut at the input size are used as they are, see preprocess_batch.
+                geometry = LetterboxGeometry(self.size, self.size, 0, 0)
+            elif not self.keep_aspect_ratio:
+                geometry = LetterboxGeometry(
+                    resized_width=self.size,
+                    resized_height=int(self.size / 4 * 3),
+                    pad_top=int(self.size / 8),
+                    pad_left=0,
+                )
+            else:
+                # The frame keeps its aspect ratio and is centered in the square input,
+                # e.g. 4:3 body camera frames get size/8 rows of padding above and below.
+                scale = min(self.size / width, self.size / height)
+                resized_width = max(1, min(self.size, int(round(width * scale))))
+                resized_height = max(1, min(self.size, int(round(height * scale))))
+                geometry = LetterboxGeometry(
+                    resized_width=resized_width,
+                    resized_height=resized_height,
+                    pad_top=(self.size - resized_height) // 2,
+                    pad_left=(self.size - resized_width) // 2,
+                )
+            self._geometries[key] = geometry
+        return geometry
+
+    def box_transform(self, height, width, source_height=0, source_width=0):
+        """Returns the cached transform mapping boxes in model input coordinates back to
+        the pixels of the source image.
+
+        Args:
+            height, width: Size of the frame that was letterboxed.
+            source_height, source_width: Size of the original image when the frame was
+                decoded at a reduced size, e.g. JPEG images decoded at 1/2 scale. 0 if
+                the frame has the size of the source.
+        """
+
+        source_height = source_height or height
+        source_width = source_width or width
+        key = (height, width, source_height, source_width)
+        transform = self._box_transforms.get(key)
+        if transform is None:
+            geometry = self.geometry(height, width)
+            scale = np.array(
+                [
+                    source_width / geometry.resized_width,
+                    source_height / geometry.resized_height,
+                ]
+                * 2,
+                dtype=np.float32,
+            )
+            pad = np.array([geometry.pad_left, geometry.pad_top] * 2, dtype=np.float32)
+            transform = BoxTransform(scale, -pad * scale)
+            self._box_transforms[key] = transform
+        return transform
+
+    def __call__(self, img):
+        """Preprocesses a single HWC uint8 frame into a [3, size, size] view."""
+
+        return self.preprocess_batch([img])[0]
+
+    def preprocess_batch(self, imgs):
+        """Preprocesses HWC uint8 frames into a [N, 3, size, size] view."""
+
+        if len(imgs) > len(self._batch):
+            self._batch = np.empty(
+                (len(imgs), 3, self.size, self.size), dtype=np.float32
+            )
+
+        batch = self._batch[: len(imgs)]
+        for img, out in zip(imgs, batch):
+            if img.shape[:2] == (self.size, self.size):
+                # Tiles cut at the input size are normalized straight from the frame.
+                source = img
+            else:
+                self._letterbox(img)
+                source = self._canvas
+            np.subtract(source.transpose((2, 0, 1)), self._mean, out=out)
+            np.multiply(out, self._inv_std, out=out)
+        return batch
+
+    def _letterbox(self, img):
+        geometry = self.geometry(img.shape[0], img.shape[1])
+        if geometry != self._canvas_geometry:
+            # The previous frame may have covered part of the new padding.
+            self._canvas.fill(0)
+            self._canvas_geometry = geometry
+        region = self._canvas[
+            geometry.pad_top : geometry.pad_top + geometry.resized_height,
+            geometry.pad_left : geometry.pad_left + geometry.resized_width,
+        ]
+        resized = cv2.resize(
+            img,
+            (geometry.resized_width, geometry.resized_height),
+            dst=region,
+            interpolation=self.interpolation,
+        )
+        if not np.shares_memory(resized, region):
+            # Some OpenCV builds allocate a new array instead of resizing in place.
+            region[...] = resized
@@ -0,0 +1,123 @@
+"""
+Per-request options of the compute bridge.
+
+Clients can tune a request by packing a google.protobuf.Struct into
+NetworkComputeInputData.other_data, e.g.:
+
+    params = struct_pb2.Struct()
+    params.update({"nms_iou_threshold": 0.5, "max_detections": 20})
+    request.input_data.other_data.Pack(params)
+
+Options that are not set fall back to the defaults given on the command line. Frames
+that share a "stream" name are treated as a video stream: objects are tracked across
+them and detection only runs on some of the frames. Requests with "priority": "batch",
+e.g. the frames of a mission, only run when no interactive request is waiting.
+"""
+
+from collections import namedtuple
+
+from google.protobuf import struct_pb2
+
+RequestOptions = namedtuple(
+    "RequestOptions",
+    [
+        "nms_iou_threshold",
+        "per_class_top_k",
+        "max_detections",
+        "tiling",
+        "tile_overlap",
+        "stream",
+        "priority",
+    ],
+)
+
+# Priorities of the request queue, most urgent first.
+PRIORITIES = ("interactive", "batch")
+
+# Keeps every detection above min_confidence, as the SSD model reports them.
+DEFAULT_OPTIONS = RequestOptions(
+    nms_iou_threshold=0.0,
+    per_class_top_k=0,
+    max_detections=0,
+    tiling=False,
+    tile_overlap=64,
+    stream="",
+    priority="interactive",
+)
+
+
+class InvalidRequestOptions(ValueError):
+    """The options of a request are malformed or out of range."""
+
+
+def parse_request_options(input_data, defaults=DEFAULT_OPTIONS):
+    """Reads the options of a request from input_data.other_data.
+
+    Args:
+        input_data (NetworkComputeInputData): Input of the request.
+        defaults (RequestOptions): Values of the options the request does not set.
+
+    Returns:
+        RequestOptions of the request.
+    """
+
+    if not input_data.HasField("other_data"):
+        return defaults
+
+    params = struct_pb2.Struct()
+    if not input_data.other_data.Unpack(params):
+        raise InvalidRequestOptions(
+            "Error: other_data must hold a google.protobuf.Struct, got "
+            + input_data.other_data.type_url
+        )
+
+    unknown = set(params.keys()) - set(RequestOptions._fields)
+    if unknown:
+        raise InvalidRequestOptions(
+            "Error: unknown options: " + ", ".join(sorted(unknown))
+        )
+
+    options = defaults._replace(**dict(params.items()))
+    try:
+        options = options._replace(
+            nms_iou_threshold=float(options.nms_iou_threshold),
+            per_class_top_k=_count(options.per_class_top_k),
+            max_detections=_count(options.max_detections),
+            tiling=_flag(options.tiling),
+            tile_overlap=_count(options.tile_overlap),
+            stream=_text(options.stream),
+            priority=_text(options.priority),
+        )
+    except (TypeError, ValueError):
+        raise InvalidRequestOptions("Error: invalid options: " + repr(dict(params.items())))
+
+    if not 0.0 <= options.nms_iou_threshold <= 1.0:
+        raise InvalidRequestOptions("Error: nms_iou_threshold must be between 0 and 1")
+    if options.per_class_top_k < 0 or options.max_detections < 0:
+        raise InvalidRequestOptions("Error: detection limits cannot be negative")
+    if options.tile_overlap < 0:
+        raise InvalidRequestOptions("Error: tile_overlap cannot be negative")
+    if options.priority not in PRIORITIES:
+        raise InvalidRequestOptions(
+            "Error: priority must be one of: " + ", ".join(PRIORITIES)
+        )
+    return options
+
+
+def _count(value):
+    # Struct numbers are doubles.
+    if float(value) != int(value):
+        raise ValueError(value)
+    return int(value)
+
+
+def _flag(value):
+    if not isinstance(value, bool):
+        raise TypeError(value)
+    return value
+
+
+def _text(value):
+    if not isinstance(value, str):
+        raise TypeError(value)
+    return value
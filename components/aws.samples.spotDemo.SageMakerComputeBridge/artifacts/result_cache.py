@@ -0,0 +1,154 @@
+"""
+Cache of NetworkCompute responses keyed on the content of the request image.
+
+While Spot stands still, e.g. during Autowalk actions, it keeps sending the same scene.
+Repeated frames are answered from the cache without decoding them or calling the
+SageMaker Edge Manager agent.
+
+Images are identified either by a hash of their bytes, which only matches identical
+frames, or by a perceptual difference hash (dHash) of a tiny grayscale thumbnail, which
+also matches frames that differ only by sensor noise or JPEG artifacts.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from bosdyn.api import header_pb2
+from image_decoding import ImageDecodeError, decode_image
+
+CACHE_MODES = ("exact", "perceptual")
+
+# Side of the dHash grid, giving HASH_SIZE * HASH_SIZE bits.
+HASH_SIZE = 8
+
+CacheEntry = collections.namedtuple(
+    "CacheEntry", ["params", "image_hash", "response", "expires_at"]
+)
+
+
+class ResultCache:
+    """Size-bounded LRU cache of responses that expire after a TTL.
+
+    Args:
+        max_entries (int): Responses kept at most. The least recently used one is
+            evicted first.
+        ttl (float): Seconds a response stays valid.
+        mode (str): "exact" to match identical image bytes, "perceptual" to match
+            frames whose difference hashes are at most max_distance bits apart.
+        max_distance (int): Bits of the 64-bit perceptual hash that may differ.
+    """
+
+    def __init__(self, max_entries, ttl, mode="exact", max_distance=4):
+        if mode not in CACHE_MODES:
+            raise ValueError("Unknown cache mode: " + mode)
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mode = mode
+        self.max_distance = max_distance
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, request):
+        """Returns the cache key of a NetworkComputeRequest, or None if its image
+        cannot be hashed.
+
+        The key covers the image and every input parameter except the image, i.e. the
+        model name, min_confidence, rotate_image and other_data.
+        """
+
+        input_data = request.input_data
+        params = (
+            input_data.model_name,
+            input_data.min_confidence,
+            input_data.rotate_image,
+            input_data.other_data.SerializeToString(deterministic=True),
+        )
+
+        if self.mode == "exact":
+            return params, hashlib.blake2b(input_data.image.data, digest_size=16).digest()
+
+        try:
+            return params, perceptual_hash(input_data.image)
+        except ImageDecodeError:
+            return None
+
+    def get(self, key):
+        """Returns a copy of the cached response for a key, or None."""
+
+        params, image_hash = key
+        now = time.monotonic()
+        with self._lock:
+            entry_key = self._find(params, image_hash, now)
+            if entry_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            cached = self._entries[entry_key].response
+
+        response = type(cached)()
+        response.CopyFrom(cached)
+        return response
+
+    def put(self, key, response):
+        """Caches a response unless it reports an error."""
+
+        if response.header.error.code not in (
+            header_pb2.CommonError.CODE_UNSPECIFIED,
+            header_pb2.CommonError.CODE_OK,
+        ):
+            return
+
+        params, image_hash = key
+        entry = CacheEntry(params, image_hash, response, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _find(self, params, image_hash, now):
+        key = (params, image_hash)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            return key
+        if self.mode == "exact":
+            return None
+
+        # Near-identical frames hash to nearby values: scan from the most recent entry.
+        for entry_key in reversed(self._entries):
+            entry = self._entries[entry_key]
+            if (
+                entry.params == params
+                and entry.expires_at > now
+                and bin(entry.image_hash ^ image_hash).count("1") <= self.max_distance
+            ):
+                return entry_key
+        return None
+
+
+def perceptual_hash(image):
+    """Returns the 64-bit difference hash of a bosdyn.api.Image.
+
+    JPEG images are decoded at 1/8 of their size, which is enough for the thumbnail.
+    """
+
+    frame = decode_image(image, HASH_SIZE + 1, HASH_SIZE)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
@@ -0,0 +1,83 @@
+"""
+Tiled inference for detecting small objects in high-resolution frames.
+
+A downscaled 1920x1080 frame leaves gauges, valves and labels only a few pixels wide.
+In tiling mode the full-resolution frame is also cut into overlapping tiles of the
+model input size, which are run in the same batched Predict call as the whole frame.
+The detections of the whole frame and of the tiles are mapped back to image pixels and
+duplicates are merged with NMS.
+"""
+
+import functools
+
+import numpy as np
+
+# IoU above which detections of the same class from different tiles are merged, when
+# the request does not ask for a NMS threshold of its own.
+MERGE_IOU_THRESHOLD = 0.5
+
+
+@functools.lru_cache(maxsize=16)
+def tile_layout(height, width, tile_size, overlap):
+    """Returns the top-left corners of the tiles covering a frame.
+
+    The tiles are spread evenly so that neighbours overlap by at least overlap pixels.
+    Layouts are cached per resolution.
+
+    Returns:
+        Read-only (T, 2) int array of (x, y) corners, or None if the frame is smaller
+        than a tile.
+    """
+
+    if height < tile_size or width < tile_size:
+        return None
+
+    overlap = min(max(overlap, 0), tile_size - 1)
+    stride = tile_size - overlap
+
+    def positions(length):
+        count = max(1, -(-(length - overlap) // stride))
+        return np.linspace(0, length - tile_size, count).round().astype(np.intp)
+
+    xs, ys = np.meshgrid(positions(width), positions(height))
+    layout = np.stack([xs.ravel(), ys.ravel()], axis=1)
+    layout.setflags(write=False)
+    return layout
+
+
+def tile_views(image, layout, tile_size):
+    """Returns the tiles of an HWC image as views, without copying the pixels."""
+
+    return [image[y : y + tile_size, x : x + tile_size] for x, y in layout.tolist()]
+
+
+def merge_predictions(predictions, layout, frame_transform, tile_transform):
+    """Combines the whole-frame prediction with the predictions of its tiles.
+
+    Args:
+        predictions: (boxes, scores, classes) tuples, first for the whole frame and then
+            one per tile of layout. Tile boxes are in tile pixels.
+        layout: Tile corners, as returned by tile_layout.
+        frame_transform (BoxTransform): Maps whole-frame boxes to image pixels.
+        tile_transform (BoxTransform): Maps boxes in pixels of the frame the tiles were
+            cut from to image pixels.
+
+    Returns:
+        Single (boxes, scores, classes) tuple with boxes in image pixels.
+    """
+
+    frame_boxes, frame_scores, frame_classes = predictions[0]
+    tile_boxes = np.stack([boxes for boxes, _, _ in predictions[1:]])
+    tile_boxes = tile_boxes + np.tile(layout, 2)[:, None, :].astype(np.float32)
+
+    boxes = np.concatenate(
+        [
+            frame_transform.apply(frame_boxes),
+            tile_transform.apply(tile_boxes.reshape((-1, 4))),
+        ]
+    )
+    scores = np.concatenate([frame_scores] + [scores for _, scores, _ in predictions[1:]])
+    classes = np.concatenate(
+        [frame_classes] + [classes for _, _, classes in predictions[1:]]
+    )
+    return boxes, scores, classes
@@ -0,0 +1,194 @@
+"""
+Object tracking for streams of frames from the same camera.
+
+Detection only runs on every Kth frame of a stream. A lightweight tracker associates the
+detections with the existing tracks by IoU and follows every track with a constant
+velocity alpha-beta filter, so that the objects can be extrapolated on the frames in
+between. Objects keep the same track ID for as long as they are detected.
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+TrackedDetections = namedtuple(
+    "TrackedDetections", ["boxes", "scores", "labels", "track_ids"]
+)
+
+
+class Track:
+    """A tracked object with a box and the velocity of its corners, in pixels."""
+
+    def __init__(self, track_id, box, score, label, timestamp):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.score = score
+        self.label = label
+        self.timestamp = timestamp
+
+    def predict(self, timestamp):
+        return self.box + self.velocity * (timestamp - self.timestamp)
+
+    def update(self, box, score, timestamp, alpha, beta):
+        dt = timestamp - self.timestamp
+        predicted = self.predict(timestamp)
+        residual = np.asarray(box, dtype=np.float32) - predicted
+        self.box = predicted + alpha * residual
+        if dt > 0:
+            self.velocity = self.velocity + (beta / dt) * residual
+        self.score = score
+        self.timestamp = timestamp
+
+
+class IoUTracker:
+    """Associates detections with tracks by IoU and extrapolates the tracks.
+
+    Args:
+        iou_threshold (float): Minimum IoU between a predicted track box and a
+            detection of the same label for them to be associated.
+        max_age (float): Seconds a track survives without being detected.
+        alpha (float): Weight of a new detection in the box estimate.
+        beta (float): Weight of a new detection in the velocity estimate.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=2.0, alpha=0.7, beta=0.3):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.alpha = alpha
+        self.beta = beta
+
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections, timestamp):
+        """Updates the tracks with the detections of a frame.
+
+        Args:
+            detections (Detections): Boxes, scores and labels detected in the frame.
+            timestamp (float): Time of the frame in seconds.
+
+        Returns:
+            TrackedDetections of the detections, in the same order, with their track IDs.
+        """
+
+        boxes = np.asarray(detections.boxes, dtype=np.float32).reshape((-1, 4))
+        labels = list(detections.labels)
+        matches = self._associate(boxes, labels, timestamp)
+
+        track_ids = []
+        for i, (box, score, label) in enumerate(zip(boxes, detections.scores, labels)):
+            track = matches.get(i)
+            if track is None:
+                track = Track(self._next_id, box, float(score), label, timestamp)
+                self._next_id += 1
+                self.tracks.append(track)
+            else:
+                track.update(box, float(score), timestamp, self.alpha, self.beta)
+            track_ids.append(track.track_id)
+
+        self.tracks = [
+            track for track in self.tracks if timestamp - track.timestamp <= self.max_age
+        ]
+        return TrackedDetections(
+            boxes=np.asarray(detections.boxes),
+            scores=np.asarray(detections.scores),
+            labels=np.asarray(detections.labels),
+            track_ids=track_ids,
+        )
+
+    def predict(self, timestamp):
+        """Returns the TrackedDetections of the live tracks extrapolated to timestamp."""
+
+        tracks = [
+            track for track in self.tracks if timestamp - track.timestamp <= self.max_age
+        ]
+        if tracks:
+            boxes = np.stack([track.predict(timestamp) for track in tracks])
+        else:
+            boxes = np.zeros((0, 4), dtype=np.float32)
+        return TrackedDetections(
+            boxes=np.maximum(boxes, 0).round().astype(np.int32),
+            scores=np.array([track.score for track in tracks], dtype=np.float32),
+            labels=np.array([track.label for track in tracks]),
+            track_ids=[track.track_id for track in tracks],
+        )
+
+    def _associate(self, boxes, labels, timestamp):
+        """Greedily matches detections to tracks by descending IoU.
+
+        Returns:
+            Dict of detection index to matched Track.
+        """
+
+        if not self.tracks or len(boxes) == 0:
+            return {}
+
+        predicted = np.stack([track.predict(timestamp) for track in self.tracks])
+        iou = box_iou(boxes, predicted)
+        same_label = np.array(labels)[:, None] == np.array(
+            [track.label for track in self.tracks]
+        )
+        iou[~same_label] = 0
+
+        matches = {}
+        used_tracks = set()
+        for i, j in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[i, j] < self.iou_threshold:
+                break
+            if i in matches or j in used_tracks:
+                continue
+            matches[i] = self.tracks[j]
+            used_tracks.add(j)
+        return matches
+
+
+class StreamTracker:
+    """Tracks the objects of one stream of frames.
+
+    Args:
+        detect_every (int): Detection runs on one frame out of detect_every; the others
+            are answered from the tracks.
+    """
+
+    def __init__(self, detect_every=1, **tracker_args):
+        self.detect_every = max(1, detect_every)
+        self.tracker = IoUTracker(**tracker_args)
+        self.last_used = 0.0
+
+        self._frames = 0
+        self._lock = threading.Lock()
+
+    def next_frame(self, timestamp):
+        """Counts a new frame of the stream.
+
+        Returns:
+            Whether detection should run on the frame.
+        """
+
+        with self._lock:
+            detect = self._frames % self.detect_every == 0
+            self._frames += 1
+            self.last_used = timestamp
+            return detect
+
+    def update(self, detections, timestamp):
+        with self._lock:
+            return self.tracker.update(detections, timestamp)
+
+    def predict(self, timestamp):
+        with self._lock:
+            return self.tracker.predict(timestamp)
+
+
+def box_iou(boxes_a, boxes_b):
+    """Returns the (N, M) IoU matrix of two arrays of x1, y1, x2, y2 boxes."""
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(np.clip(boxes_a[:, 2:] - boxes_a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(boxes_b[:, 2:] - boxes_b[:, :2], 0, None), axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, np.finfo(np.float32).eps)
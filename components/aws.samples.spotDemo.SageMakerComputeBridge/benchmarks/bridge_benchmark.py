@@ -0,0 +1,206 @@
+"""
+Throughput and latency benchmark for the compute bridge, without a robot or a real
+SageMaker Edge Manager agent.
+
+Starts a fake agent (see fake_agent.py) on a Unix socket in a separate process, starts
+the compute bridge workers against it and drives NetworkComputeBridgeWorkerServicer
+with synthetic RAW or JPEG frames from several threads. Arguments that are not
+recognized are passed on to the compute server, e.g. --num-workers or --max-batch-size.
+
+Example:
+    python3 benchmarks/bridge_benchmark.py --format jpeg --concurrency 6 -- --num-workers 2
+"""
+
+import argparse
+import collections
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
+
+from bosdyn.api import image_pb2
+from bosdyn.api import network_compute_bridge_pb2
+
+import compute_server
+import fake_agent
+
+STAGES = ["queue_wait", "decode", "preprocess", "predict", "decode_outputs", "build_response"]
+
+
+def run_fake_agent(address, delay, num_detections):
+    fake_agent.serve(address, delay, num_detections).wait_for_termination()
+
+
+def make_request(image_format, width, height, min_confidence, seed):
+    """Builds a NetworkComputeRequest with a synthetic frame."""
+
+    rng = np.random.default_rng(seed)
+    # Smooth noise compresses like a camera frame rather than like white noise.
+    small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    request = network_compute_bridge_pb2.NetworkComputeRequest()
+    request.input_data.model_name = compute_server.MODEL_NAME
+    request.input_data.min_confidence = min_confidence
+    image = request.input_data.image
+    image.rows = height
+    image.cols = width
+    if image_format == "jpeg":
+        image.format = image_pb2.Image.FORMAT_JPEG
+        image.data = cv2.imencode(".jpg", frame)[1].tobytes()
+    else:
+        image.format = image_pb2.Image.FORMAT_RAW
+        image.pixel_format = image_pb2.Image.PIXEL_FORMAT_RGB_U8
+        image.data = frame.tobytes()
+    return request
+
+
+def percentile_ms(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=["raw", "jpeg"], default="jpeg")
+    parser.add_argument("--width", help="Frame width, default: 1920", type=int, default=1920)
+    parser.add_argument("--height", help="Frame height, default: 1080", type=int, default=1080)
+    parser.add_argument(
+        "--concurrency", help="Concurrent callers, default: 6", type=int, default=6
+    )
+    parser.add_argument(
+        "--requests", help="Requests to send, default: 300", type=int, default=300
+    )
+    parser.add_argument(
+        "--min-confidence", help="Confidence threshold, default: 0.5", type=float, default=0.5
+    )
+    parser.add_argument(
+        "--delay-ms", help="Fake inference delay per Predict call, default: 20", type=float, default=20
+    )
+    parser.add_argument(
+        "--detections", help="Detections per image, default: 100", type=int, default=100
+    )
+    options, bridge_argv = parser.parse_known_args(argv)
+    if bridge_argv[:1] == ["--"]:
+        bridge_argv = bridge_argv[1:]
+
+    workdir = tempfile.mkdtemp(prefix="bridge-benchmark-")
+    socket_path = os.path.join(workdir, "agent.sock")
+    address = "unix://" + socket_path
+    model_dir = os.path.join(workdir, "model")
+    os.mkdir(model_dir)
+    open(os.path.join(model_dir, "model.params"), "wb").close()
+
+    agent = multiprocessing.Process(
+        target=run_fake_agent,
+        args=(address, options.delay_ms / 1000.0, options.detections),
+        daemon=True,
+    )
+    agent.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.05)
+
+    bridge_options = compute_server.create_parser().parse_args(
+        ["-d", model_dir, "-r", "-n", "--agent-socket", address] + bridge_argv
+    )
+    models = compute_server.discover_models(
+        bridge_options.model_dir,
+        ".params",
+        compute_server.MODEL_NAME,
+        compute_server.MODEL_CLASSES,
+        compute_server.MODEL_INPUT_SIZE,
+    )
+
+    stage_times = collections.defaultdict(list)
+    stage_lock = threading.Lock()
+
+    class StageRecorder:
+        def observe_request(self, model_name, out_proto, latency, timings):
+            with stage_lock:
+                for stage, seconds in timings.items():
+                    stage_times[stage].append(seconds)
+
+    # The bridge logs every request, which would dominate the measurements.
+    logging.getLogger().setLevel(logging.WARNING)
+    servicer, shutdown = compute_server.start_servicer(
+        bridge_options, models, ".params", StageRecorder()
+    )
+
+    frames = [
+        make_request(options.format, options.width, options.height, options.min_confidence, seed)
+        for seed in range(8)
+    ]
+    latencies = []
+    errors = collections.Counter()
+
+    def call(i):
+        request = network_compute_bridge_pb2.NetworkComputeRequest()
+        request.CopyFrom(frames[i % len(frames)])
+        start = timer()
+        response = servicer.NetworkCompute(request, None)
+        latency = timer() - start
+        if response.header.error.code:
+            errors[response.header.error.message] += 1
+        return latency
+
+    try:
+        # Warm up the workers before measuring.
+        with ThreadPoolExecutor(options.concurrency) as executor:
+            list(executor.map(call, range(options.concurrency * 2)))
+        stage_times.clear()
+
+        start = timer()
+        with ThreadPoolExecutor(options.concurrency) as executor:
+            latencies = list(executor.map(call, range(options.requests)))
+        elapsed = timer() - start
+    finally:
+        shutdown()
+        agent.terminate()
+
+    print(
+        "{} {}x{} frames, concurrency {}, bridge options: {}".format(
+            options.format.upper(),
+            options.width,
+            options.height,
+            options.concurrency,
+            " ".join(bridge_argv) or "defaults",
+        )
+    )
+    print("Throughput: {:.1f} frames/s".format(options.requests / elapsed))
+    print(
+        "Latency: p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+            percentile_ms(latencies, 50),
+            percentile_ms(latencies, 95),
+            percentile_ms(latencies, 99),
+        )
+    )
+    print("Per-stage time (mean / p95 ms):")
+    for stage in STAGES + sorted(set(stage_times) - set(STAGES)):
+        if stage in stage_times:
+            print(
+                "  {:<15} {:7.2f} / {:7.2f}".format(
+                    stage,
+                    float(np.mean(stage_times[stage])) * 1000,
+                    percentile_ms(stage_times[stage], 95),
+                )
+            )
+    for message, count in errors.items():
+        print("Error x{}: {}".format(count, message))
+
+    return not errors
+
+
+if __name__ == "__main__":
+    if not main(sys.argv[1:]):
+        sys.exit(1)
@@ -0,0 +1,132 @@
+"""
+Stand-in for the SageMaker Edge Manager agent, for benchmarking the compute bridge.
+
+Serves the Agent gRPC API on a Unix socket. Predict sleeps for a configurable time and
+returns SSD-shaped outputs (classes, scores and boxes for a fixed number of detections
+per image) for whatever batch size it receives.
+
+Example:
+    python3 benchmarks/fake_agent.py --socket /tmp/fake-agent.sock --delay-ms 20
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
+
+import agent_pb2
+import agent_pb2_grpc
+from edge_manager_client import DATA_TYPE, TENSOR_SHAPE
+
+
+class FakeAgentServicer(agent_pb2_grpc.AgentServicer):
+    """Agent that pretends to run an SSD detector.
+
+    Args:
+        delay (float): Seconds every Predict call takes, regardless of the batch size.
+        num_detections (int): Detections returned per image, with descending scores.
+        input_size (int): Side of the square model input, used to place the boxes.
+    """
+
+    def __init__(self, delay=0.02, num_detections=100, input_size=TENSOR_SHAPE[-1]):
+        self.delay = delay
+        self.num_detections = num_detections
+        self.input_size = input_size
+        self.models = {}
+
+    def Predict(self, request, context):
+        batch_size = request.tensors[0].tensor_metadata.shape[0]
+        time.sleep(self.delay)
+
+        k = self.num_detections
+        rng = np.random.default_rng()
+        classes = rng.integers(0, 20, (batch_size, k, 1)).astype(np.float32)
+        scores = np.sort(rng.random((batch_size, k, 1), dtype=np.float32), axis=1)[
+            :, ::-1
+        ]
+        corners = rng.random((batch_size, k, 2, 2), dtype=np.float32) * self.input_size
+        boxes = np.concatenate(
+            [corners.min(axis=2), corners.max(axis=2)], axis=2
+        ).reshape((batch_size, k, 4))
+
+        response = agent_pb2.PredictResponse()
+        for name, output in (("classes", classes), ("scores", scores), ("boxes", boxes)):
+            tensor = response.tensors.add()
+            tensor.tensor_metadata.name = name
+            tensor.tensor_metadata.data_type = DATA_TYPE
+            tensor.tensor_metadata.shape.extend(output.shape)
+            tensor.byte_data = np.ascontiguousarray(output).tobytes()
+        return response
+
+    def LoadModel(self, request, context):
+        self.models[request.name] = request.url
+        return agent_pb2.LoadModelResponse()
+
+    def UnLoadModel(self, request, context):
+        self.models.pop(request.name, None)
+        return agent_pb2.UnLoadModelResponse()
+
+    def ListModels(self, request, context):
+        response = agent_pb2.ListModelsResponse()
+        for name, url in self.models.items():
+            model = response.models.add()
+            model.name = name
+            model.url = url
+            tensor = model.input_tensor_metadatas.add()
+            tensor.name = "data"
+            tensor.data_type = DATA_TYPE
+            tensor.shape.extend([1, 3, self.input_size, self.input_size])
+        return response
+
+
+def serve(address, delay=0.02, num_detections=100, max_workers=10):
+    """Starts a fake agent on a gRPC address such as unix:///tmp/fake-agent.sock."""
+
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=max_workers),
+        # Batched input tensors are larger than the default 4 MB limit.
+        options=[
+            ("grpc.max_receive_message_length", -1),
+            ("grpc.max_send_message_length", -1),
+        ],
+    )
+    agent_pb2_grpc.add_AgentServicer_to_server(
+        FakeAgentServicer(delay, num_detections), server
+    )
+    server.add_insecure_port(address)
+    server.start()
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--socket",
+        help="Unix socket to listen on, default: /tmp/fake-agent.sock",
+        default="/tmp/fake-agent.sock",
+    )
+    parser.add_argument(
+        "--delay-ms", help="Inference delay per Predict call, default: 20", type=float, default=20
+    )
+    parser.add_argument(
+        "--detections", help="Detections per image, default: 100", type=int, default=100
+    )
+    options = parser.parse_args(argv)
+
+    server = serve("unix://" + options.socket, options.delay_ms / 1000.0, options.detections)
+    print("Fake agent listening on " + options.socket)
+    server.wait_for_termination()
+    return True
+
+
+if __name__ == "__main__":
+    if not main(sys.argv[1:]):
+        sys.exit(1)
@@ -0,0 +1,96 @@
+"""
+Microbenchmark for the frame-to-tensor preprocessing of the compute bridge.
+
+Compares the original per-channel preprocessing of EdgeManagerClient.get_prediction
+with the Preprocessor used today on synthetic frames.
+
+Example:
+    python3 benchmarks/preprocess_benchmark.py --width 1920 --height 1080
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
+
+from edge_manager_client import SIZE, EdgeManagerClient
+from preprocessing import MEAN, STD, Preprocessor
+
+
+def legacy_preprocess(client, img):
+    """Preprocessing as originally done in EdgeManagerClient.get_prediction."""
+
+    mean = MEAN.tolist()
+    std = STD.tolist()
+
+    frame = client.resize_short_within(img, short=SIZE, max_size=SIZE * 2)
+    nn_input_size = SIZE
+    nn_input = cv2.resize(frame, (nn_input_size, int(nn_input_size / 4 * 3)))
+    nn_input = cv2.copyMakeBorder(
+        nn_input,
+        int(nn_input_size / 8),
+        int(nn_input_size / 8),
+        0,
+        0,
+        cv2.BORDER_CONSTANT,
+        value=(0, 0, 0),
+    )
+    nn_input = nn_input.astype("float32")
+    nn_input = nn_input.reshape((nn_input_size * nn_input_size, 3))
+    scaled_frame = np.transpose(nn_input)
+    scaled_frame[0, :] = scaled_frame[0, :] - mean[0]
+    scaled_frame[0, :] = scaled_frame[0, :] / std[0]
+    scaled_frame[1, :] = scaled_frame[1, :] - mean[1]
+    scaled_frame[1, :] = scaled_frame[1, :] / std[1]
+    scaled_frame[2, :] = scaled_frame[2, :] - mean[2]
+    scaled_frame[2, :] = scaled_frame[2, :] / std[2]
+    return scaled_frame.tobytes()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", help="Frame width, default: 1920", type=int, default=1920)
+    parser.add_argument("--height", help="Frame height, default: 1080", type=int, default=1080)
+    parser.add_argument(
+        "--iterations", help="Frames per measurement, default: 200", type=int, default=200
+    )
+    options = parser.parse_args(argv)
+
+    img = np.random.randint(0, 256, (options.height, options.width, 3), dtype=np.uint8)
+    client = EdgeManagerClient()
+    preprocessor = Preprocessor(SIZE)
+
+    legacy = np.frombuffer(legacy_preprocess(client, img), dtype=np.float32)
+    current = np.frombuffer(preprocessor(img).tobytes(), dtype=np.float32)
+    print(
+        "Mean absolute difference between outputs: {:.4f}".format(
+            float(np.mean(np.abs(legacy - current)))
+        )
+    )
+
+    results = [
+        ("legacy", lambda: legacy_preprocess(client, img)),
+        ("preprocessor", lambda: preprocessor(img).tobytes()),
+    ]
+    for name, fn in results:
+        fn()
+        seconds = timeit.timeit(fn, number=options.iterations) / options.iterations
+        print(
+            "{:>12}: {:.3f} ms/frame for {}x{} input".format(
+                name, seconds * 1000, options.width, options.height
+            )
+        )
+
+    return True
+
+
+if __name__ == "__main__":
+    if not main(sys.argv[1:]):
+        sys.exit(1)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The artifacts are flat modules run from their own directory, like the benchmarks.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
@@ -0,0 +1,157 @@
+import concurrent.futures
+import threading
+import time
+
+from bosdyn.api import header_pb2, image_pb2, network_compute_bridge_pb2
+from google.protobuf import wrappers_pb2
+
+from camera_pull import FRAMES_IN_FLIGHT, CameraPuller, LatestResults
+
+TIMEOUT = 5
+
+
+def response(*confidences):
+    out = network_compute_bridge_pb2.NetworkComputeResponse()
+    out.header.error.code = header_pb2.CommonError.CODE_OK
+    for i, value in enumerate(confidences):
+        obj = out.object_in_image.add()
+        obj.name = "obj{}".format(i)
+        obj.additional_properties.Pack(wrappers_pb2.FloatValue(value=value))
+    return out
+
+
+def request(source, model_name="model", min_confidence=0.5):
+    out = network_compute_bridge_pb2.NetworkComputeRequest()
+    out.input_data.model_name = model_name
+    out.input_data.min_confidence = min_confidence
+    out.input_data.image_source_and_service.image_source = source
+    return out
+
+
+def done(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+class FakeImageClient:
+    def __init__(self, complete=True):
+        self.complete = complete
+        self.calls = []
+
+    def get_image_from_sources_async(self, sources):
+        self.calls.append(list(sources))
+        if not self.complete:
+            return concurrent.futures.Future()
+
+        image_responses = []
+        for source in sources:
+            image_response = image_pb2.ImageResponse()
+            image_response.source.name = source
+            image_response.shot.image.data = source.encode()
+            image_responses.append(image_response)
+        return done(image_responses)
+
+
+def test_latest_results_keep_the_latest_frame():
+    results = LatestResults(["front"], "model", 0.5)
+    results.put("front", response(0.9), sequence=2)
+    results.put("front", response(0.8), sequence=1)
+
+    assert "front" in results and "back" not in results
+    assert results.get("front") == response(0.9)
+
+
+def test_get_waits_for_a_fresh_result():
+    results = LatestResults(["front"], "model", 0.5, max_age=TIMEOUT)
+    timer = threading.Timer(0.05, results.put, ("front", response(0.9)))
+    timer.start()
+
+    assert results.get("front") == response(0.9)
+    timer.join()
+
+
+def test_stale_results_are_not_used():
+    results = LatestResults(["front"], "model", 0.5, max_age=0.05)
+    results.put("front", response(0.9))
+    time.sleep(0.1)
+
+    assert results.get("front") is None
+
+
+def test_answer_filters_by_the_confidence_of_the_request():
+    results = LatestResults(["front"], "model", 0.5)
+    results.put("front", response(0.9, 0.6))
+
+    assert results.answer(request("front", min_confidence=0.3)) == response(0.9, 0.6)
+    assert results.answer(request("front", min_confidence=0.7)) == response(0.9)
+    assert len(results.get("front").object_in_image) == 2
+
+
+def test_answer_rejects_other_models():
+    results = LatestResults(["front"], "model", 0.5)
+    results.put("front", response(0.9))
+
+    out = results.answer(request("front", model_name="other"))
+
+    assert out.header.error.code == header_pb2.CommonError.CODE_INVALID_REQUEST
+
+
+def test_answer_without_a_recent_result():
+    results = LatestResults(["front"], "model", 0.5, max_age=0.01)
+
+    out = results.answer(request("front"))
+
+    assert out.header.error.code == header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR
+
+
+def test_puller_runs_captured_frames_through_the_bridge():
+    results = LatestResults(["front", "back"], "model", 0.25, max_age=TIMEOUT)
+    submitted = []
+
+    def submit(request):
+        submitted.append(request)
+        return done((response(0.9), {}))
+
+    puller = CameraPuller(FakeImageClient(), results, submit, rate=100)
+    puller.start()
+    try:
+        assert results.get("front") == response(0.9)
+        assert results.get("back") == response(0.9)
+    finally:
+        puller.stop()
+
+    assert submitted[0].input_data.model_name == "model"
+    assert submitted[0].input_data.min_confidence == 0.25
+    assert {r.input_data.image.data for r in submitted} >= {b"front", b"back"}
+
+
+def test_puller_limits_the_frames_in_flight_per_source():
+    image_client = FakeImageClient(complete=False)
+    puller = CameraPuller(
+        image_client, LatestResults(["front"], "model", 0.5), None, rate=200
+    )
+    puller.start()
+    time.sleep(0.2)
+    puller.stop()
+
+    assert image_client.calls == [["front"]] * FRAMES_IN_FLIGHT
+
+
+def test_failed_inference_is_not_stored():
+    results = LatestResults(["front"], "model", 0.5, max_age=0.2)
+    submitted = threading.Event()
+
+    def submit(request):
+        submitted.set()
+        failed = response()
+        failed.header.error.code = header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR
+        return done((failed, {}))
+
+    puller = CameraPuller(FakeImageClient(), results, submit, rate=100)
+    puller.start()
+    try:
+        assert submitted.wait(TIMEOUT)
+        assert results.get("front") is None
+    finally:
+        puller.stop()
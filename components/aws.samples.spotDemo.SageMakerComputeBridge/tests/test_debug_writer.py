@@ -0,0 +1,94 @@
+import threading
+
+import cv2
+import numpy as np
+
+import postprocessing
+from debug_writer import DebugImageWriter
+
+NO_DETECTIONS = postprocessing.Detections(
+    boxes=np.zeros((0, 4), dtype=np.int32),
+    scores=np.zeros(0, dtype=np.float32),
+    labels=np.zeros(0, dtype=object),
+)
+
+
+def frame(value):
+    return np.full((16, 16, 3), value, dtype=np.uint8)
+
+
+def test_images_are_written_to_a_ring_of_files(tmp_path):
+    writer = DebugImageWriter(str(tmp_path / "debug"), queue_size=10, ring_size=2)
+
+    for value in (10, 20, 30):
+        writer.submit(frame(value), NO_DETECTIONS)
+    writer.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "debug_0.jpg",
+        "debug_1.jpg",
+    ]
+    # The third image went to the first file again.
+    assert abs(int(cv2.imread(str(tmp_path / "debug_0.jpg")).mean()) - 30) <= 2
+
+
+def test_a_ring_of_one_writes_a_single_file(tmp_path):
+    writer = DebugImageWriter(str(tmp_path / "debug"))
+
+    writer.submit(frame(0), NO_DETECTIONS)
+    writer.close()
+
+    assert [path.name for path in tmp_path.iterdir()] == ["debug.jpg"]
+
+
+def test_only_every_nth_frame_is_kept(tmp_path, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(
+        postprocessing, "draw_detections", lambda image, _: drawn.append(image[0, 0, 0])
+    )
+    writer = DebugImageWriter(str(tmp_path / "debug"), every_n=3, queue_size=10)
+
+    for value in range(7):
+        writer.submit(frame(value), NO_DETECTIONS)
+    writer.close()
+
+    assert drawn == [0, 3, 6]
+
+
+def test_the_oldest_frame_is_dropped_when_the_queue_is_full(tmp_path, monkeypatch):
+    busy = threading.Event()
+    release = threading.Event()
+    drawn = []
+
+    def draw_detections(image, _):
+        busy.set()
+        release.wait(5)
+        drawn.append(image[0, 0, 0])
+
+    monkeypatch.setattr(postprocessing, "draw_detections", draw_detections)
+    writer = DebugImageWriter(str(tmp_path / "debug"), queue_size=2)
+
+    writer.submit(frame(0), NO_DETECTIONS)
+    assert busy.wait(5)
+    for value in (1, 2, 3):
+        writer.submit(frame(value), NO_DETECTIONS)
+    release.set()
+    writer.close()
+
+    assert writer.dropped == 1
+    assert drawn == [0, 2, 3]
+
+
+def test_submitted_frames_are_copied(tmp_path, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(
+        postprocessing, "draw_detections", lambda image, _: drawn.append(image[0, 0, 0])
+    )
+    writer = DebugImageWriter(str(tmp_path / "debug"), queue_size=10)
+    buffer = frame(5)
+
+    writer.submit(buffer, NO_DETECTIONS)
+    buffer[...] = 9
+    writer.close()
+
+    assert drawn == [5]
@@ -0,0 +1,136 @@
+import functools
+import multiprocessing
+
+import pytest
+from bosdyn.api import network_compute_bridge_pb2
+
+from compute_server import WorkItem, detach_image
+from frame_transport import SharedFrameRing
+from inference_pool import InferencePool
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(num_slots, slot_size):
+        ring = SharedFrameRing(num_slots, slot_size)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.close(unlink=True)
+
+
+def work_item(data):
+    request = network_compute_bridge_pb2.NetworkComputeRequest()
+    request.input_data.image.data = data
+    return WorkItem(request, None, None, None, 0.0, None)
+
+
+def read_frames(worker_id, request_queue, response_queue, frame_ring):
+    """Answers every WorkItem with whether its image came through the ring, and the
+    image data."""
+
+    while True:
+        item = request_queue.get()
+        if item is None:
+            return
+        request_id, work_item = item
+        if work_item.descriptor is None:
+            response = (False, work_item.request.input_data.image.data)
+        else:
+            response = (True, bytes(frame_ring.view(work_item.descriptor)))
+            frame_ring.release(work_item.descriptor)
+        response_queue.put((request_id, response))
+
+
+def test_frames_are_read_back_from_their_slot(make_ring):
+    ring = make_ring(2, 16)
+
+    first = ring.put(b"first")
+    second = ring.put(b"second frame")
+
+    assert first.slot != second.slot
+    assert bytes(ring.view(first)) == b"first"
+    assert bytes(ring.view(second)) == b"second frame"
+
+
+def test_frames_larger_than_a_slot_are_not_taken(make_ring):
+    ring = make_ring(2, 4)
+
+    assert ring.put(b"12345") is None
+    assert ring.put(b"1234") is not None
+
+
+def test_slots_are_reused_once_released(make_ring):
+    ring = make_ring(1, 16)
+    descriptor = ring.put(b"a")
+
+    assert ring.put(b"b") is None
+    ring.release(descriptor)
+    assert bytes(ring.view(ring.put(b"c"))) == b"c"
+
+
+def test_worker_processes_read_the_frames(make_ring):
+    ring = make_ring(1, 16)
+    descriptor = ring.put(b"shared")
+    request_queue, response_queue = multiprocessing.Queue(), multiprocessing.Queue()
+    worker = multiprocessing.Process(
+        target=read_frames, args=(0, request_queue, response_queue, ring)
+    )
+    worker.start()
+
+    request_queue.put((0, work_item(b"")._replace(descriptor=descriptor)))
+    request_queue.put(None)
+
+    assert response_queue.get(timeout=TIMEOUT) == (0, (True, b"shared"))
+    worker.join(TIMEOUT)
+    assert ring.put(b"free again") is not None
+
+
+def test_detach_image_moves_the_image_into_the_ring(make_ring):
+    ring = make_ring(1, 16)
+
+    item = detach_image(work_item(b"pixels"), ring)
+
+    assert item.descriptor is not None
+    assert item.request.input_data.image.data == b""
+    assert bytes(ring.view(item.descriptor)) == b"pixels"
+
+
+def test_detach_image_keeps_the_image_inline_without_a_free_slot(make_ring):
+    ring = make_ring(1, 16)
+    ring.put(b"taken")
+
+    item = detach_image(work_item(b"pixels"), ring)
+
+    assert item.descriptor is None
+    assert item.request.input_data.image.data == b"pixels"
+
+
+def test_a_ring_as_large_as_the_window_never_runs_out(make_ring):
+    # Many more frames are submitted than there are slots: they only take one once
+    # they are handed to a worker.
+    window = 3
+    ring = make_ring(window, 64)
+    pool = InferencePool(
+        read_frames,
+        args=(ring,),
+        num_workers=2,
+        window=window,
+        prepare=functools.partial(detach_image, frame_ring=ring),
+    )
+    pool.start()
+    try:
+        futures = [
+            pool.submit(work_item("frame {}".format(i).encode())) for i in range(40)
+        ]
+        responses = [future.result(TIMEOUT) for future in futures]
+    finally:
+        pool.stop()
+
+    assert responses == [(True, "frame {}".format(i).encode()) for i in range(40)]
@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import pytest
+from bosdyn.api import image_pb2
+
+from image_decoding import ImageDecodeError, decode_image
+
+
+def raw_image(pixels, pixel_format):
+    image = image_pb2.Image()
+    image.format = image_pb2.Image.FORMAT_RAW
+    image.pixel_format = pixel_format
+    image.rows, image.cols = pixels.shape[:2]
+    image.data = pixels.tobytes()
+    return image
+
+
+def jpeg_image(height, width, set_size=True):
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, : width // 2] = 200
+    image = image_pb2.Image()
+    image.format = image_pb2.Image.FORMAT_JPEG
+    if set_size:
+        image.rows, image.cols = height, width
+    image.data = cv2.imencode(".jpg", pixels)[1].tobytes()
+    return image
+
+
+def test_raw_rgb_images_are_viewed_in_place():
+    pixels = np.arange(4 * 6 * 3, dtype=np.uint8).reshape((4, 6, 3))
+    data = bytearray(pixels.tobytes())
+    image = raw_image(pixels, image_pb2.Image.PIXEL_FORMAT_RGB_U8)
+
+    frame = decode_image(image, data=data)
+
+    np.testing.assert_array_equal(frame, pixels)
+    data[0] = 255
+    assert frame[0, 0, 0] == 255
+
+
+def test_raw_greyscale_and_rgba_images_are_converted_to_rgb():
+    grey = np.full((4, 6), 7, dtype=np.uint8)
+    rgba = np.full((4, 6, 4), (1, 2, 3, 4), dtype=np.uint8)
+
+    from_grey = decode_image(raw_image(grey, image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8))
+    from_rgba = decode_image(raw_image(rgba, image_pb2.Image.PIXEL_FORMAT_RGBA_U8))
+
+    assert from_grey.shape == (4, 6, 3) and (from_grey == 7).all()
+    assert from_rgba.shape == (4, 6, 3) and (from_rgba == (1, 2, 3)).all()
+
+
+@pytest.mark.parametrize(
+    "rows, cols, data",
+    [(4, 6, b"\0" * 10), (0, 6, b""), (4, 0, b""), (0, 0, b"")],
+)
+def test_raw_images_of_the_wrong_size_are_rejected(rows, cols, data):
+    image = image_pb2.Image(
+        format=image_pb2.Image.FORMAT_RAW,
+        pixel_format=image_pb2.Image.PIXEL_FORMAT_RGB_U8,
+        rows=rows,
+        cols=cols,
+        data=data,
+    )
+
+    with pytest.raises(ImageDecodeError):
+        decode_image(image)
+
+
+def test_unsupported_formats_are_rejected():
+    with pytest.raises(ImageDecodeError):
+        decode_image(
+            image_pb2.Image(
+                format=image_pb2.Image.FORMAT_RAW,
+                pixel_format=image_pb2.Image.PIXEL_FORMAT_DEPTH_U16,
+                rows=1,
+                cols=1,
+                data=b"\0\0",
+            )
+        )
+    with pytest.raises(ImageDecodeError):
+        decode_image(image_pb2.Image(format=image_pb2.Image.FORMAT_UNKNOWN))
+
+
+def test_jpeg_images_are_decoded_at_the_smallest_size_above_the_minimum():
+    image = jpeg_image(1080, 1920)
+
+    assert decode_image(image).shape == (135, 240, 3)
+    assert decode_image(image, 512, 384).shape == (540, 960, 3)
+    assert decode_image(image, 1920, 1080).shape == (1080, 1920, 3)
+
+
+def test_jpeg_images_without_a_size_are_decoded_in_full():
+    assert decode_image(jpeg_image(64, 128, set_size=False), 16, 16).shape == (
+        64,
+        128,
+        3,
+    )
+
+
+def test_corrupt_jpeg_images_are_rejected():
+    image = image_pb2.Image(format=image_pb2.Image.FORMAT_JPEG, data=b"not a jpeg")
+
+    with pytest.raises(ImageDecodeError):
+        decode_image(image)
@@ -0,0 +1,111 @@
+import multiprocessing
+import time
+
+import pytest
+
+from inference_pool import InferencePool, PoolFull
+
+TIMEOUT = 10
+
+
+def echo_worker(worker_id, request_queue, response_queue, gate=None):
+    """Answers every request with (worker_id, request), once gate is set if given."""
+
+    while True:
+        item = request_queue.get()
+        if item is None:
+            return
+        if gate is not None:
+            gate.wait(TIMEOUT)
+        request_id, request = item
+        response_queue.put((request_id, (worker_id, request)))
+
+
+@pytest.fixture
+def start_pool():
+    pools = []
+
+    def start(*args, **kwargs):
+        pool = InferencePool(echo_worker, *args, **kwargs)
+        pool.start()
+        pools.append(pool)
+        return pool
+
+    yield start
+    for pool in pools:
+        pool.stop()
+
+
+def test_responses_reach_their_callers(start_pool):
+    pool = start_pool(num_workers=3)
+
+    futures = {i: pool.submit("request {}".format(i)) for i in range(50)}
+
+    for i, future in futures.items():
+        worker_id, request = future.result(TIMEOUT)
+        assert request == "request {}".format(i)
+        assert 0 <= worker_id < 3
+    assert pool.pending_count() == 0
+
+
+def test_rejects_requests_beyond_max_pending(start_pool):
+    gate = multiprocessing.Event()
+    pool = start_pool(args=(gate,), max_pending=2)
+
+    first = pool.submit("a")
+    second = pool.submit("b")
+    with pytest.raises(PoolFull):
+        pool.submit("c")
+    assert pool.rejected == 1
+
+    gate.set()
+    assert first.result(TIMEOUT)[1] == "a"
+    assert second.result(TIMEOUT)[1] == "b"
+    assert pool.submit("d").result(TIMEOUT)[1] == "d"
+
+
+def test_higher_priority_requests_overtake_waiting_ones(start_pool):
+    gate = multiprocessing.Event()
+    pool = start_pool(args=(gate,), window=1)
+
+    # The first request occupies the window, the others wait in the pool.
+    futures = [pool.submit("batch 0", priority=1)]
+    time.sleep(0.2)
+    futures += [pool.submit("batch {}".format(i), priority=1) for i in (1, 2)]
+    futures.append(pool.submit("interactive", priority=0))
+
+    finished = []
+    for future in futures:
+        future.add_done_callback(lambda future: finished.append(future.result()[1]))
+    gate.set()
+    for future in futures:
+        future.result(TIMEOUT)
+
+    assert finished == ["batch 0", "interactive", "batch 1", "batch 2"]
+
+
+def test_prepare_runs_before_requests_are_handed_over(start_pool):
+    pool = start_pool(prepare=lambda request: request.upper())
+
+    assert pool.submit("frame").result(TIMEOUT)[1] == "FRAME"
+
+
+def test_failed_prepare_sends_the_request_as_it_is(start_pool):
+    def prepare(request):
+        raise RuntimeError("no slot")
+
+    pool = start_pool(prepare=prepare)
+
+    assert pool.submit("frame").result(TIMEOUT)[1] == "frame"
+
+
+def test_cancelled_futures_do_not_stop_the_dispatcher(start_pool):
+    gate = multiprocessing.Event()
+    pool = start_pool(args=(gate,))
+
+    cancelled = pool.submit("abandoned")
+    assert cancelled.cancel()
+    gate.set()
+
+    assert pool.submit("next").result(TIMEOUT)[1] == "next"
+    assert pool.pending_count() == 0
@@ -0,0 +1,106 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+from bosdyn.api import header_pb2, network_compute_bridge_pb2
+
+from metrics import BridgeMetrics, Histogram, MetricsRegistry, MetricsServer
+
+
+def response(code=header_pb2.CommonError.CODE_OK):
+    out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+    out_proto.header.error.code = code
+    return out_proto
+
+
+def test_histogram_counts_values_in_the_bucket_of_their_upper_bound():
+    histogram = Histogram(buckets=(1, 2))
+
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == 6
+
+
+def test_render_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.inc("requests_total", (("model", "a"),))
+    registry.inc("requests_total", (("model", "a"),), value=2)
+    registry.counter("rejected_total", lambda: 5)
+    registry.gauge("queue_depth", lambda: 7)
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# TYPE requests_total counter",
+        'requests_total{model="a"} 3.0',
+        "# TYPE rejected_total counter",
+        "rejected_total 5",
+        "# TYPE queue_depth gauge",
+        "queue_depth 7",
+    ]
+
+
+def test_render_histograms_with_cumulative_buckets():
+    registry = MetricsRegistry()
+    for value in (0.001, 0.3, 10):
+        registry.observe("latency_seconds", value, (("stage", "infer"),))
+
+    lines = registry.render().splitlines()
+
+    assert lines[0] == "# TYPE latency_seconds histogram"
+    assert 'latency_seconds_bucket{stage="infer",le="0.001"} 1' in lines
+    assert 'latency_seconds_bucket{stage="infer",le="0.25"} 1' in lines
+    assert 'latency_seconds_bucket{stage="infer",le="0.5"} 2' in lines
+    assert 'latency_seconds_bucket{stage="infer",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{stage="infer"} 3' in lines
+
+
+def test_snapshot_is_json_serializable():
+    registry = MetricsRegistry()
+    registry.inc("requests_total")
+    registry.observe("latency_seconds", 0.5)
+    registry.counter("rejected_total", lambda: 1)
+    registry.gauge("queue_depth", lambda: 2)
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+
+    assert snapshot == {
+        "counters": {"requests_total": 1, "rejected_total": 1},
+        "histograms": {"latency_seconds": {"count": 1, "sum": 0.5}},
+        "gauges": {"queue_depth": 2},
+    }
+
+
+def test_bridge_metrics_count_errors_by_code():
+    metrics = BridgeMetrics()
+
+    metrics.observe_request("a", response(), 0.1, {"inference": 0.05})
+    metrics.observe_request(
+        "a", response(header_pb2.CommonError.CODE_INVALID_REQUEST), 0.1, {}
+    )
+
+    counters = metrics.snapshot()["counters"]
+    assert counters['ncb_requests_total{model="a"}'] == 2
+    assert counters['ncb_errors_total{code="CODE_INVALID_REQUEST",model="a"}'] == 1
+    assert len([name for name in counters if name.startswith("ncb_errors")]) == 1
+    histograms = metrics.snapshot()["histograms"]
+    assert histograms['ncb_stage_seconds{stage="inference"}']["count"] == 1
+
+
+def test_metrics_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.inc("requests_total")
+    server = MetricsServer(registry, 0)
+    server.start()
+    url = "http://127.0.0.1:{}".format(server._server.server_port)
+    try:
+        with urllib.request.urlopen(url + "/metrics", timeout=5) as reply:
+            assert reply.read().decode() == registry.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other", timeout=5)
+    finally:
+        server.stop()
@@ -0,0 +1,212 @@
+import collections
+import json
+import threading
+import time
+
+import pytest
+
+from model_manager import ModelInfo, ModelLoadError, ModelManager, discover_models
+
+CLASSES = ["person", "dog"]
+
+
+class FakeRegistry:
+    """ModelRegistry stand-in whose loads can be held until released."""
+
+    def __init__(self, input_shapes=None):
+        self.loaded = set()
+        self.calls = []
+        self.input_shapes = input_shapes or {}
+        self.failing = set()
+        self.gates = {}
+
+    def load_model(self, name, path):
+        self.calls.append(("load", name))
+        if name in self.gates:
+            self.gates[name].wait(5)
+        if name in self.failing:
+            raise RuntimeError("cannot load " + name)
+        self.loaded.add(name)
+
+    def unload_model(self, name):
+        self.calls.append(("unload", name))
+        self.loaded.discard(name)
+
+    def tensors(self, name):
+        shape = self.input_shapes.get(name)
+        if shape is None:
+            return None
+        Tensor = collections.namedtuple("Tensor", ["shape"])
+        return {"inputs": [Tensor(shape)], "outputs": []}
+
+    def __contains__(self, name):
+        return name in self.loaded
+
+
+def make_models(*names, size=10):
+    return collections.OrderedDict(
+        (name, ModelInfo(name, "/models/" + name, CLASSES, 512, size)) for name in names
+    )
+
+
+def write_model(path, files=("model.params",), metadata=None):
+    path.mkdir(parents=True)
+    for f in files:
+        (path / f).write_bytes(b"0123456789")
+    if metadata is not None:
+        (path / "model.json").write_text(json.dumps(metadata))
+
+
+def test_a_directory_holding_a_model_is_a_single_model(tmp_path):
+    write_model(tmp_path / "ssd")
+
+    models = discover_models([str(tmp_path / "ssd")], ".params", "default", CLASSES, 512)
+
+    assert list(models) == ["default"]
+    assert models["default"].labels.tolist() == CLASSES
+    assert models["default"].size_bytes == 10
+
+
+def test_every_subdirectory_holding_a_model_is_a_model(tmp_path):
+    write_model(tmp_path / "b")
+    write_model(tmp_path / "a", metadata={"name": "valves", "input_size": 300})
+    write_model(tmp_path / "empty", files=("readme.txt",))
+
+    models = discover_models([str(tmp_path)], ".params", "default", CLASSES, 512)
+
+    assert list(models) == ["valves", "b"]
+    assert models["valves"].input_size == 300
+    assert models["b"].input_size == 512
+
+
+def test_models_can_be_named_and_read_labels_from_csv(tmp_path):
+    write_model(tmp_path / "ssd")
+    (tmp_path / "ssd" / "labels.csv").write_text("gauge,1\nvalve,0\n")
+
+    models = discover_models(
+        ["doors=" + str(tmp_path / "ssd")], ".params", "default", CLASSES, 512
+    )
+
+    assert models["doors"].labels.tolist() == ["valve", "gauge"]
+
+
+def test_duplicate_model_names_are_rejected(tmp_path):
+    write_model(tmp_path / "a")
+    write_model(tmp_path / "b")
+
+    with pytest.raises(ValueError):
+        discover_models(
+            [str(tmp_path / "a"), str(tmp_path / "b")], ".params", "ssd", CLASSES, 512
+        )
+
+
+def test_models_are_loaded_on_demand():
+    registry = FakeRegistry(input_shapes={"a": [1, 3, 300, 300]})
+    manager = ModelManager(registry, make_models("a", "b"))
+
+    info = manager.acquire("a")
+    manager.release("a")
+    manager.acquire("a")
+    manager.release("a")
+
+    assert info.input_size == 300
+    assert registry.calls == [("load", "a")]
+
+
+def test_models_lost_by_the_agent_are_reloaded():
+    registry = FakeRegistry()
+    manager = ModelManager(registry, make_models("a"))
+    manager.acquire("a")
+    manager.release("a")
+
+    registry.loaded.clear()
+    manager.acquire("a")
+
+    assert registry.calls == [("load", "a"), ("load", "a")]
+
+
+def test_least_recently_used_idle_models_are_evicted():
+    registry = FakeRegistry()
+    manager = ModelManager(registry, make_models("a", "b", "c"), memory_budget=20)
+    for name in ("a", "b", "a", "c"):
+        manager.acquire(name)
+        manager.release(name)
+
+    assert registry.loaded == {"a", "c"}
+    assert ("unload", "b") in registry.calls
+
+
+def test_models_in_use_are_not_evicted():
+    registry = FakeRegistry()
+    manager = ModelManager(registry, make_models("a", "b"), memory_budget=10)
+    manager.acquire("a")
+
+    manager.acquire("b")
+
+    assert registry.loaded == {"a", "b"}
+    assert ("unload", "a") not in registry.calls
+
+
+def test_preload_fills_the_budget_in_order():
+    registry = FakeRegistry()
+    registry.loaded.add("b")
+    manager = ModelManager(registry, make_models("a", "b", "c"), memory_budget=20)
+
+    manager.preload()
+
+    assert registry.calls[0] == ("unload", "b")
+    assert registry.loaded == {"a", "b"}
+
+
+def test_loaded_models_are_served_while_another_model_loads():
+    registry = FakeRegistry()
+    manager = ModelManager(registry, make_models("a", "b"))
+    manager.acquire("a")
+    manager.release("a")
+    registry.gates["b"] = threading.Event()
+    loading = threading.Thread(target=manager.acquire, args=("b",))
+    loading.start()
+    while ("load", "b") not in registry.calls:
+        time.sleep(0.001)
+
+    try:
+        manager.acquire("a")
+        manager.release("a")
+        assert loading.is_alive()
+    finally:
+        registry.gates["b"].set()
+        loading.join(5)
+
+
+def test_concurrent_requests_share_one_load():
+    registry = FakeRegistry()
+    manager = ModelManager(registry, make_models("a"))
+    registry.gates["a"] = threading.Event()
+    threads = [threading.Thread(target=manager.acquire, args=("a",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    registry.gates["a"].set()
+    for thread in threads:
+        thread.join(5)
+
+    assert registry.calls == [("load", "a")]
+
+
+def test_failed_loads_are_not_retried_before_the_retry_interval(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("model_manager.time.monotonic", lambda: now[0])
+    registry = FakeRegistry()
+    registry.failing.add("a")
+    manager = ModelManager(registry, make_models("a"), retry_interval=30)
+
+    with pytest.raises(RuntimeError):
+        manager.acquire("a")
+    with pytest.raises(ModelLoadError):
+        manager.acquire("a")
+    assert registry.calls == [("load", "a")]
+
+    now[0] += 31
+    registry.failing.clear()
+    manager.acquire("a")
+    assert registry.calls == [("load", "a"), ("load", "a")]
@@ -0,0 +1,64 @@
+import threading
+
+from model_registry import ModelRegistry
+
+
+class FakeEdgeManagerClient:
+    """Keeps the models "loaded in the agent" in a dict and counts ListModels calls."""
+
+    def __init__(self, models=None):
+        self.models = dict(models or {})
+        self.list_calls = 0
+        self.listed = threading.Event()
+
+    def list_model_tensors(self):
+        self.list_calls += 1
+        self.listed.set()
+        return dict(self.models)
+
+    def load_model(self, name, path):
+        self.models[name] = {"inputs": [], "outputs": [], "path": path}
+
+    def unload_model(self, name):
+        del self.models[name]
+
+
+def test_lookups_do_not_call_the_agent():
+    client = FakeEdgeManagerClient({"ssd": {"inputs": [1], "outputs": [2]}})
+    registry = ModelRegistry(client, refresh_interval=0)
+    registry.start()
+
+    for _ in range(10):
+        assert "ssd" in registry
+        assert "other" not in registry
+        assert registry.names() == ["ssd"]
+        assert registry.tensors("ssd") == {"inputs": [1], "outputs": [2]}
+    assert registry.tensors("other") is None
+    assert client.list_calls == 1
+
+
+def test_loading_and_unloading_refresh_the_cache():
+    client = FakeEdgeManagerClient()
+    registry = ModelRegistry(client, refresh_interval=0)
+    registry.start()
+
+    registry.load_model("ssd", "/models/ssd")
+    assert "ssd" in registry
+    registry.unload_model("ssd")
+    assert "ssd" not in registry
+
+
+def test_models_changed_by_other_clients_are_picked_up_periodically():
+    client = FakeEdgeManagerClient()
+    registry = ModelRegistry(client, refresh_interval=0.01)
+    registry.start()
+    try:
+        client.models["ssd"] = {"inputs": [], "outputs": []}
+        client.listed.clear()
+        assert client.listed.wait(5)
+        client.listed.clear()
+        assert client.listed.wait(5)
+
+        assert "ssd" in registry
+    finally:
+        registry.stop()
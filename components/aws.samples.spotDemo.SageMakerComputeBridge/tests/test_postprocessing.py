@@ -0,0 +1,189 @@
+import numpy as np
+from bosdyn.api import header_pb2
+from bosdyn.api import network_compute_bridge_pb2
+from google.protobuf import wrappers_pb2
+
+from postprocessing import (
+    Detections,
+    add_world_objects,
+    batched_nms,
+    decode_detections,
+    detections_from_response,
+    error_response,
+    select_detections,
+)
+from preprocessing import scaling
+
+LABELS = np.array(["person", "dog", "cat"])
+IDENTITY = scaling(1.0, 1.0)
+
+
+def prediction(rows):
+    """(boxes, scores, classes) arrays of rows of (x1, y1, x2, y2, score, class)."""
+
+    rows = np.array(rows, dtype=np.float32).reshape((-1, 6))
+    return rows[:, :4], rows[:, 4], rows[:, 5]
+
+
+def test_detections_below_the_confidence_threshold_are_dropped():
+    detections = decode_detections(
+        prediction([[0, 0, 10, 10, 0.9, 0], [0, 0, 10, 10, 0.4, 1]]),
+        0.5,
+        IDENTITY,
+        LABELS,
+    )
+
+    assert detections.labels.tolist() == ["person"]
+    assert detections.scores.tolist() == [np.float32(0.9)]
+
+
+def test_empty_and_unknown_classes_are_dropped():
+    detections = decode_detections(
+        prediction([[0, 0, 1, 1, 0.9, -1], [0, 0, 1, 1, 0.9, 3], [0, 0, 1, 1, 0.9, 2]]),
+        0.5,
+        IDENTITY,
+        LABELS,
+    )
+
+    assert detections.labels.tolist() == ["cat"]
+
+
+def test_boxes_are_mapped_to_integer_image_pixels():
+    detections = decode_detections(
+        prediction([[10, 20, 30.9, 40, 0.9, 0]]), 0.5, scaling(2.0, 0.5), LABELS
+    )
+
+    assert detections.boxes.dtype == np.int32
+    assert detections.boxes.tolist() == [[20, 10, 61, 20]]
+
+
+def test_no_detections():
+    detections = decode_detections(prediction([]), 0.5, IDENTITY, LABELS)
+
+    assert detections.boxes.shape == (0, 4)
+    assert len(detections.labels) == 0
+
+
+def test_world_objects_are_numbered_per_frame():
+    out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+    detections = Detections(
+        boxes=np.array([[1, 2, 3, 4], [5, 6, 7, 8]], dtype=np.int32),
+        scores=np.array([0.9, 0.8], dtype=np.float32),
+        labels=np.array(["dog", "cat"]),
+    )
+
+    add_world_objects(out_proto, detections)
+
+    assert [obj.name for obj in out_proto.object_in_image] == [
+        "obj1_label_dog",
+        "obj2_label_cat",
+    ]
+    vertexes = out_proto.object_in_image[0].image_properties.coordinates.vertexes
+    assert [(v.x, v.y) for v in vertexes] == [(1, 2), (3, 2), (3, 4), (1, 4)]
+    confidence = wrappers_pb2.FloatValue()
+    assert out_proto.object_in_image[1].additional_properties.Unpack(confidence)
+    assert confidence.value == np.float32(0.8)
+
+
+def test_world_objects_are_named_after_their_tracks():
+    out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+    detections = Detections(
+        boxes=np.array([[1, 2, 3, 4]], dtype=np.int32),
+        scores=np.array([0.9], dtype=np.float32),
+        labels=np.array(["dog"]),
+    )
+
+    add_world_objects(out_proto, detections, track_ids=[7])
+
+    assert out_proto.object_in_image[0].name == "track7_label_dog"
+
+
+def test_detections_are_read_back_from_a_response():
+    out_proto = network_compute_bridge_pb2.NetworkComputeResponse()
+    detections = Detections(
+        boxes=np.array([[1, 2, 3, 4], [5, 6, 7, 8]], dtype=np.int32),
+        scores=np.array([0.9, 0.8], dtype=np.float32),
+        labels=np.array(["dog", "cat_label_x"]),
+    )
+    add_world_objects(out_proto, detections)
+
+    read = detections_from_response(out_proto)
+
+    assert read.boxes.tolist() == detections.boxes.tolist()
+    np.testing.assert_allclose(read.scores, detections.scores)
+    assert read.labels.tolist() == ["dog", "cat_label_x"]
+
+
+def test_error_response():
+    out_proto = error_response(
+        header_pb2.CommonError.CODE_INVALID_REQUEST, "Error: bad request."
+    )
+
+    assert out_proto.header.error.code == header_pb2.CommonError.CODE_INVALID_REQUEST
+    assert out_proto.header.error.message == "Error: bad request."
+    assert len(out_proto.object_in_image) == 0
+
+
+def test_nms_suppresses_overlapping_boxes_of_the_same_class():
+    boxes, scores, classes = prediction(
+        [[0, 0, 10, 10, 0.8, 0], [1, 1, 11, 11, 0.9, 0], [20, 20, 30, 30, 0.7, 0]]
+    )
+
+    assert batched_nms(boxes, scores, classes, 0.5).tolist() == [1, 2]
+
+
+def test_nms_keeps_overlapping_boxes_of_other_classes():
+    boxes, scores, classes = prediction([[0, 0, 10, 10, 0.8, 0], [0, 0, 10, 10, 0.9, 1]])
+
+    assert batched_nms(boxes, scores, classes, 0.5).tolist() == [1, 0]
+
+
+def test_nms_handles_negative_coordinates():
+    boxes, scores, classes = prediction(
+        [[-30, -30, -20, -20, 0.9, 0], [-29, -29, -19, -19, 0.8, 0], [-30, -30, -20, -20, 0.7, 1]]
+    )
+
+    assert batched_nms(boxes, scores, classes, 0.5).tolist() == [0, 2]
+
+
+def test_nms_of_no_boxes():
+    boxes, scores, classes = prediction([])
+
+    assert batched_nms(boxes, scores, classes, 0.5).tolist() == []
+
+
+def test_select_detections_does_nothing_by_default():
+    boxes, scores, classes = prediction([[0, 0, 10, 10, 0.8, 0]])
+
+    assert select_detections(boxes, scores, classes) is None
+
+
+def test_select_detections_limits_per_class_and_in_total():
+    boxes, scores, classes = prediction(
+        [
+            [0, 0, 1, 1, 0.5, 0],
+            [0, 0, 1, 1, 0.9, 0],
+            [0, 0, 1, 1, 0.7, 0],
+            [0, 0, 1, 1, 0.6, 1],
+            [0, 0, 1, 1, 0.8, 1],
+        ]
+    )
+
+    assert select_detections(boxes, scores, classes, per_class_top_k=1).tolist() == [1, 4]
+    assert select_detections(boxes, scores, classes, max_detections=2).tolist() == [1, 4]
+    assert select_detections(
+        boxes, scores, classes, per_class_top_k=2, max_detections=3
+    ).tolist() == [1, 4, 2]
+
+
+def test_decode_detections_applies_nms_in_image_pixels():
+    detections = decode_detections(
+        prediction([[0, 0, 10, 10, 0.8, 0], [1, 1, 11, 11, 0.9, 0]]),
+        0.5,
+        scaling(2.0, 2.0),
+        LABELS,
+        nms_iou_threshold=0.5,
+    )
+
+    assert detections.boxes.tolist() == [[2, 2, 22, 22]]
+    assert detections.scores.tolist() == [np.float32(0.9)]
@@ -0,0 +1,108 @@
+import numpy as np
+
+from preprocessing import MEAN, STD, LetterboxGeometry, Preprocessor
+
+
+def normalized(rgb):
+    return (np.array(rgb, dtype=np.float32) - MEAN) / STD
+
+
+def test_frames_are_resized_to_a_4_3_region_by_default():
+    preprocessor = Preprocessor(512)
+
+    for height, width in ((480, 640), (1080, 1920), (300, 300)):
+        assert preprocessor.geometry(height, width) == LetterboxGeometry(
+            resized_width=512, resized_height=384, pad_top=64, pad_left=0
+        )
+
+
+def test_keep_aspect_ratio_letterboxes_frames_at_their_own_aspect_ratio():
+    preprocessor = Preprocessor(512, keep_aspect_ratio=True)
+
+    assert preprocessor.geometry(480, 640) == LetterboxGeometry(512, 384, 64, 0)
+    assert preprocessor.geometry(1080, 1920) == LetterboxGeometry(512, 288, 112, 0)
+    assert preprocessor.geometry(1000, 500) == LetterboxGeometry(256, 512, 0, 128)
+
+
+def test_tiles_at_the_input_size_are_not_letterboxed():
+    preprocessor = Preprocessor(512)
+    tile = np.random.default_rng(0).integers(0, 256, (512, 512, 3), dtype=np.uint8)
+
+    assert preprocessor.geometry(512, 512) == LetterboxGeometry(512, 512, 0, 0)
+    np.testing.assert_allclose(
+        preprocessor(tile),
+        ((tile - MEAN) / STD).transpose((2, 0, 1)),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+
+
+def test_box_transform_maps_the_letterboxed_region_back_to_the_source():
+    for keep_aspect_ratio in (False, True):
+        preprocessor = Preprocessor(512, keep_aspect_ratio=keep_aspect_ratio)
+        geometry = preprocessor.geometry(1080, 1920)
+        region = np.array(
+            [
+                [
+                    geometry.pad_left,
+                    geometry.pad_top,
+                    geometry.pad_left + geometry.resized_width,
+                    geometry.pad_top + geometry.resized_height,
+                ]
+            ],
+            dtype=np.float32,
+        )
+
+        boxes = preprocessor.box_transform(1080, 1920).apply(region)
+
+        np.testing.assert_allclose(boxes, [[0, 0, 1920, 1080]], atol=1e-3)
+
+
+def test_box_transform_accounts_for_reduced_size_decoding():
+    preprocessor = Preprocessor(512)
+
+    full = preprocessor.box_transform(1080, 1920)
+    halved = preprocessor.box_transform(540, 960, 1080, 1920)
+
+    np.testing.assert_allclose(halved.scale, full.scale)
+    np.testing.assert_allclose(halved.offset, full.offset)
+
+
+def test_frames_are_normalized_with_black_padding():
+    preprocessor = Preprocessor(64)
+    frame = np.full((48, 64, 3), (10, 20, 30), dtype=np.uint8)
+
+    out = preprocessor(frame)
+
+    assert out.shape == (3, 64, 64)
+    np.testing.assert_allclose(out[:, 0, 0], normalized((0, 0, 0)), rtol=1e-5)
+    np.testing.assert_allclose(out[:, 32, 32], normalized((10, 20, 30)), rtol=1e-5)
+
+
+def test_padding_is_cleared_when_the_geometry_changes():
+    preprocessor = Preprocessor(64, keep_aspect_ratio=True)
+    white = np.full((48, 64, 3), 255, dtype=np.uint8)
+    preprocessor(white)
+
+    out = preprocessor(np.full((36, 64, 3), 255, dtype=np.uint8))
+
+    # The 16:9 frame has more padding than the 4:3 one before it.
+    geometry = preprocessor.geometry(36, 64)
+    np.testing.assert_allclose(out[:, 0, 0], normalized((0, 0, 0)), rtol=1e-5)
+    np.testing.assert_allclose(
+        out[:, geometry.pad_top - 1, 0], normalized((0, 0, 0)), rtol=1e-5
+    )
+    np.testing.assert_allclose(
+        out[:, geometry.pad_top, 0], normalized((255, 255, 255)), rtol=1e-5
+    )
+
+
+def test_batches_hold_one_input_per_frame():
+    preprocessor = Preprocessor(64)
+    frames = [np.full((48, 64, 3), value, dtype=np.uint8) for value in (0, 100, 200)]
+
+    batch = preprocessor.preprocess_batch(frames)
+
+    assert batch.shape == (3, 3, 64, 64)
+    for out, value in zip(batch, (0, 100, 200)):
+        np.testing.assert_allclose(out[:, 32, 32], normalized((value,) * 3), rtol=1e-5)
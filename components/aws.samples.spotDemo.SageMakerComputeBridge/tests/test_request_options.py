@@ -0,0 +1,70 @@
+import pytest
+from bosdyn.api import network_compute_bridge_pb2
+from google.protobuf import struct_pb2, wrappers_pb2
+
+from request_options import (
+    DEFAULT_OPTIONS,
+    InvalidRequestOptions,
+    parse_request_options,
+)
+
+
+def input_data(**params):
+    out = network_compute_bridge_pb2.NetworkComputeInputData()
+    struct = struct_pb2.Struct()
+    struct.update(params)
+    out.other_data.Pack(struct)
+    return out
+
+
+def test_requests_without_options_use_the_defaults():
+    defaults = DEFAULT_OPTIONS._replace(max_detections=5)
+
+    options = parse_request_options(
+        network_compute_bridge_pb2.NetworkComputeInputData(), defaults
+    )
+
+    assert options is defaults
+
+
+def test_options_override_the_defaults():
+    options = parse_request_options(
+        input_data(nms_iou_threshold=0.5, max_detections=20, tiling=True, stream="front"),
+        DEFAULT_OPTIONS._replace(per_class_top_k=3),
+    )
+
+    assert options == DEFAULT_OPTIONS._replace(
+        nms_iou_threshold=0.5,
+        per_class_top_k=3,
+        max_detections=20,
+        tiling=True,
+        stream="front",
+    )
+    assert isinstance(options.max_detections, int)
+
+
+def test_other_data_must_be_a_struct():
+    out = network_compute_bridge_pb2.NetworkComputeInputData()
+    out.other_data.Pack(wrappers_pb2.StringValue(value="x"))
+
+    with pytest.raises(InvalidRequestOptions, match="google.protobuf.Struct"):
+        parse_request_options(out)
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ({"nms": 0.5}, "unknown options: nms"),
+        ({"max_detections": 2.5}, "invalid options"),
+        ({"tiling": 1}, "invalid options"),
+        ({"stream": 3}, "invalid options"),
+        ({"nms_iou_threshold": "high"}, "invalid options"),
+        ({"nms_iou_threshold": 1.5}, "between 0 and 1"),
+        ({"per_class_top_k": -1}, "cannot be negative"),
+        ({"tile_overlap": -8}, "cannot be negative"),
+        ({"priority": "urgent"}, "priority must be one of"),
+    ],
+)
+def test_invalid_options_are_rejected(params, message):
+    with pytest.raises(InvalidRequestOptions, match=message):
+        parse_request_options(input_data(**params))
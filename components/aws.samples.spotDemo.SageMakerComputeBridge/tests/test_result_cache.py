@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+import pytest
+from bosdyn.api import header_pb2, image_pb2, network_compute_bridge_pb2
+
+import result_cache
+from result_cache import ResultCache, perceptual_hash
+
+
+def scene(noise=0, seed=0):
+    x = np.linspace(0, 255, 320)
+    y = np.linspace(0, 255, 240)[:, None]
+    frame = (np.sin(x / 20) * 60 + np.cos(y / 15) * 60 + 128).astype(np.int16)
+    frame = np.repeat(frame[:, :, None], 3, axis=2)
+    if noise:
+        rng = np.random.default_rng(seed)
+        frame = frame + rng.integers(-noise, noise + 1, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def request(frame, model_name="model", min_confidence=0.5):
+    out = network_compute_bridge_pb2.NetworkComputeRequest()
+    out.input_data.model_name = model_name
+    out.input_data.min_confidence = min_confidence
+    out.input_data.image.format = image_pb2.Image.FORMAT_JPEG
+    out.input_data.image.rows, out.input_data.image.cols = frame.shape[:2]
+    out.input_data.image.data = cv2.imencode(".jpg", frame)[1].tobytes()
+    return out
+
+
+def response(label="person", code=header_pb2.CommonError.CODE_OK):
+    out = network_compute_bridge_pb2.NetworkComputeResponse()
+    out.header.error.code = code
+    out.object_in_image.add().name = label
+    return out
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ResultCache(10, 1, mode="fuzzy")
+
+
+def test_exact_mode_matches_identical_requests_only(clock):
+    cache = ResultCache(10, 1)
+    cache.put(cache.key(request(scene())), response())
+
+    cached = cache.get(cache.key(request(scene())))
+
+    assert cached == response()
+    assert cache.get(cache.key(request(scene(noise=3)))) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cached_responses_are_copies(clock):
+    cache = ResultCache(10, 1)
+    key = cache.key(request(scene()))
+    cache.put(key, response())
+
+    cache.get(key).object_in_image[0].name = "changed"
+
+    assert cache.get(key) == response()
+
+
+def test_key_covers_the_request_parameters(clock):
+    cache = ResultCache(10, 1)
+    cache.put(cache.key(request(scene())), response())
+
+    assert cache.get(cache.key(request(scene(), model_name="other"))) is None
+    assert cache.get(cache.key(request(scene(), min_confidence=0.9))) is None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(10, 1)
+    key = cache.key(request(scene()))
+    cache.put(key, response())
+
+    clock[0] += 0.9
+    assert cache.get(key) is not None
+    clock[0] += 0.2
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResultCache(2, 1)
+    keys = [cache.key(request(scene(noise=5, seed=seed))) for seed in range(3)]
+    cache.put(keys[0], response("first"))
+    cache.put(keys[1], response("second"))
+    cache.get(keys[0])
+
+    cache.put(keys[2], response("third"))
+
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == response("first")
+
+
+def test_error_responses_are_not_cached(clock):
+    cache = ResultCache(10, 1)
+    key = cache.key(request(scene()))
+
+    cache.put(key, response(code=header_pb2.CommonError.CODE_INTERNAL_SERVER_ERROR))
+
+    assert len(cache) == 0
+
+
+def test_perceptual_mode_matches_noisy_frames_of_the_same_scene(clock):
+    cache = ResultCache(10, 1, mode="perceptual")
+    cache.put(cache.key(request(scene(noise=4, seed=1))), response())
+
+    assert cache.get(cache.key(request(scene(noise=4, seed=2)))) == response()
+    assert cache.get(cache.key(request(255 - scene()))) is None
+
+
+def test_perceptual_mode_skips_images_that_cannot_be_decoded():
+    cache = ResultCache(10, 1, mode="perceptual")
+    out = request(scene())
+    out.input_data.image.data = b"not a jpeg"
+
+    assert cache.key(out) is None
+
+
+def test_perceptual_hash_is_64_bits():
+    image = request(scene()).input_data.image
+
+    assert 0 <= perceptual_hash(image) < 2**64
+    assert perceptual_hash(image) == perceptual_hash(image)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from preprocessing import scaling
+from tiling import merge_predictions, tile_layout, tile_views
+
+
+def test_frames_smaller_than_a_tile_are_not_tiled():
+    assert tile_layout(300, 1000, 512, 64) is None
+    assert tile_layout(1000, 300, 512, 64) is None
+
+
+def test_a_frame_of_tile_size_is_a_single_tile():
+    assert tile_layout(512, 512, 512, 64).tolist() == [[0, 0]]
+
+
+def test_tiles_cover_the_frame_and_overlap():
+    layout = tile_layout(1080, 1920, 512, 64)
+
+    xs, ys = sorted(set(layout[:, 0].tolist())), sorted(set(layout[:, 1].tolist()))
+    assert len(layout) == len(xs) * len(ys)
+    assert xs[0] == 0 and xs[-1] == 1920 - 512
+    assert ys[0] == 0 and ys[-1] == 1080 - 512
+    assert all(512 - (b - a) >= 64 for a, b in zip(xs, xs[1:]))
+    assert all(512 - (b - a) >= 64 for a, b in zip(ys, ys[1:]))
+
+
+def test_layouts_are_cached_and_read_only():
+    layout = tile_layout(1080, 1920, 512, 64)
+
+    assert tile_layout(1080, 1920, 512, 64) is layout
+    with pytest.raises(ValueError):
+        layout[0, 0] = 1
+
+
+def test_overlap_is_clamped_below_the_tile_size():
+    assert tile_layout(600, 600, 512, 1000) is not None
+
+
+def test_tile_views_share_the_image_pixels():
+    image = np.arange(20 * 30 * 3, dtype=np.uint8).reshape((20, 30, 3))
+    layout = tile_layout(20, 30, 16, 4)
+
+    tiles = tile_views(image, layout, 16)
+
+    assert len(tiles) == len(layout)
+    for tile, (x, y) in zip(tiles, layout.tolist()):
+        assert tile.shape == (16, 16, 3)
+        assert np.shares_memory(tile, image)
+        assert (tile == image[y : y + 16, x : x + 16]).all()
+
+
+def test_tile_boxes_are_moved_to_their_corner_and_mapped_to_image_pixels():
+    layout = np.array([[0, 0], [100, 50]])
+    frame = (np.array([[0, 0, 10, 10]], np.float32), np.array([0.9]), np.array([1]))
+    tiles = [
+        (np.array([[1, 2, 3, 4]], np.float32), np.array([0.8]), np.array([2])),
+        (np.array([[1, 2, 3, 4]], np.float32), np.array([0.7]), np.array([3])),
+    ]
+
+    boxes, scores, classes = merge_predictions(
+        [frame] + tiles, layout, scaling(4, 4), scaling(0.5, 0.5)
+    )
+
+    assert boxes.tolist() == [[0, 0, 40, 40], [0.5, 1, 1.5, 2], [50.5, 26, 51.5, 27]]
+    assert scores.tolist() == [0.9, 0.8, 0.7]
+    assert classes.tolist() == [1, 2, 3]
@@ -0,0 +1,99 @@
+import numpy as np
+
+from postprocessing import Detections
+from tracking import IoUTracker, StreamTracker, box_iou
+
+
+def detections(*rows):
+    """Detections of rows of (x1, y1, x2, y2, score, label)."""
+
+    return Detections(
+        boxes=np.array([row[:4] for row in rows], dtype=np.int32).reshape((-1, 4)),
+        scores=np.array([row[4] for row in rows], dtype=np.float32),
+        labels=np.array([row[5] for row in rows]),
+    )
+
+
+def test_box_iou():
+    iou = box_iou(
+        np.array([[0, 0, 10, 10]], np.float32),
+        np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], np.float32),
+    )
+
+    assert np.allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+
+def test_objects_keep_their_track_id():
+    tracker = IoUTracker()
+
+    first = tracker.update(
+        detections((0, 0, 10, 10, 0.9, "dog"), (50, 50, 60, 60, 0.8, "cat")), 0.0
+    )
+    second = tracker.update(
+        detections((51, 51, 61, 61, 0.8, "cat"), (1, 1, 11, 11, 0.9, "dog")), 0.1
+    )
+
+    assert first.track_ids == [1, 2]
+    assert second.track_ids == [2, 1]
+    assert second.boxes.tolist() == [[51, 51, 61, 61], [1, 1, 11, 11]]
+
+
+def test_detections_of_other_labels_start_new_tracks():
+    tracker = IoUTracker()
+    tracker.update(detections((0, 0, 10, 10, 0.9, "dog")), 0.0)
+
+    tracked = tracker.update(detections((0, 0, 10, 10, 0.9, "cat")), 0.1)
+
+    assert tracked.track_ids == [2]
+
+
+def test_tracks_expire_after_max_age():
+    tracker = IoUTracker(max_age=1.0)
+    tracker.update(detections((0, 0, 10, 10, 0.9, "dog")), 0.0)
+
+    assert tracker.predict(0.5).track_ids == [1]
+    tracker.update(detections(), 1.5)
+    assert tracker.predict(1.5).track_ids == []
+    assert tracker.update(detections((0, 0, 10, 10, 0.9, "dog")), 1.6).track_ids == [2]
+
+
+def test_moving_objects_are_extrapolated():
+    tracker = IoUTracker(alpha=1.0, beta=1.0)
+    tracker.update(detections((0, 0, 10, 10, 0.9, "dog")), 0.0)
+    tracker.update(detections((4, 0, 14, 10, 0.9, "dog")), 1.0)
+
+    predicted = tracker.predict(1.5)
+
+    assert predicted.boxes.tolist() == [[6, 0, 16, 10]]
+    assert predicted.labels.tolist() == ["dog"]
+    assert predicted.scores.tolist() == [np.float32(0.9)]
+
+
+def test_predicted_boxes_are_clamped_to_the_image():
+    tracker = IoUTracker(alpha=1.0, beta=1.0)
+    tracker.update(detections((2, 2, 12, 12, 0.9, "dog")), 0.0)
+    tracker.update(detections((0, 0, 10, 10, 0.9, "dog")), 1.0)
+
+    assert tracker.predict(3.0).boxes.tolist() == [[0, 0, 6, 6]]
+
+
+def test_prediction_without_tracks():
+    predicted = IoUTracker().predict(0.0)
+
+    assert predicted.boxes.shape == (0, 4)
+    assert predicted.track_ids == []
+
+
+def test_stream_tracker_detects_every_kth_frame():
+    stream = StreamTracker(detect_every=3)
+
+    detected = [t for t in range(7) if stream.next_frame(t)]
+
+    assert detected == [0, 3, 6]
+    assert stream.last_used == 6
+
+
+def test_stream_tracker_detects_every_frame_by_default():
+    stream = StreamTracker(detect_every=0)
+
+    assert all(stream.next_frame(t) for t in range(3))